@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+import cache
+import database as db
+
+HIST_BINS       = 10
+PERCENTILES     = [10, 25, 50, 75, 90]
+DISCRIM_FRACTION = 0.27   # classic upper/lower 27% groups
+SCORE_COLUMNS   = ["user_id", "question_id", "score", "max_marks", "submitted_at", "session_start"]
+STATS_CACHE_TTL = 3600    # seconds; the score stamp in the key handles invalidation
+
+
+def session_stats(session_id):
+    """Score statistics for a session, cached until an evaluation is saved."""
+    stamp = ":".join(db.get_score_stamp(session_id))
+    return cache.read_through(
+        f"stats:{session_id}:{stamp}",
+        lambda: compute_stats(score_frame(session_id)),
+        ttl=STATS_CACHE_TTL,
+    )
+
+
+def score_frame(session_id) -> pd.DataFrame:
+    """Score-only frame for a session, built chunk by chunk straight from row tuples."""
+    frames = [pd.DataFrame.from_records(rows, columns=cols) for cols, rows in db.iter_score_rows(session_id)]
+    if not frames:
+        return pd.DataFrame(columns=SCORE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def compute_stats(df: pd.DataFrame) -> dict:
+    """Per-session and per-question statistics from a score-only frame in one pass."""
+    scored = df[df["score"].notna()]
+    if scored.empty:
+        return {"students": int(df["user_id"].nunique()), "evaluated": 0}
+
+    # Student x question score matrix; every other figure derives from it.
+    matrix    = scored.pivot_table(index="user_id", columns="question_id", values="score", aggfunc="sum")
+    max_marks = scored.groupby("question_id")["max_marks"].first().reindex(matrix.columns)
+    attempted = matrix.notna().to_numpy() * max_marks.to_numpy()
+    totals    = matrix.fillna(0).to_numpy().sum(axis=1)
+    possible  = attempted.sum(axis=1)
+    pct       = np.divide(totals * 100, possible, out=np.zeros_like(totals, dtype=float), where=possible > 0)
+
+    counts, edges = np.histogram(pct, bins=HIST_BINS, range=(0, 100))
+    histogram = pd.DataFrame({
+        "range": [f"{int(lo)}–{int(hi)}%" for lo, hi in zip(edges[:-1], edges[1:])],
+        "students": counts,
+    })
+
+    # Discrimination index: upper-group mean minus lower-group mean, per mark.
+    order = np.argsort(-pct, kind="stable")
+    k     = max(1, int(round(len(order) * DISCRIM_FRACTION)))
+    upper = matrix.iloc[order[:k]].mean()
+    lower = matrix.iloc[order[-k:]].mean()
+
+    by_q = scored.groupby("question_id")["score"]
+    questions = pd.DataFrame({
+        "answers":        by_q.count(),
+        "mean":           by_q.mean(),
+        "median":         by_q.median(),
+        "std":            by_q.std(ddof=0),
+        "max_marks":      max_marks,
+        "difficulty":     by_q.mean() / max_marks,
+        "discrimination": (upper - lower) / max_marks,
+    }).reset_index()
+
+    submitted = pd.to_datetime(df["submitted_at"]) - pd.to_datetime(df["session_start"])
+    minutes   = (submitted.groupby(df["user_id"]).max().dt.total_seconds() / 60).dropna()
+
+    return {
+        "students":    int(len(matrix)),
+        "evaluated":   int(len(scored)),
+        "mean":        float(pct.mean()),
+        "median":      float(np.median(pct)),
+        "std":         float(pct.std()),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(pct, PERCENTILES).tolist())),
+        "histogram":   histogram,
+        "questions":   questions,
+        "time_to_submit_min": {
+            "mean":   float(minutes.mean()) if len(minutes) else None,
+            "median": float(minutes.median()) if len(minutes) else None,
+            "p90":    float(minutes.quantile(0.9)) if len(minutes) else None,
+        },
+    }
@@ -0,0 +1,206 @@
+import os
+import hmac
+import json
+import hashlib
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+import database as db
+import evaluator
+import cache
+import auth
+import sampling
+import runs
+import scheduling
+
+# Headless JSON API next to the Streamlit UI, for LMS integrations:
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+# Students authenticate with the signed login token the UI issues (its
+# emrs_auth cookie), integrations with API_KEY; both as
+# "Authorization: Bearer <token>".
+load_dotenv()
+
+API_KEY            = os.getenv("API_KEY", "")
+AUTH_SECRET        = os.getenv("AUTH_SECRET", "")   # no student tokens without it
+RANKINGS_CACHE_TTL = 30   # seconds
+PAGE_MAX           = 200
+
+# One run at a time per API process, like one admin browser driving a run.
+_run_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eval-run")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    db.configure()
+    db.init_db()
+    cache.configure(os.getenv("CACHE_URL", ""))
+    settings = evaluator.provider_settings(os.getenv("EVAL_PROVIDERS", ""))
+    evaluator.configure_providers({k: os.getenv(k, "") for k in settings})
+    yield
+    _run_worker.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="EMRS Exam API", lifespan=lifespan)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  AUTH & HELPERS
+# ══════════════════════════════════════════════════════════════════
+def current_user(authorization: str = Header("")):
+    token = authorization.removeprefix("Bearer ").strip()
+    if API_KEY and token and hmac.compare_digest(token, API_KEY):
+        return {"id": None, "role": "admin", "email": "api"}
+    uid  = auth.verify_token(token, AUTH_SECRET) if AUTH_SECRET and token else None
+    user = db.get_user_by_id(uid) if uid else None
+    if user is None:
+        raise HTTPException(401, "Missing, invalid or expired token.")
+    return user
+
+
+def require_admin(user=Depends(current_user)):
+    if user["role"] != "admin":
+        raise HTTPException(403, "Admin only.")
+    return user
+
+
+def cached_json(request: Request, fingerprint: str, build):
+    """JSON response with an ETag; 304 without building the body when the client's copy is current."""
+    etag = 'W/"' + hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(jsonable_encoder(build()), headers=headers)
+
+
+def _public(row):
+    """Drop image bytes and internal columns from a submission row."""
+    return {k: v for k, v in row.items()
+            if k not in ("answer_image", "content_hash", "search_tsv")
+            and not isinstance(v, (bytes, memoryview))}
+
+
+def _session_or_404(session_id):
+    session = next((s for s in db.get_all_sessions() if s["id"] == session_id), None)
+    if session is None:
+        raise HTTPException(404, "No such session.")
+    return session
+
+
+# ══════════════════════════════════════════════════════════════════
+#  SUBMISSIONS & RESULTS
+# ══════════════════════════════════════════════════════════════════
+class Answer(BaseModel):
+    question_id: int
+    answer_text: str
+
+
+class AnswerBatch(BaseModel):
+    answers: List[Answer]
+
+
+@app.post("/sessions/{session_id}/answers")
+def submit_answers(session_id: int, batch: AnswerBatch, user=Depends(current_user)):
+    """Submit typed answers for the caller; unchanged answers keep their scores."""
+    if user["id"] is None:
+        raise HTTPException(400, "Answers are submitted with a student's token.")
+    session = db.get_active_session()
+    if session is None or session["id"] != session_id:
+        raise HTTPException(409, "This session is not open for answers.")
+    allowed = {q["id"] for q in sampling.questions_for_student(session, user["id"])}
+    answers = {a.question_id: a.answer_text for a in batch.answers if a.answer_text.strip()}
+    unknown = sorted(set(answers) - allowed)
+    if unknown:
+        raise HTTPException(422, f"Questions not in your set: {unknown}")
+    db.save_drafts(user["id"], session_id, answers)
+    db.promote_drafts(user["id"], session_id, list(answers))
+    return {"saved": sorted(answers)}
+
+
+@app.get("/sessions/{session_id}/results/me")
+def my_results(session_id: int, request: Request, user=Depends(current_user)):
+    if user["id"] is None:
+        raise HTTPException(400, "Use /sessions/{id}/users/{user_id}/results with an API key.")
+    return user_results(session_id, user["id"], request, user)
+
+
+@app.get("/sessions/{session_id}/users/{user_id}/results")
+def user_results(session_id: int, user_id: int, request: Request, user=Depends(current_user)):
+    if user["role"] != "admin" and user["id"] != user_id:
+        raise HTTPException(403, "You can only read your own results.")
+    _session_or_404(session_id)
+    stamp = ":".join(db.get_score_stamp(session_id, user_id))
+    return cached_json(request, f"results:{session_id}:{user_id}:{stamp}", lambda: {
+        "session_id": session_id, "user_id": user_id,
+        "submissions": [_public(s) for s in db.get_user_submissions(user_id, session_id)],
+    })
+
+
+@app.get("/sessions/{session_id}/rankings")
+def rankings(session_id: int, request: Request,
+             limit: int = Query(50, ge=1, le=PAGE_MAX), offset: int = Query(0, ge=0),
+             user=Depends(current_user)):
+    """A page of the leaderboard; unchanged scores answer 304 after one cheap stamp query."""
+    _session_or_404(session_id)
+    stamp = ":".join(db.get_score_stamp(session_id))
+
+    def build():
+        rows = cache.read_through(f"rankings:{session_id}:{stamp}",
+                                  lambda: db.get_rankings(session_id), ttl=RANKINGS_CACHE_TTL)
+        page = [{**r, "rank": offset + i + 1} for i, r in enumerate(rows[offset:offset + limit])]
+        return {"session_id": session_id, "total": len(rows), "limit": limit, "offset": offset,
+                "rankings": page}
+    return cached_json(request, f"rankings:{session_id}:{stamp}:{limit}:{offset}", build)
+
+
+@app.get("/sessions/{session_id}/submissions")
+def export_submissions(session_id: int, admin=Depends(require_admin)):
+    """Every submission of a session as newline-delimited JSON, streamed row by row."""
+    _session_or_404(session_id)
+
+    def rows():
+        for sub in db.iter_submissions_for_session(session_id):
+            yield json.dumps(_public(sub), default=str) + "\n"
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+# ══════════════════════════════════════════════════════════════════
+#  EVALUATION
+# ══════════════════════════════════════════════════════════════════
+class EvaluationRequest(BaseModel):
+    question_id: Optional[int] = None
+    user_id: Optional[int] = None
+    answer_type: Optional[str] = None
+    schedule: Optional[str] = None
+
+
+@app.post("/sessions/{session_id}/evaluations", status_code=202)
+def enqueue_evaluation(session_id: int, body: EvaluationRequest = EvaluationRequest(),
+                       admin=Depends(require_admin)):
+    """Create an evaluation run for pending answers and start it in the background."""
+    _session_or_404(session_id)
+    if not evaluator.has_providers():
+        raise HTTPException(503, "No evaluation provider configured.")
+    if body.answer_type not in (None, "text", "image"):
+        raise HTTPException(422, "answer_type must be text or image.")
+    try:
+        schedule = scheduling.format_schedule(scheduling.parse_schedule(
+            scheduling.DEFAULT_SCHEDULE if body.schedule is None else body.schedule))
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    run_id = db.create_eval_run(session_id, body.question_id, body.user_id, body.answer_type, schedule)
+    _run_worker.submit(runs.execute_eval_run, run_id)
+    return {"run_id": run_id, "status_url": f"/runs/{run_id}"}
+
+
+@app.get("/runs/{run_id}")
+def run_status(run_id: int, admin=Depends(require_admin)):
+    run = db.get_eval_run(run_id)
+    if run is None:
+        raise HTTPException(404, "No such run.")
+    return {**run, "time_to_complete": scheduling.time_to_complete(run)}
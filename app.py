@@ -1,11 +1,23 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
+import json
 import time
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
 import database as db
 import evaluator
+import analytics
+import cache
+import auth
+import snapshots
+import bulk
+import sampling
+import runs
+import scheduling
+import profiling
 
 # ─── PAGE CONFIG ──────────────────────────────────────────────────
 st.set_page_config(
@@ -28,15 +40,50 @@ def get_secret(key, default=""):
 GOOGLE_CLIENT_ID     = get_secret("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = get_secret("GOOGLE_CLIENT_SECRET")
 GEMINI_API_KEY       = get_secret("GEMINI_API_KEY")
+# Evaluation providers, tried per EVAL_ROUTING (fallback | cost | latency)
+EVAL_CONFIG          = {k: get_secret(k) for k in evaluator.provider_settings(get_secret("EVAL_PROVIDERS"))}
 ADMIN_EMAILS         = [e.strip() for e in get_secret("ADMIN_EMAILS", "").split(",") if e.strip()]
 REDIRECT_URI         = get_secret("REDIRECT_URI", "http://localhost:8501")
 # Expose DATABASE_URL to environment so database.py can read it
 os.environ["DATABASE_URL"] = get_secret("DATABASE_URL", "")
+CACHE_URL            = get_secret("CACHE_URL", "")
+# Signs login tokens; every replica behind a load balancer must share it.
+# Without it logins last only as long as the browser's websocket session.
+AUTH_SECRET          = get_secret("AUTH_SECRET", "")
+AUTH_COOKIE          = "emrs_auth"
+RANKINGS_CACHE_TTL   = 30  # seconds
+SEARCH_PAGE_SIZE     = 20
 
 # ─── INIT ─────────────────────────────────────────────────────────
-db.init_db()
-if GEMINI_API_KEY:
-    evaluator.configure_gemini(GEMINI_API_KEY)
+@st.cache_resource
+def init_backends(database_url, cache_url):
+    """Once per process: pick DB/cache backends and create tables."""
+    db.configure(database_url)
+    db.init_db()
+    cache.configure(cache_url)
+    return True
+
+@st.cache_resource
+def init_evaluator(config_items):
+    """Once per process: build the provider router so its health and latency stats persist."""
+    evaluator.configure_providers(dict(config_items))
+    return True
+
+@st.cache_resource
+def init_profiling():
+    """Once per process, with PROFILE=1: time every database and evaluator call."""
+    profiling.instrument_database(db)
+    profiling.instrument_evaluator(evaluator)
+    return True
+
+if profiling.ENABLED:
+    init_profiling()
+if CACHE_URL and not AUTH_SECRET:
+    st.error("CACHE_URL is set for running several replicas, but AUTH_SECRET is missing. "
+             "Give every replica the same AUTH_SECRET so logins carry over between them.")
+    st.stop()
+init_backends(os.environ["DATABASE_URL"], CACHE_URL)
+init_evaluator(tuple(sorted(EVAL_CONFIG.items())))
 
 # ─── MASTER CSS ───────────────────────────────────────────────────
 st.markdown("""
@@ -294,43 +341,22 @@ SCOPES = [
     "https://www.googleapis.com/auth/userinfo.profile",
 ]
 
+def oauth_config():
+    return auth.oauth_client_config(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, REDIRECT_URI)
+
 def get_google_auth_url():
-    from google_auth_oauthlib.flow import Flow
-    flow = Flow.from_client_config(
-        {"web": {
-            "client_id": GOOGLE_CLIENT_ID, "client_secret": GOOGLE_CLIENT_SECRET,
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [REDIRECT_URI],
-        }},
-        scopes=SCOPES,
-    )
-    flow.redirect_uri = REDIRECT_URI
+    flow = auth.oauth_flow(oauth_config(), SCOPES, REDIRECT_URI)
     auth_url, state = flow.authorization_url(access_type="offline", prompt="select_account")
     st.session_state["oauth_state"] = state
     return auth_url, flow
 
-def exchange_code_for_user(code):
-    from google_auth_oauthlib.flow import Flow
-    import requests as req
-    flow = Flow.from_client_config(
-        {"web": {
-            "client_id": GOOGLE_CLIENT_ID, "client_secret": GOOGLE_CLIENT_SECRET,
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "redirect_uris": [REDIRECT_URI],
-        }},
-        scopes=SCOPES,
-        state=st.session_state.get("oauth_state", ""),
-    )
-    flow.redirect_uri = REDIRECT_URI
-    flow.fetch_token(code=code)
-    credentials = flow.credentials
-    userinfo = req.get(
-        "https://www.googleapis.com/oauth2/v3/userinfo",
-        headers={"Authorization": f"Bearer {credentials.token}"}
-    ).json()
-    return userinfo
+def login_with_google(code):
+    """Code exchange, userinfo and a single upsert (with admin role) for one sign-in."""
+    userinfo = auth.fetch_google_userinfo(oauth_config(), SCOPES, REDIRECT_URI, code,
+                                          state=st.session_state.get("oauth_state", ""))
+    email    = userinfo.get("email", "")
+    return db.upsert_user(email, userinfo.get("name", email), userinfo.get("picture", ""),
+                          admin=email in ADMIN_EMAILS)
 
 
 # ══════════════════════════════════════════════════════════════════
@@ -338,27 +364,49 @@ def exchange_code_for_user(code):
 # ══════════════════════════════════════════════════════════════════
 if "user" not in st.session_state:
     st.session_state.user = None
+if "profile_scope" not in st.session_state:
+    st.session_state.profile_scope = uuid.uuid4().hex
+profiling.set_scope(st.session_state.profile_scope)
+
+
+def set_auth_cookie(token, max_age):
+    """Store (or, with max_age 0, delete) the login token in a first-party cookie."""
+    components.html(f"""<script>
+        const secure = window.parent.location.protocol === "https:" ? "; Secure" : "";
+        window.parent.document.cookie =
+            "{AUTH_COOKIE}={token}; path=/; max-age={max_age}; SameSite=Strict" + secure;
+    </script>""", height=0)
+
 
 params = st.query_params
+# Returning after a reconnect (possibly to another replica): restore the
+# login from the signed token in the cookie instead of server memory.
+# st.context.cookies is fixed for the browser session, so it is read once:
+# a later logout must not be undone by the cookie the session started with.
+if "cookie_checked" not in st.session_state:
+    st.session_state.cookie_checked = True
+    token = st.context.cookies.get(AUTH_COOKIE)
+    if token and AUTH_SECRET and st.session_state.user is None:
+        uid = auth.verify_token(token, AUTH_SECRET)
+        st.session_state.user = db.get_user_by_id(uid) if uid else None
+        if st.session_state.user is None:
+            st.session_state.auth_cookie = ("", 0)
 if "code" in params and st.session_state.user is None:
     try:
         with st.spinner("Signing you in..."):
             if REDIRECT_URI.startswith("http://"):
                 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
-            userinfo = exchange_code_for_user(params["code"])
-            email    = userinfo.get("email", "")
-            name     = userinfo.get("name", email)
-            picture  = userinfo.get("picture", "")
-            user     = db.upsert_user(email, name, picture)
-            if email in ADMIN_EMAILS and user["role"] != "admin":
-                db.set_admin(email)
-                user = db.get_user_by_email(email)
+            user = login_with_google(params["code"])
             st.session_state.user = user
             st.query_params.clear()
+            if AUTH_SECRET:
+                st.session_state.auth_cookie = (auth.issue_token(user["id"], AUTH_SECRET), auth.TOKEN_TTL)
             st.rerun()
     except Exception as e:
         st.error(f"Login failed: {e}")
         st.query_params.clear()
+if "auth_cookie" in st.session_state:
+    set_auth_cookie(*st.session_state.pop("auth_cookie"))
 
 
 # ══════════════════════════════════════════════════════════════════
@@ -445,6 +493,10 @@ def show_sidebar():
 
         if st.button("🚪  Logout", use_container_width=True):
             st.session_state.user = None
+            st.session_state.auth_cookie = ("", 0)
+            for key in ("draft_hashes", "draft_flushed_at", "draft_saved_at"):
+                st.session_state.pop(key, None)
+            st.query_params.clear()
             st.rerun()
 
         st.markdown("""
@@ -456,6 +508,41 @@ def show_sidebar():
     return page
 
 
+# ══════════════════════════════════════════════════════════════════
+#  DRAFT AUTOSAVE
+# ══════════════════════════════════════════════════════════════════
+AUTOSAVE_INTERVAL = 15  # seconds; at most one draft write per student per interval
+
+def flush_drafts(user_id, session_id, question_ids, force=False):
+    """Write only the typed answers whose content changed since the last flush."""
+    last = st.session_state.get("draft_flushed_at", 0)
+    if not force and time.time() - last < AUTOSAVE_INTERVAL:
+        return
+    st.session_state.draft_flushed_at = time.time()
+
+    hashes = st.session_state.setdefault("draft_hashes", {})   # (session_id, user_id, qid) -> hash
+    dirty  = {}
+    for qid in question_ids:
+        text = st.session_state.get(f"ans_{qid}")
+        key  = (session_id, user_id, qid)
+        if text is None or (key not in hashes and not text.strip()):
+            continue
+        h = db.content_hash(text)
+        if hashes.get(key) != h:
+            dirty[qid] = text
+            hashes[key] = h
+    if dirty:
+        db.save_drafts(user_id, session_id, dirty)
+        st.session_state.draft_saved_at = datetime.now()
+
+@st.fragment(run_every=f"{AUTOSAVE_INTERVAL}s")
+def autosave_drafts(user_id, session_id, question_ids):
+    flush_drafts(user_id, session_id, question_ids)
+    saved_at = st.session_state.get("draft_saved_at")
+    if saved_at:
+        st.caption(f"💾 Draft autosaved at {saved_at:%H:%M:%S}")
+
+
 # ══════════════════════════════════════════════════════════════════
 #  EXAM PAGE
 # ══════════════════════════════════════════════════════════════════
@@ -488,12 +575,12 @@ def show_exam_page():
     </div>
     """, unsafe_allow_html=True)
 
-    questions = db.get_questions_for_session(session["id"])
+    user      = st.session_state.user
+    questions = sampling.questions_for_student(session, user["id"])
     if not questions:
         st.info("Questions not posted yet. Please check back soon.")
         return
 
-    user     = st.session_state.user
     existing = {s["question_id"]: s for s in db.get_user_submissions(user["id"], session["id"])}
 
     if all(q["id"] in existing for q in questions):
@@ -518,6 +605,15 @@ def show_exam_page():
     </div>
     """, unsafe_allow_html=True)
 
+    drafts = db.get_drafts(user["id"], session["id"])
+    hashes = st.session_state.setdefault("draft_hashes", {})
+    for q in questions:
+        key = (session["id"], user["id"], q["id"])
+        if q["id"] in drafts:
+            hashes.setdefault(key, drafts[q["id"]]["content_hash"])
+        elif existing.get(q["id"], {}).get("answer_text"):
+            hashes.setdefault(key, db.content_hash(existing[q["id"]]["answer_text"]))
+
     answers      = {}
     images       = {}
     answer_types = {}
@@ -547,9 +643,13 @@ def show_exam_page():
 
         if mode == "Type Answer":
             answer_types[q["id"]] = "text"
+            if already and already.get("answer_text"):
+                initial = already["answer_text"]
+            else:
+                initial = drafts[q["id"]]["answer_text"] if q["id"] in drafts else ""
             answers[q["id"]] = st.text_area(
                 f"Type your answer for Q{i}",
-                value=already["answer_text"] if already and already.get("answer_text") else "",
+                value=initial,
                 height=150,
                 key=f"ans_{q['id']}",
                 placeholder="Write a detailed, well-structured answer using proper technical terminology..."
@@ -576,6 +676,8 @@ def show_exam_page():
 
         st.markdown("<br>", unsafe_allow_html=True)
 
+    autosave_drafts(user["id"], session["id"], [q["id"] for q in questions])
+
     if st.button("🚀  Submit All Answers", type="primary", use_container_width=True):
         # Validate all questions have some answer
         missing = []
@@ -589,15 +691,17 @@ def show_exam_page():
         if missing:
             st.error(f"Please answer all questions. Missing: {', '.join(missing)}")
         else:
+            # Typed answers already live in the drafts table; flush the last
+            # edits and promote them in one statement.
+            text_qids = [q["id"] for q in questions if answer_types.get(q["id"], "text") == "text"]
+            flush_drafts(user["id"], session["id"], text_qids, force=True)
+            db.promote_drafts(user["id"], session["id"], text_qids)
+            image_qids = [q["id"] for q in questions if answer_types.get(q["id"], "text") != "text"]
+            db.delete_drafts(user["id"], session["id"], image_qids)
+            for qid in image_qids:
+                st.session_state.draft_hashes.pop((session["id"], user["id"], qid), None)
             for q in questions:
-                atype = answer_types.get(q["id"], "text")
-                if atype == "text":
-                    db.save_answer(
-                        user["id"], q["id"], session["id"],
-                        answer_text=answers[q["id"]].strip(),
-                        answer_type="text"
-                    )
-                else:
+                if answer_types.get(q["id"], "text") != "text":
                     img_file = images.get(q["id"])
                     if img_file and img_file != "existing":
                         img_bytes = img_file.read()
@@ -618,6 +722,24 @@ def show_exam_page():
 # ══════════════════════════════════════════════════════════════════
 #  MY RESULTS
 # ══════════════════════════════════════════════════════════════════
+HISTORY_CACHE_TTL = 60  # seconds
+
+def show_progress_trend(user_id):
+    """Percentage per evaluated session, oldest first, from one cached aggregate query."""
+    history = cache.read_through(f"history:{user_id}", lambda: db.get_user_history(user_id), ttl=HISTORY_CACHE_TTL)
+    points  = [h for h in history if h["evaluated"] and h["total_max"]]
+    if len(points) < 2:
+        return
+    import pandas as pd
+    df = pd.DataFrame({
+        "Session":    [f"{h['session_id']} — {h['title']}" for h in points],
+        "Score (%)":  [round(h["total_score"] / h["total_max"] * 100, 1) for h in points],
+    })
+    st.markdown('<div class="section-title">Your Progress</div>', unsafe_allow_html=True)
+    st.line_chart(df, x="Session", y="Score (%)")
+    first, last = df["Score (%)"].iloc[0], df["Score (%)"].iloc[-1]
+    st.caption(f"{len(points)} sessions · latest {last:.1f}% ({last - first:+.1f} points since your first session)")
+
 def show_my_results():
     st.markdown("""
     <div class="hero-banner">
@@ -632,11 +754,17 @@ def show_my_results():
         st.info("No exam sessions found.")
         return
 
+    show_progress_trend(st.session_state.user["id"])
+
     sel = st.selectbox("Select Session", [f"{s['id']} — {s['title']}" for s in sessions])
     sid = int(sel.split("—")[0].strip())
 
-    user = st.session_state.user
-    subs = db.get_user_submissions(user["id"], sid)
+    user    = st.session_state.user
+    session = next(s for s in sessions if s["id"] == sid)
+    if snapshots.ensure_snapshot(session):
+        subs = snapshots.read_user_submissions(sid, user["id"])
+    else:
+        subs = db.get_user_submissions(user["id"], sid)
 
     if not subs:
         st.markdown("""
@@ -670,15 +798,23 @@ def show_my_results():
             st.markdown(f"**Question:**")
             st.markdown(f"> {sub['question_text']}")
             st.markdown("**Your Answer:**")
-            if sub.get("answer_type") == "image" and sub.get("answer_image"):
+            image = sub.get("answer_image")
+            if sub.get("answer_type") == "image" and "answer_image" not in sub:
+                image = db.get_submission_image(sub["id"], sid)   # snapshot rows carry no images
+            if sub.get("answer_type") == "image" and image:
                 st.markdown("<span style='color:#00d4aa; font-size:0.85rem;'>📷 Handwritten Answer</span>", unsafe_allow_html=True)
                 import io
                 from PIL import Image
                 try:
-                    img = Image.open(io.BytesIO(sub["answer_image"]))
+                    with profiling.timed("ui", "decode image"):
+                        img = Image.open(io.BytesIO(image))
+                        img.load()
                     st.image(img, caption="Your handwritten answer", width=500)
                 except Exception:
                     st.warning("Could not display image.")
+                if sub.get("answer_transcript"):
+                    st.caption("Transcript used for evaluation:")
+                    st.markdown(f"> {sub['answer_transcript']}")
             else:
                 st.markdown(f"> {sub.get('answer_text', 'No answer recorded')}")
             if sub.get("feedback"):
@@ -695,6 +831,11 @@ def show_my_results():
 # ══════════════════════════════════════════════════════════════════
 #  RANKINGS
 # ══════════════════════════════════════════════════════════════════
+def cached_rankings(sid):
+    """Leaderboard via the shared cache; the score stamp in the key changes on every evaluation."""
+    stamp = ":".join(db.get_score_stamp(sid))
+    return cache.read_through(f"rankings:{sid}:{stamp}", lambda: db.get_rankings(sid), ttl=RANKINGS_CACHE_TTL)
+
 def show_rankings():
     st.markdown("""
     <div class="hero-banner">
@@ -712,7 +853,11 @@ def show_rankings():
     sel = st.selectbox("Select Session", [f"{s['id']} — {s['title']}" for s in sessions])
     sid = int(sel.split("—")[0].strip())
 
-    rankings = db.get_rankings(sid)
+    session = next(s for s in sessions if s["id"] == sid)
+    if snapshots.ensure_snapshot(session):
+        rankings = snapshots.read_rankings(sid)
+    else:
+        rankings = cached_rankings(sid)
     if not rankings:
         st.markdown("""
         <div style="background:linear-gradient(135deg,#0f1729,#162040); border:1px solid rgba(240,192,96,0.18);
@@ -726,30 +871,93 @@ def show_rankings():
     medals = ["🥇", "🥈", "🥉"]
     st.markdown("<br>", unsafe_allow_html=True)
 
-    for rank, row in enumerate(rankings, 1):
-        medal     = medals[rank - 1] if rank <= 3 else f"#{rank}"
-        cls       = f"rank-{rank}" if rank <= 3 else ""
-        score_val = f"{row['total_score']:.1f} / {row['total_max']}" if row["total_score"] is not None else "—"
-        pct       = (row["total_score"] / row["total_max"] * 100) if row["total_score"] and row["total_max"] else 0
-        pct_str   = f"{pct:.1f}"
-        bar_w     = int(pct)
+    with profiling.timed("ui", "render rankings"):
+        for rank, row in enumerate(rankings, 1):
+            medal     = medals[rank - 1] if rank <= 3 else f"#{rank}"
+            cls       = f"rank-{rank}" if rank <= 3 else ""
+            score_val = f"{row['total_score']:.1f} / {row['total_max']}" if row["total_score"] is not None else "—"
+            pct       = (row["total_score"] / row["total_max"] * 100) if row["total_score"] and row["total_max"] else 0
+            pct_str   = f"{pct:.1f}"
+            bar_w     = int(pct)
 
-        st.markdown(f"""
-        <div class="rank-card {cls}">
-            <div class="rank-medal">{medal}</div>
-            <div style="flex:1">
-                <div class="rank-name">{row["name"]}</div>
-                <div class="rank-email">{row["email"]}</div>
-                <div class="score-bar-bg">
-                    <div class="score-bar-fill" style="width:{bar_w}%"></div>
+            st.markdown(f"""
+            <div class="rank-card {cls}">
+                <div class="rank-medal">{medal}</div>
+                <div style="flex:1">
+                    <div class="rank-name">{row["name"]}</div>
+                    <div class="rank-email">{row["email"]}</div>
+                    <div class="score-bar-bg">
+                        <div class="score-bar-fill" style="width:{bar_w}%"></div>
+                    </div>
+                </div>
+                <div class="rank-score">
+                    <div class="score-val">{score_val}</div>
+                    <div class="score-pct">{pct_str}%</div>
                 </div>
             </div>
-            <div class="rank-score">
-                <div class="score-val">{score_val}</div>
-                <div class="score-pct">{pct_str}%</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+            """, unsafe_allow_html=True)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  LIVE EVALUATION VIEW
+# ══════════════════════════════════════════════════════════════════
+LIVE_RECENT_N = 10
+
+def _live_state(sid, reset=False):
+    """Per-browser polling state: the (evaluated_at, id) cursor plus running counters."""
+    state = st.session_state.get("live_eval")
+    if reset or not state or state["sid"] != sid:
+        state = {"sid": sid, "cursor": (datetime.now(), 0), "started": time.time(),
+                 "scored": 0, "failed": 0, "recent": []}
+        st.session_state.live_eval = state
+    return state
+
+def poll_live_results(state):
+    """Fetch only the answers scored since the last poll and fold them into state."""
+    rows = db.get_evaluations_since(state["sid"], state["cursor"])
+    if rows:
+        state["cursor"]  = (rows[-1]["evaluated_at"], rows[-1]["id"])
+        state["scored"] += len(rows)
+        state["failed"] += sum(1 for r in rows if r.get("eval_source") == "error")
+        state["recent"]  = (list(reversed(rows)) + state["recent"])[:LIVE_RECENT_N]
+    return state
+
+def render_live_results(state, container):
+    counts  = db.get_evaluation_counts(state["sid"])
+    elapsed = max(time.time() - state["started"], 1.0)
+    rate    = state["scored"] / elapsed * 60
+    eta     = f"{counts['pending'] / rate:.1f} min" if rate and counts["pending"] else "—"
+
+    with container.container():
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Scored (this run)", state["scored"], f"{counts['pending']} pending", delta_color="off")
+        c2.metric("Answers / min", f"{rate:.1f}")
+        c3.metric("ETA", eta)
+        c4.metric("Failures", state["failed"])
+        if state["recent"]:
+            import pandas as pd
+            df = pd.DataFrame(state["recent"])[["evaluated_at", "student_name", "question_text", "score", "max_marks", "eval_source"]]
+            df.columns = ["Evaluated At", "Name", "Question", "Score", "Max", "Source"]
+            st.dataframe(df, use_container_width=True, hide_index=True)
+
+@st.fragment(run_every="5s")
+def show_live_results(sid):
+    """Auto-refreshing view for watching a run started elsewhere (another tab or admin)."""
+    state = poll_live_results(_live_state(sid))
+    render_live_results(state, st.empty())
+
+
+# ══════════════════════════════════════════════════════════════════
+#  EVALUATION RUNS
+# ══════════════════════════════════════════════════════════════════
+def execute_eval_run(run_id, progress, live):
+    """Run an evaluation in this browser, showing progress and live results."""
+    state = _live_state(db.get_eval_run(run_id)["session_id"], reset=True)
+    return runs.execute_eval_run(
+        run_id,
+        before=lambda i, total, sub: progress.progress((i + 1) / total, f"Evaluating {i+1}/{total} — {sub['student_name']}"),
+        after=lambda result: render_live_results(poll_live_results(state), live),
+    )
 
 
 # ══════════════════════════════════════════════════════════════════
@@ -764,7 +972,12 @@ def show_admin_panel():
     </div>
     """, unsafe_allow_html=True)
 
-    tab1, tab2, tab3, tab4 = st.tabs(["📋  Sessions", "❓  Questions", "🤖  Evaluate", "📊  Submissions"])
+    fallback = cache.stats()["fallback"]
+    if fallback:
+        st.warning(f"{fallback}; this replica uses its own in-process cache.")
+
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📋  Sessions", "❓  Questions", "🤖  Evaluate", "📊  Submissions",
+                                                  "📈  Analytics", "⏱️  Performance"])
 
     with tab1:
         st.markdown('<div class="section-title">Create New Session</div>', unsafe_allow_html=True)
@@ -779,11 +992,27 @@ def show_admin_panel():
                 else:
                     st.error("Session title is required.")
 
+        with st.expander("👥  Candidate roster"):
+            st.caption("CSV, JSON or YAML with columns email, name, role (student or admin). Candidates "
+                       "are registered ahead of the exam; existing accounts keep their role unless promoted.")
+            upload = st.file_uploader("Roster", type=["csv", "json", "yaml", "yml"], key="roster_file")
+            if upload and st.button("Import Roster", key="roster_import"):
+                try:
+                    added = bulk.import_roster(upload.getvalue(), bulk.detect_format(upload.name))
+                    st.success(f"Imported {added} candidates.")
+                except ValueError as e:
+                    st.error(str(e))
+            fmt = st.radio("Export as", bulk.FORMATS, horizontal=True, key="roster_fmt")
+            try:
+                st.download_button("Download Roster", bulk.export_roster(fmt), f"roster.{fmt}", key="roster_export")
+            except ValueError as e:
+                st.caption(str(e))
+
         st.markdown("<br>", unsafe_allow_html=True)
         st.markdown('<div class="section-title">All Sessions</div>', unsafe_allow_html=True)
         for s in db.get_all_sessions():
             badge_cls  = "badge-active" if s["is_active"] else "badge-closed"
-            badge_text = "Active" if s["is_active"] else "Closed"
+            badge_text = "Active" if s["is_active"] else ("Archived" if s.get("archived_at") else "Closed")
             col1, col2 = st.columns([5, 1])
             with col1:
                 st.markdown(f"""
@@ -800,6 +1029,15 @@ def show_admin_panel():
                     if st.button("Close", key=f"close_{s['id']}"):
                         db.close_session(s["id"])
                         st.rerun()
+                elif not s.get("archived_at"):
+                    if st.button("Archive", key=f"archive_{s['id']}",
+                                 help="Move this session's submissions to compressed cold storage"):
+                        try:
+                            moved = db.archive_session(s["id"])
+                            st.success(f"Archived {moved} submissions.")
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(str(e))
 
     with tab2:
         session = db.get_active_session()
@@ -818,14 +1056,75 @@ def show_admin_panel():
                 col1, col2 = st.columns(2)
                 marks = col1.number_input("Marks", min_value=1, max_value=20, value=4)
                 hint  = col2.text_input("Hint (optional)")
+                ref   = st.text_area("Reference Answer (optional, used by the evaluator only)", height=100)
+                rubric = st.text_area("Rubric Points (optional, one per line)", height=80,
+                                      placeholder="Defines normalization\nExplains 1NF, 2NF and 3NF\nGives an example")
+                col1, col2 = st.columns(2)
+                tags  = col1.text_input("Tags (optional, comma-separated)", placeholder="dbms, normalization")
+                level = col2.selectbox("Difficulty", [""] + list(sampling.DIFFICULTIES),
+                                       format_func=lambda d: d.title() or "Unspecified")
                 if st.form_submit_button("Add Question", type="primary"):
                     if qtext.strip():
-                        db.add_question(session["id"], qtext.strip(), marks, hint)
+                        db.add_question(session["id"], qtext.strip(), marks, hint, ref.strip(), rubric.strip(),
+                                        ", ".join(sampling.parse_tags(tags)), level)
                         st.success("Question added!")
                         st.rerun()
                     else:
                         st.error("Question text cannot be empty.")
 
+            with st.expander("🎲  Per-student question sets"):
+                policy = sampling.load_policy(session) or {}
+                st.caption("Give each student their own draw from this session's questions, the same draw "
+                           "every time. Leave everything at 0 for everyone to answer every question.")
+                quotas = policy.get("difficulty") or {}
+                with st.form("sampling_policy"):
+                    count = st.number_input("Questions per student", min_value=0, max_value=100,
+                                            value=int(policy.get("count", 0)))
+                    cols  = st.columns(len(sampling.DIFFICULTIES))
+                    per_level = {d: col.number_input(f"{d.title()} (overrides the count)", min_value=0, max_value=100,
+                                                     value=int(quotas.get(d, 0)), key=f"quota_{d}")
+                                 for d, col in zip(sampling.DIFFICULTIES, cols)}
+                    tags = st.text_input("Only questions tagged (comma-separated, optional)",
+                                         value=", ".join(policy.get("tags") or []))
+                    if st.form_submit_button("Save & Assign Question Sets", type="primary"):
+                        new_policy = {k: v for k, v in {
+                            "count":      int(count),
+                            "difficulty": {d: int(n) for d, n in per_level.items() if n},
+                            "tags":       sampling.parse_tags(tags),
+                        }.items() if v}
+                        try:
+                            if new_policy:
+                                sampling.validate_policy(db.get_questions_for_session(session["id"]), new_policy)
+                            db.set_sampling_policy(session["id"], json.dumps(new_policy) if new_policy else None)
+                            students = [u["id"] for u in db.get_all_users() if u["role"] == "student"]
+                            assigned = sampling.assign_session(db.get_active_session(), students)
+                            st.success(f"Assigned question sets to {assigned} students." if new_policy
+                                       else "Every student answers every question.")
+                        except ValueError as e:
+                            st.error(str(e))
+                if policy:
+                    st.caption(f"{db.count_assigned_students(session['id'])} students have a stored set; "
+                               "students who sign up later get theirs on first visit. "
+                               "Re-assign after adding or removing questions.")
+
+            with st.expander("📦  Import / export question bank"):
+                st.caption("CSV, JSON or YAML with columns question_text, marks, hint, reference_answer, rubric. "
+                           "The whole file is checked first and added in one go.")
+                upload = st.file_uploader("Question bank", type=["csv", "json", "yaml", "yml"], key="qbank_file")
+                if upload and st.button("Import Questions", key="qbank_import"):
+                    try:
+                        added = bulk.import_questions(session["id"], upload.getvalue(), bulk.detect_format(upload.name))
+                        st.success(f"Imported {added} questions.")
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(str(e))
+                fmt = st.radio("Export as", bulk.FORMATS, horizontal=True, key="qbank_fmt")
+                try:
+                    st.download_button("Download Questions", bulk.export_questions(session["id"], fmt),
+                                       f"questions_{session['id']}.{fmt}", key="qbank_export")
+                except ValueError as e:
+                    st.caption(str(e))
+
             st.markdown("<br>", unsafe_allow_html=True)
             st.markdown('<div class="section-title">Current Questions</div>', unsafe_allow_html=True)
             questions = db.get_questions_for_session(session["id"])
@@ -837,6 +1136,24 @@ def show_admin_panel():
                     st.write(q["question_text"])
                     if q.get("hint"):
                         st.caption(f"Hint: {q['hint']}")
+                    with st.form(f"edit_q_{q['id']}"):
+                        e_text   = st.text_area("Question Text", value=q["question_text"], height=100)
+                        e_marks  = st.number_input("Marks", min_value=1, max_value=20, value=int(q["marks"]))
+                        e_hint   = st.text_input("Hint", value=q.get("hint") or "")
+                        e_ref    = st.text_area("Reference Answer", value=q.get("reference_answer") or "", height=100)
+                        e_rubric = st.text_area("Rubric Points (one per line)", value=q.get("rubric") or "", height=80)
+                        e_tags   = st.text_input("Tags", value=q.get("tags") or "")
+                        levels   = [""] + list(sampling.DIFFICULTIES)
+                        e_level  = st.selectbox("Difficulty", levels, index=levels.index(q.get("difficulty") or ""),
+                                                format_func=lambda d: d.title() or "Unspecified")
+                        if st.form_submit_button("Save Changes"):
+                            if e_text.strip():
+                                db.update_question(q["id"], e_text.strip(), e_marks, e_hint, e_ref.strip(), e_rubric.strip(),
+                                                   ", ".join(sampling.parse_tags(e_tags)), e_level)
+                                st.success("Question updated!")
+                                st.rerun()
+                            else:
+                                st.error("Question text cannot be empty.")
                     if st.button("Delete", key=f"del_{q['id']}"):
                         db.delete_question(q["id"])
                         st.rerun()
@@ -848,30 +1165,137 @@ def show_admin_panel():
         else:
             sel     = st.selectbox("Select Session", [f"{s['id']} — {s['title']}" for s in sessions])
             sid     = int(sel.split("—")[0].strip())
-            pending = db.get_unevaluated_submissions(sid)
-            st.metric("Pending Evaluations", len(pending))
+            pending = db.count_unevaluated_submissions(sid)
+            st.metric("Pending Evaluations", pending)
 
-            if not GEMINI_API_KEY:
-                st.error("GEMINI_API_KEY not set in .env file!")
+            run_to_execute = None
+            if not evaluator.has_providers():
+                st.error("No evaluation provider configured — set GEMINI_API_KEY, or <NAME>_BASE_URL for a provider in EVAL_PROVIDERS, in .env file!")
             elif pending:
                 st.markdown("<br>", unsafe_allow_html=True)
-                if st.button("🤖  Evaluate All Pending Answers", type="primary", use_container_width=True):
-                    progress = st.progress(0, "Starting AI evaluation...")
-                    for i, sub in enumerate(pending):
-                        pct_val = (i + 1) / len(pending)
-                        progress.progress(pct_val, f"Evaluating {i+1}/{len(pending)} — {sub['student_name']}")
-                        if sub.get("answer_type") == "image" and sub.get("answer_image"):
-                            result = evaluator.evaluate_image_answer(sub["question_text"], sub["answer_image"], sub["max_marks"])
-                        else:
-                            result = evaluator.evaluate_answer(sub["question_text"], sub.get("answer_text", ""), sub["max_marks"])
-                        db.save_evaluation(sub["id"], result["score"], result["feedback"])
-                        time.sleep(0.5)
-                    progress.empty()
-                    st.success(f"Successfully evaluated {len(pending)} answers!")
-                    st.rerun()
+                st.markdown('<div class="section-title">New Evaluation Run</div>', unsafe_allow_html=True)
+                qs    = db.get_questions_for_session(sid)
+                users = db.get_all_users()
+                c1, c2, c3 = st.columns(3)
+                q_sel = c1.selectbox("Question", [None] + [q["id"] for q in qs], key="run_q",
+                                     format_func=lambda qid: "All questions" if qid is None else
+                                     f"Q{[q['id'] for q in qs].index(qid) + 1}")
+                u_sel = c2.selectbox("Student", [None] + [u["id"] for u in users], key="run_u",
+                                     format_func=lambda uid: "All students" if uid is None else
+                                     next(u["name"] or u["email"] for u in users if u["id"] == uid))
+                t_sel = c3.selectbox("Answer Type", [None, "text", "image"], key="run_t",
+                                     format_func=lambda t: "All answers" if t is None else f"{t.title()} only")
+                with st.expander("Schedule"):
+                    st.caption("Weights of each ordering policy; higher weighs more, 0 turns it off. "
+                               "All 0 evaluates in submission order.")
+                    defaults = scheduling.parse_schedule(scheduling.DEFAULT_SCHEDULE)
+                    labels   = {"round_robin": "Round-robin per student", "text_first": "Text before image",
+                                "oldest": "Oldest first"}
+                    weights  = {name: col.number_input(labels[name], 0.0, 5.0, float(defaults.get(name, 0)), 0.5,
+                                                       key=f"sched_{name}")
+                                for name, col in zip(scheduling.POLICIES, st.columns(3))}
+                if st.button("🤖  Evaluate Pending Answers", type="primary", use_container_width=True):
+                    run_to_execute = db.create_eval_run(sid, q_sel, u_sel, t_sel, scheduling.format_schedule(weights))
             else:
                 st.success("All submitted answers are already evaluated!")
 
+            eval_runs = db.get_eval_runs(sid)
+            if eval_runs:
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.markdown('<div class="section-title">Evaluation Runs</div>', unsafe_allow_html=True)
+            for run in eval_runs[:10]:
+                scope = ", ".join(f"{k}={run[k]}" for k in ("question_id", "user_id", "answer_type") if run[k]) or "all pending"
+                col1, col2, col3 = st.columns([5, 1, 1])
+                col1.markdown(
+                    f"**Run #{run['id']}** · `{run['status']}` · {run['processed']}/{run['total']} done"
+                    f" · {run['failed']} failed · {scope} · {run.get('schedule') or 'submission order'}"
+                    + (f"  \n<small style='color:#8892a4;'>{run['note']}</small>" if run.get("note") else ""),
+                    unsafe_allow_html=True
+                )
+                if run["status"] == "running":
+                    # Clicking reruns the script, which also stops a loop running in this browser.
+                    if col2.button("⏸ Pause", key=f"pause_run_{run['id']}"):
+                        db.set_eval_run_status(run["id"], "paused")
+                        st.rerun()
+                if run["status"] == "paused" and evaluator.has_providers():
+                    if col2.button("▶ Resume", key=f"resume_run_{run['id']}"):
+                        run_to_execute = run["id"]
+                if run["status"] in ("running", "paused"):
+                    if col3.button("✖ Cancel", key=f"cancel_run_{run['id']}"):
+                        db.set_eval_run_status(run["id"], "cancelled")
+                        st.rerun()
+
+            if eval_runs and eval_runs[0].get("started_at") and st.toggle("⏱  Time to complete result (latest run)", key="ttc"):
+                ttc = scheduling.time_to_complete(eval_runs[0])
+                c1, c2, c3, c4 = st.columns(4)
+                c1.metric("Students Complete", len(ttc["students"]))
+                c2.metric("Still Waiting", ttc["waiting"])
+                if ttc["students"]:
+                    c3.metric("Median", f"{ttc['median']:.0f} s")
+                    c4.metric("P90", f"{ttc['p90']:.0f} s")
+                    import pandas as pd
+                    df = pd.DataFrame(ttc["students"])
+                    df.columns = ["Name", "Seconds to Complete Result"]
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+
+            failed = db.get_evaluation_counts(sid)["failed"]
+            if failed and st.button(f"↻  Retry {failed} Failed Evaluations"):
+                db.reset_failed_evaluations(sid)
+                snapshots.drop_snapshot(sid)
+                st.rerun()
+
+            if run_to_execute:
+                progress = st.progress(0, "Starting AI evaluation...")
+                live     = st.empty()
+                status   = execute_eval_run(run_to_execute, progress, live)
+                progress.empty()
+                if status == "completed":
+                    st.success("Evaluation run completed!")
+                    st.rerun()
+                else:
+                    st.warning(f"Evaluation run {status}. Resume it to pick up the remaining answers.")
+
+            if st.toggle("📡  Watch live results", key="watch_live"):
+                show_live_results(sid)
+
+            report = db.get_prescore_report(sid)
+            if report["evaluated"]:
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.markdown('<div class="section-title">Pre-scorer Report</div>', unsafe_allow_html=True)
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Evaluated", report["evaluated"])
+                c2.metric("Model Calls Saved", report["calls_saved"], f"{report['saved_pct']:.1f}%")
+                c3.metric("Model Calls Made", report["remote_calls"])
+                if report["audited"]:
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Pre-scores Audited by a Model", report["audited"])
+                    c2.metric("Mean Difference (marks)", f"{report['mean_abs_diff']:.2f}")
+                    c3.metric("Within ±1 Mark", f"{report['within_one_pct']:.0f}%")
+                by_provider = {k: v for k, v in report["by_source"].items() if k != "prescore"}
+                if by_provider:
+                    st.caption("By provider: " + " · ".join(f"{k} {v}" for k, v in sorted(by_provider.items())))
+
+            quota_rows = evaluator.quota_stats()
+            if quota_rows:
+                budget = evaluator.budget()
+                spent  = db.get_session_eval_cost(sid)
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.markdown('<div class="section-title">Quota & Spend</div>', unsafe_allow_html=True)
+                c1, c2 = st.columns(2)
+                c1.metric("Session Spend", f"{spent:.4f}" + (f" / {budget.per_session:g}" if budget.per_session else ""))
+                c2.metric("Spent Today (this process)", f"{budget.spent:.4f}" + (f" / {budget.daily:g}" if budget.daily else ""))
+                for name, q in quota_rows.items():
+                    st.caption(
+                        f"**{name}** · concurrency {q['concurrency']} ({q['in_flight']} in flight) · "
+                        f"{q['rpm_used']}{'/' + str(q['rpm']) if q['rpm'] else ''} req/min · "
+                        f"{q['tpm_used']}{'/' + str(q['tpm']) if q['tpm'] else ''} tokens/min · "
+                        f"{q['requests']} requests · {q['throttled']} rate-limited · "
+                        f"{q['prompt_tokens'] + q['output_tokens']} tokens · cost {q['cost']:.4f}"
+                    )
+                for name, c in evaluator.context_cache_stats().items():
+                    st.caption(f"**{name}** context cache · {c['cached']} prompt prefixes cached · "
+                               f"{c['too_short']} too short to cache · {c['failed']} refused by Gemini")
+
     with tab4:
         sessions = db.get_all_sessions()
         if not sessions:
@@ -879,17 +1303,139 @@ def show_admin_panel():
         else:
             sel  = st.selectbox("Select Session", [f"{s['id']} — {s['title']}" for s in sessions], key="view_sess")
             sid  = int(sel.split("—")[0].strip())
-            subs = db.get_all_submissions_for_session(sid)
-
-            if not subs:
-                st.info("No submissions for this session.")
+            session = next(s for s in sessions if s["id"] == sid)
+
+            c1, c2 = st.columns([4, 1])
+            query  = c1.text_input("🔎  Search answers, transcripts and feedback", key="search_q").strip()
+            scope  = c2.selectbox("In", ["This session", "All sessions"], key="search_scope")
+            if query:
+                if st.session_state.get("search_last") != (query, scope, sid):
+                    st.session_state.search_last = (query, scope, sid)
+                    st.session_state.search_page = 0
+                page = st.session_state.search_page
+                hits = db.search_submissions(query, sid if scope == "This session" else None,
+                                             limit=SEARCH_PAGE_SIZE + 1, offset=page * SEARCH_PAGE_SIZE)
+                more = len(hits) > SEARCH_PAGE_SIZE
+                if not hits:
+                    st.info("No matching answers. Archived sessions are not searchable.")
+                for h in hits[:SEARCH_PAGE_SIZE]:
+                    score = f"{h['score']:.1f}/{h['max_score']}" if h["score"] is not None else "Pending"
+                    st.markdown(f"**{h['student_name'] or h['student_email']}** · session {h['session_id']} · "
+                                f"{h['question_text'][:80]} · `{score}`  \n{h['snippet']}")
+                c1, c2, c3 = st.columns([1, 2, 1])
+                if page and c1.button("← Previous", key="search_prev"):
+                    st.session_state.search_page -= 1
+                    st.rerun()
+                c2.caption(f"Page {page + 1}")
+                if more and c3.button("Next →", key="search_next"):
+                    st.session_state.search_page += 1
+                    st.rerun()
             else:
                 import pandas as pd
-                df = pd.DataFrame(subs)[["student_name", "student_email", "question_text", "answer_text", "score", "max_marks", "feedback", "submitted_at"]]
-                df.columns = ["Name", "Email", "Question", "Answer", "Score", "Max", "Feedback", "Submitted At"]
-                st.dataframe(df, use_container_width=True, height=400)
-                csv = df.to_csv(index=False).encode()
-                st.download_button("Download CSV", csv, "submissions.csv", "text/csv")
+                if snapshots.ensure_snapshot(session):
+                    df = snapshots.read_scores_df(sid)
+                else:
+                    cols, rows = db.get_submission_rows(sid)
+                    df = pd.DataFrame.from_records(rows, columns=cols)
+
+                if len(df) == 0:
+                    st.info("No submissions for this session.")
+                else:
+                    if "answer_transcript" in df:   # handwritten answers show their transcript
+                        df["answer_text"] = df["answer_text"].fillna(df["answer_transcript"])
+                    df = df[["student_name", "student_email", "question_text", "answer_text", "score", "max_marks", "feedback", "submitted_at"]]
+                    df.columns = ["Name", "Email", "Question", "Answer", "Score", "Max", "Feedback", "Submitted At"]
+                    st.dataframe(df, use_container_width=True, height=400)
+                    csv = df.to_csv(index=False).encode()
+                    st.download_button("Download CSV", csv, "submissions.csv", "text/csv")
+
+    with tab5:
+        sessions = db.get_all_sessions()
+        if not sessions:
+            st.info("No sessions found.")
+        else:
+            sel   = st.selectbox("Select Session", [f"{s['id']} — {s['title']}" for s in sessions], key="stats_sess")
+            sid   = int(sel.split("—")[0].strip())
+            stats = analytics.session_stats(sid)
+
+            if not stats["evaluated"]:
+                st.info("No evaluated submissions yet for this session.")
+            else:
+                c1, c2, c3, c4 = st.columns(4)
+                c1.metric("Students", stats["students"])
+                c2.metric("Mean", f"{stats['mean']:.1f}%")
+                c3.metric("Median", f"{stats['median']:.1f}%")
+                c4.metric("Std Dev", f"{stats['std']:.1f}")
+
+                pcts = stats["percentiles"]
+                st.caption("Percentiles — " + "  ·  ".join(f"P{k}: {v:.1f}%" for k, v in pcts.items()))
+                tts = stats["time_to_submit_min"]
+                if tts["median"] is not None:
+                    st.caption(f"Time to submit — median {tts['median']:.0f} min  ·  mean {tts['mean']:.0f} min  ·  P90 {tts['p90']:.0f} min")
+
+                st.markdown('<div class="section-title">Score Distribution</div>', unsafe_allow_html=True)
+                st.bar_chart(stats["histogram"], x="range", y="students")
+
+                st.markdown('<div class="section-title">Per-Question Statistics</div>', unsafe_allow_html=True)
+                qdf = stats["questions"].copy()
+                qdf.insert(0, "Q", [f"Q{i}" for i in range(1, len(qdf) + 1)])
+                qdf = qdf.drop(columns=["question_id"]).round(2)
+                qdf.columns = ["Q", "Answers", "Mean", "Median", "Std Dev", "Max", "Difficulty", "Discrimination"]
+                st.dataframe(qdf, use_container_width=True, hide_index=True)
+                st.caption("Difficulty = mean score ÷ max marks (higher is easier). "
+                           "Discrimination = top 27% mean − bottom 27% mean, per mark.")
+
+    with tab6:
+        show_performance_panel()
+
+
+def show_performance_panel():
+    """Slowest database/evaluator calls of this browser session, and one-off rerun profiles."""
+    import pandas as pd
+    scope = st.session_state.profile_scope
+    if not profiling.ENABLED:
+        st.info("Call timing is off. Set PROFILE=1 in the environment and restart to record every "
+                "database and evaluator call.")
+    else:
+        recs = profiling.records(scope)
+        c1, c2 = st.columns([4, 1])
+        c1.caption(f"{len(recs)} calls recorded in this browser session "
+                   f"(last {profiling.BUFFER_SIZE} per process are kept).")
+        if c2.button("Clear", key="perf_clear"):
+            profiling.clear(scope)
+            st.rerun()
+
+        st.markdown('<div class="section-title">By Function</div>', unsafe_allow_html=True)
+        agg = profiling.summary(scope)
+        if agg:
+            df = pd.DataFrame(agg)[["kind", "name", "calls", "total_ms", "mean_ms", "max_ms", "rows", "bytes"]]
+            df["bytes"] = (df["bytes"] / 1024).round(1)
+            df.columns = ["Kind", "Function", "Calls", "Total ms", "Mean ms", "Max ms", "Rows", "KB"]
+            st.dataframe(df.round(2), use_container_width=True, hide_index=True)
+
+        st.markdown('<div class="section-title">Slowest Calls</div>', unsafe_allow_html=True)
+        for r in profiling.slowest(scope, n=15):
+            label = (f"{r['ms']:.1f} ms  ·  {r['kind']}.{r['name']}  ·  {r['rows']} rows  ·  "
+                     f"{r['bytes'] / 1024:.1f} KB  ·  {r['at']:%H:%M:%S}")
+            with st.expander(label):
+                if not r["statements"]:
+                    st.caption("No SQL statements.")
+                for q in r["statements"]:
+                    st.caption(f"{q['ms']:.2f} ms  ·  {q['rows']} rows")
+                    st.code(q["sql"], language="sql")
+                if r["dropped"]:
+                    st.caption(f"…and {r['dropped']} more statements.")
+
+    st.markdown('<div class="section-title">Profile One Rerun</div>', unsafe_allow_html=True)
+    st.caption("Reruns this page under pyinstrument (if installed) or cProfile.")
+    if st.button("Profile next rerun", key="perf_profile"):
+        st.session_state.profile_next_rerun = True
+        st.rerun()
+    report = st.session_state.get("profile_report")
+    if report:
+        st.download_button(f"Download {report['filename']}", report["file"], report["filename"])
+        with st.expander(f"{report['engine']} report", expanded=True):
+            st.code(report["text"], language="text")
 
 
 # ══════════════════════════════════════════════════════════════════
@@ -916,4 +1462,11 @@ def main():
             st.error("Access denied. Admins only.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if st.session_state.pop("profile_next_rerun", False):
+        with profiling.profile_run() as report:
+            # Stored before main() runs: profile_run fills the dict on exit,
+            # also when the rerun ends in st.rerun(), and the next run shows it.
+            st.session_state.profile_report = report
+            main()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,106 @@
+import hmac
+import time
+import base64
+import hashlib
+from functools import lru_cache
+
+# Login state that survives a reconnect to a different app replica: the
+# signed token is kept in a first-party cookie (never in the URL, where it
+# would leak through history, Referer headers and shared links), so no
+# replica needs sticky sessions or shared session memory to recognise a
+# returning user.
+TOKEN_TTL = 12 * 3600   # seconds
+
+
+def _sign(payload: str, secret: str) -> str:
+    digest = hmac.new(secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def issue_token(user_id: int, secret: str, ttl: int = TOKEN_TTL) -> str:
+    """Return a '<user_id>.<expiry>.<signature>' login token."""
+    payload = f"{int(user_id)}.{int(time.time()) + ttl}"
+    return f"{payload}.{_sign(payload, secret)}"
+
+
+def verify_token(token: str, secret: str):
+    """Return the user id of a valid, unexpired token, else None."""
+    try:
+        user_id, expires, signature = token.split(".")
+        payload = f"{user_id}.{expires}"
+        if not hmac.compare_digest(signature, _sign(payload, secret)):
+            return None
+        if int(expires) < time.time():
+            return None
+        return int(user_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+# ══════════════════════════════════════════════════════════════════
+#  GOOGLE SIGN-IN
+# ══════════════════════════════════════════════════════════════════
+# Hundreds of students sign in within minutes of an exam opening, so the
+# client config is built once and token/userinfo calls share one pooled
+# HTTPS connection pool instead of opening a connection per login.
+GOOGLE_AUTH_URI     = "https://accounts.google.com/o/oauth2/auth"
+GOOGLE_TOKEN_URI    = "https://oauth2.googleapis.com/token"
+GOOGLE_USERINFO_URI = "https://www.googleapis.com/oauth2/v3/userinfo"
+HTTP_POOL_MAXSIZE   = 32
+HTTP_TIMEOUT        = 15   # seconds
+
+_http_adapter = None
+_http_session = None
+
+
+@lru_cache(maxsize=8)
+def oauth_client_config(client_id: str, client_secret: str, redirect_uri: str,
+                        auth_uri: str = GOOGLE_AUTH_URI, token_uri: str = GOOGLE_TOKEN_URI) -> dict:
+    return {"web": {
+        "client_id": client_id, "client_secret": client_secret,
+        "auth_uri": auth_uri, "token_uri": token_uri,
+        "redirect_uris": [redirect_uri],
+    }}
+
+
+def http_adapter():
+    """One connection pool per process, mounted on every session that talks to Google."""
+    global _http_adapter
+    if _http_adapter is None:
+        from requests.adapters import HTTPAdapter
+        _http_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE)
+    return _http_adapter
+
+
+def http_session():
+    global _http_session
+    if _http_session is None:
+        import requests
+        session = requests.Session()
+        session.mount("https://", http_adapter())
+        session.mount("http://", http_adapter())
+        _http_session = session
+    return _http_session
+
+
+def oauth_flow(client_config: dict, scopes, redirect_uri: str, state: str = None):
+    from google_auth_oauthlib.flow import Flow
+    # The OAuth callback lands in a fresh Streamlit session, so a PKCE
+    # verifier generated for the sign-in URL could not be carried over.
+    flow = Flow.from_client_config(client_config, scopes=scopes, state=state,
+                                   autogenerate_code_verifier=False)
+    flow.redirect_uri = redirect_uri
+    flow.oauth2session.mount("https://", http_adapter())
+    flow.oauth2session.mount("http://", http_adapter())
+    return flow
+
+
+def fetch_google_userinfo(client_config: dict, scopes, redirect_uri: str, code: str,
+                          state: str = None, userinfo_uri: str = GOOGLE_USERINFO_URI) -> dict:
+    """Exchange an authorization code and return Google's userinfo for it."""
+    flow = oauth_flow(client_config, scopes, redirect_uri, state)
+    flow.fetch_token(code=code, timeout=HTTP_TIMEOUT)
+    resp = http_session().get(userinfo_uri, timeout=HTTP_TIMEOUT,
+                              headers={"Authorization": f"Bearer {flow.credentials.token}"})
+    resp.raise_for_status()
+    return resp.json()
@@ -0,0 +1,184 @@
+"""REST API vs Streamlit load test for polled results.
+
+Seeds a scratch session with scored answers, starts `api.py` under
+uvicorn on localhost, and polls the rankings the way an LMS integration
+would: plain GETs, then conditional GETs that send back the last ETag.
+For comparison it times the same poll through the Streamlit path, where
+every request is a full script rerun of the Rankings page.
+
+    pip install -r requirements-api.txt
+    python benchmarks/api_loadtest.py --students 300 --requests 2000 --threads 16
+
+Uses DATABASE_URL / CACHE_URL from the environment; without them it
+falls back to a scratch SQLite file and the in-process cache.
+"""
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+SECRET       = "loadtest-secret"
+API_KEY      = "loadtest-key"
+EMAIL_DOMAIN = "loadtest.local"
+os.environ["AUTH_SECRET"] = SECRET
+os.environ["API_KEY"]     = API_KEY
+
+
+# ══════════════════════════════════════════════════════════════════
+#  SETUP
+# ══════════════════════════════════════════════════════════════════
+def seed(students, questions):
+    """A scored, inactive scratch session; not create_session, which would deactivate a real one."""
+    import database as db
+    p = db.placeholder()
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"INSERT INTO exam_sessions (title, is_active) VALUES ({p}, 0) RETURNING id", ("API load test",))
+        session_id = cur.fetchone()[0]
+    db.add_questions(session_id, [(f"Question {n}?", 4, "", "", "", "", "") for n in range(questions)])
+    qids = [q["id"] for q in db.get_questions_for_session(session_id)]
+    users = []
+    for i in range(students):
+        user = db.upsert_user(f"student{i}@{EMAIL_DOMAIN}", f"Student {i}", "")
+        db.save_drafts(user["id"], session_id, {q: f"answer {i}" for q in qids})
+        db.promote_drafts(user["id"], session_id, qids)
+        users.append(user)
+    for sub in db.get_all_submissions_for_session(session_id):
+        db.save_evaluation(sub["id"], sub["user_id"] % 5, "ok", "prescore")
+    return session_id, users
+
+
+def cleanup(session_id):
+    import database as db
+    p = db.placeholder()
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DELETE FROM submissions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM answer_drafts WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM questions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM exam_sessions WHERE id={p}", (session_id,))
+        cur.execute(f"DELETE FROM users WHERE email LIKE {p}", (f"%@{EMAIL_DOMAIN}",))
+
+
+def start_api():
+    import uvicorn
+    import api
+    config = uvicorn.Config(api.app, host="127.0.0.1", port=0, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+# ══════════════════════════════════════════════════════════════════
+#  CLIENTS
+# ══════════════════════════════════════════════════════════════════
+_local = threading.local()
+
+
+def _session(token):
+    import requests
+    if not hasattr(_local, "http"):
+        _local.http = requests.Session()
+        _local.http.headers["Authorization"] = f"Bearer {token}"
+        _local.etag = None
+    return _local.http
+
+
+def poll_api(base, session_id, token, conditional):
+    http = _session(token)
+    headers = {"If-None-Match": _local.etag} if conditional and _local.etag else {}
+    start = time.perf_counter()
+    r = http.get(f"{base}/sessions/{session_id}/rankings", params={"limit": 50}, headers=headers)
+    elapsed = time.perf_counter() - start
+    if r.status_code not in (200, 304):
+        raise RuntimeError(f"rankings answered {r.status_code}: {r.text[:200]}")
+    _local.etag = r.headers.get("ETag")
+    return elapsed, r.status_code, len(r.content)
+
+
+def poll_streamlit(user, polls):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.session_state["user"] = user
+    at.run()
+    at.sidebar.radio[0].set_value("🏆  Rankings").run()
+    times = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return times
+
+
+# ══════════════════════════════════════════════════════════════════
+#  DRIVER
+# ══════════════════════════════════════════════════════════════════
+def report(name, lat, wall, extra=""):
+    lat = sorted(t * 1000 for t in lat)
+    p95 = lat[math.ceil(len(lat) * 0.95) - 1]
+    print(f"{name:<22} {len(lat):>6} req  {len(lat) / wall:>8.1f} /s  "
+          f"p50 {statistics.median(lat):>8.2f} ms  p95 {p95:>8.2f} ms  {extra}")
+
+
+def run_api_phase(name, base, session_id, tokens, n, threads, conditional):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(lambda i: poll_api(base, session_id, tokens[i % len(tokens)], conditional), range(n)))
+    wall = time.perf_counter() - start
+    not_modified = sum(1 for r in results if r[1] == 304)
+    kb = sum(r[2] for r in results) / len(results) / 1024
+    report(name, [r[0] for r in results], wall, f"304s {not_modified:>5}  avg body {kb:.1f} KB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--students", type=int, default=300)
+    ap.add_argument("--questions", type=int, default=5)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--streamlit-polls", type=int, default=20)
+    args = ap.parse_args()
+
+    # Before seeding: api.py loads .env on import, and must see the same database.
+    from dotenv import load_dotenv
+    load_dotenv()
+    if not os.getenv("DATABASE_URL"):
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "api_loadtest.db")
+        print(f"DATABASE_URL not set — using scratch SQLite at {os.environ['SQLITE_PATH']}")
+    import auth
+    import cache
+    import database as db
+    db.configure()
+    db.init_db()
+    cache.configure(os.getenv("CACHE_URL", ""))
+
+    session_id, users = seed(args.students, args.questions)
+    try:
+        tokens = [auth.issue_token(u["id"], SECRET) for u in users]
+        print(f"seeded {args.students} students x {args.questions} answers in session {session_id}")
+
+        base = start_api()
+        run_api_phase("api GET", base, session_id, tokens, args.requests, args.threads, conditional=False)
+        run_api_phase("api If-None-Match", base, session_id, tokens, args.requests, args.threads, conditional=True)
+
+        times = poll_streamlit(users[0], args.streamlit_polls)
+        report("streamlit rerun", times, sum(times), "(one session, sequential)")
+    finally:
+        cleanup(session_id)
+
+
+if __name__ == "__main__":
+    main()
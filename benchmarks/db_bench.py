@@ -0,0 +1,243 @@
+"""Query benchmark for the submission reads that grow with a session.
+
+Seeds one session per scale with synthetic students, questions and
+answers, then times `get_rankings`, `get_unevaluated_submissions` and
+`get_all_submissions_for_session` against it. Answer lengths follow a
+log-normal word count (most answers are a paragraph or two, a few are
+essays), a share of answers are images with log-normal byte sizes, and
+about half of the session is already scored.
+
+    python benchmarks/db_bench.py --scales 1000,10000,100000
+    python benchmarks/db_bench.py --save baseline.json
+    python benchmarks/db_bench.py --baseline baseline.json --threshold 0.25
+
+Each query reports its row count, median and p95 latency over
+--repeat calls, and the peak Python memory of one extra call (tracemalloc,
+so it covers the row dicts, not the driver's C buffers). With --baseline
+the run exits 1 when a median or peak grows past the threshold.
+
+SQLite runs in a scratch file per scale. --postgres also runs against
+DATABASE_URL (e.g. the server in benchmarks/docker-compose.yml); the rows
+it seeds there are deleted again afterwards.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+EMAIL_DOMAIN = "dbbench.local"
+SEED_BATCH   = 2000
+WORDS = ("stack queue pointer array linked list tree binary search hash table collision "
+         "sorting merge quick heap complexity recursion base case process thread deadlock "
+         "semaphore mutex paging segmentation cache memory virtual address protocol packet "
+         "router switch latency bandwidth normalization relation key index transaction "
+         "commit rollback query join schema compiler parser token grammar inheritance "
+         "polymorphism encapsulation class object method interface algorithm graph vertex "
+         "edge traversal breadth depth first shortest path dynamic programming greedy").split()
+
+QUERIES = {
+    "get_rankings":                    lambda db, sid: db.get_rankings(sid),
+    "get_unevaluated_submissions":     lambda db, sid: db.get_unevaluated_submissions(sid),
+    "get_all_submissions_for_session": lambda db, sid: db.get_all_submissions_for_session(sid),
+    "get_submission_rows":             lambda db, sid: db.get_submission_rows(sid)[1],
+}
+
+
+# ══════════════════════════════════════════════════════════════════
+#  SYNTHETIC DATA
+# ══════════════════════════════════════════════════════════════════
+def answer_text(rng, median_words):
+    words = min(int(rng.lognormvariate(math.log(median_words), 0.6)) + 1, median_words * 8)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def answer_image(rng, median_kb, blobs):
+    """Image-sized bytes; a small pool of random blobs is sliced so seeding stays fast."""
+    size = min(int(rng.lognormvariate(math.log(median_kb * 1024), 0.5)), len(blobs[0]))
+    return rng.choice(blobs)[:size]
+
+
+def seed(db, submissions, args, rng):
+    """One session holding `submissions` answers; returns the session id."""
+    p = db.placeholder()
+    students = math.ceil(submissions / args.questions)
+    with db.get_db() as conn:   # not create_session: that would deactivate a real session
+        cur = conn.cursor()
+        cur.execute(f"INSERT INTO exam_sessions (title, is_active) VALUES ({p}, 0) RETURNING id",
+                    (f"DB bench {submissions}",))
+        session_id = cur.fetchone()[0]
+    db.add_questions(session_id, [(f"Explain topic {n}.", 4, "", answer_text(rng, 60),
+                                   "", "bench", "") for n in range(args.questions)])
+    qids = [q["id"] for q in db.get_questions_for_session(session_id)]
+    tag = f"s{session_id}"
+    db.add_users([(f"{tag}-student{i}@{EMAIL_DOMAIN}", f"Student {tag}-{i}", "student")
+                  for i in range(students)])
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT id FROM users WHERE email LIKE {p} ORDER BY id", (f"{tag}-%@{EMAIL_DOMAIN}",))
+        uids = [r[0] for r in cur.fetchall()]
+
+    blob_size = args.image_kb * 1024 * 4
+    blobs = [os.urandom(blob_size) for _ in range(8)]
+    start = datetime.now() - timedelta(hours=3)
+    sql = f"""
+        INSERT INTO submissions
+            (user_id, question_id, session_id, answer_text, answer_image, answer_image_name,
+             answer_type, content_hash, score, max_score, feedback, eval_source, evaluated_at, submitted_at)
+        VALUES ({db.ph(14)})
+    """
+    batch, made = [], 0
+    for uid in uids:
+        for qid in qids:
+            if made == submissions:
+                break
+            made += 1
+            if rng.random() < args.image_ratio:
+                text, image, name, kind = None, answer_image(rng, args.image_kb, blobs), "answer.jpg", "image"
+            else:
+                text, image, name, kind = answer_text(rng, args.words), None, None, "text"
+            submitted = start + timedelta(seconds=rng.randrange(3 * 3600))
+            if rng.random() < args.evaluated:
+                score, feedback = round(rng.uniform(0, 4) * 2) / 2, answer_text(rng, 40)
+                source, evaluated = "prescore", submitted + timedelta(minutes=30)
+            else:
+                score = feedback = source = evaluated = None
+            batch.append((uid, qid, session_id, text, image, name, kind,
+                          db.content_hash(image if image is not None else text),
+                          score, 4, feedback, source, evaluated, submitted))
+            if len(batch) == SEED_BATCH:
+                with db.get_db() as conn:
+                    conn.cursor().executemany(sql, batch)
+                batch = []
+    if batch:
+        with db.get_db() as conn:
+            conn.cursor().executemany(sql, batch)
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute("ANALYZE")
+    return session_id
+
+
+def cleanup(db, session_id):
+    p = db.placeholder()
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DELETE FROM submissions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM questions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM exam_sessions WHERE id={p}", (session_id,))
+        cur.execute(f"DELETE FROM users WHERE email LIKE {p}", (f"s{session_id}-%@{EMAIL_DOMAIN}",))
+
+
+# ══════════════════════════════════════════════════════════════════
+#  MEASUREMENT
+# ══════════════════════════════════════════════════════════════════
+def measure(db, session_id, fn, repeat):
+    fn(db, session_id)   # warm the page cache / plan cache
+    lat = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fn(db, session_id)
+        lat.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn(db, session_id)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    lat.sort()
+    return {
+        "rows":      len(rows),
+        "median_ms": statistics.median(lat),
+        "p95_ms":    lat[math.ceil(len(lat) * 0.95) - 1],
+        "peak_mib":  peak / 2**20,
+    }
+
+
+def run_backend(backend, db, args):
+    results = {}
+    for n in args.scales:
+        if backend == "sqlite":
+            db.SQLITE_PATH = os.path.join(tempfile.mkdtemp(), f"db_bench_{n}.db")
+            db.configure("")
+        else:
+            db.configure()
+        db.init_db()
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        session_id = seed(db, n, args, rng)
+        print(f"{backend}: seeded {n} submissions in {time.perf_counter() - start:.1f}s")
+        try:
+            for name, fn in QUERIES.items():
+                r = measure(db, session_id, fn, args.repeat)
+                results[f"{backend}/{name}/{n}"] = r
+                print(f"  {name:<33} {n:>7}  rows {r['rows']:>7}  p50 {r['median_ms']:>9.2f} ms  "
+                      f"p95 {r['p95_ms']:>9.2f} ms  peak {r['peak_mib']:>8.1f} MiB")
+        finally:
+            if backend == "postgres":
+                cleanup(db, session_id)
+    return results
+
+
+def check(results, baseline, threshold):
+    """Names of measurements that regressed past `threshold` (a fraction) versus the baseline."""
+    regressions = []
+    for key, r in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        for metric in ("median_ms", "peak_mib"):
+            if r[metric] > old[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {old[metric]:.2f} -> {r[metric]:.2f}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="1000,10000,100000",
+                    help="comma-separated submission counts per session")
+    ap.add_argument("--questions", type=int, default=4, help="questions per session (answers per student)")
+    ap.add_argument("--words", type=int, default=150, help="median words per text answer")
+    ap.add_argument("--image-ratio", type=float, default=0.05, help="share of answers that are images")
+    ap.add_argument("--image-kb", type=int, default=60, help="median image size in KB")
+    ap.add_argument("--evaluated", type=float, default=0.5, help="share of answers already scored")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--postgres", action="store_true", help="also run against DATABASE_URL")
+    ap.add_argument("--save", help="write results as JSON (a baseline for later runs)")
+    ap.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    ap.add_argument("--threshold", type=float, default=0.2,
+                    help="allowed growth over the baseline, as a fraction (0.2 = 20%%)")
+    args = ap.parse_args()
+    args.scales = [int(s) for s in args.scales.split(",") if s.strip()]
+
+    import database as db
+    results = run_backend("sqlite", db, args)
+    if args.postgres:
+        db.configure()
+        if not db.USE_POSTGRES:
+            sys.exit("--postgres needs DATABASE_URL set to a postgresql:// URL")
+        results.update(run_backend("postgres", db, args))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"saved {len(results)} measurements to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = check(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Sign-in throughput against a local stub OAuth server.
+
+Runs the Google sign-in callback (code exchange, userinfo, user upsert)
+against a stub token/userinfo server on localhost, so the numbers show
+this app's own overhead rather than Google's latency. It compares the
+current pipeline (one client config, pooled HTTP, one RETURNING upsert)
+with the previous one (config rebuilt per login, un-pooled userinfo
+request, upsert then re-select then admin promotion), then times token
+restores served from the user LRU.
+
+    python benchmarks/login_bench.py --logins 1000 --threads 16
+"""
+import os
+import sys
+import math
+import json
+import time
+import tempfile
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = "1"
+
+SCOPES = ["openid", "https://www.googleapis.com/auth/userinfo.email",
+          "https://www.googleapis.com/auth/userinfo.profile"]
+REDIRECT_URI = "http://localhost:8501"
+ADMIN_EVERY  = 50   # every Nth student is listed in ADMIN_EMAILS
+
+
+# ══════════════════════════════════════════════════════════════════
+#  STUB OAUTH SERVER
+# ══════════════════════════════════════════════════════════════════
+class StubOAuth(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, so pooled clients can reuse connections
+    disable_nagle_algorithm = True   # headers and body go out as separate writes
+    connections = set()
+
+    def _reply(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        StubOAuth.connections.add(self.client_address)
+
+    def do_POST(self):   # token endpoint: the code is echoed back as the access token
+        from urllib.parse import parse_qs
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        self._reply({"access_token": form["code"][0], "token_type": "Bearer", "expires_in": 3600})
+
+    def do_GET(self):    # userinfo endpoint
+        n = self.headers["Authorization"].split("-")[-1]
+        self._reply({"email": f"student{n}@bench.local", "name": f"Student {n}", "picture": ""})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOAuth)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ══════════════════════════════════════════════════════════════════
+#  LOGIN PIPELINES
+# ══════════════════════════════════════════════════════════════════
+def login_current(base, n, admins):
+    import auth
+    import database as db
+    config = auth.oauth_client_config("bench-client", "bench-secret", REDIRECT_URI,
+                                      token_uri=f"{base}/token")
+    info = auth.fetch_google_userinfo(config, SCOPES, REDIRECT_URI, f"code-{n}",
+                                      userinfo_uri=f"{base}/userinfo")
+    return db.upsert_user(info["email"], info["name"], info["picture"], admin=info["email"] in admins)
+
+
+def login_previous(base, n, admins):
+    import requests
+    import database as db
+    from google_auth_oauthlib.flow import Flow
+    flow = Flow.from_client_config(
+        {"web": {
+            "client_id": "bench-client", "client_secret": "bench-secret",
+            "auth_uri": f"{base}/auth", "token_uri": f"{base}/token",
+            "redirect_uris": [REDIRECT_URI],
+        }},
+        scopes=SCOPES, autogenerate_code_verifier=False,
+    )
+    flow.redirect_uri = REDIRECT_URI
+    flow.fetch_token(code=f"code-{n}")
+    info = requests.get(f"{base}/userinfo",
+                        headers={"Authorization": f"Bearer {flow.credentials.token}"}).json()
+    p = db.placeholder()
+    with db.get_db() as conn:
+        conn.cursor().execute(f"""
+            INSERT INTO users (email, name, picture) VALUES ({p},{p},{p})
+            ON CONFLICT(email) DO UPDATE SET name=EXCLUDED.name, picture=EXCLUDED.picture
+        """, (info["email"], info["name"], info["picture"]))
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT * FROM users WHERE email={p}", (info["email"],))
+        user = db.fetchone(cur)
+    if info["email"] in admins and user["role"] != "admin":
+        with db.get_db() as conn:
+            conn.cursor().execute(f"UPDATE users SET role='admin' WHERE email={p}", (info["email"],))
+        with db.get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT * FROM users WHERE email={p}", (info["email"],))
+            user = db.fetchone(cur)
+    return user
+
+
+# ══════════════════════════════════════════════════════════════════
+#  DRIVER
+# ══════════════════════════════════════════════════════════════════
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def run_phase(name, fn, calls, threads):
+    StubOAuth.connections.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(lambda args: timed(fn, *args), calls))
+    wall = time.perf_counter() - start
+    lat = sorted(r[0] * 1000 for r in results)
+    p95 = lat[math.ceil(len(lat) * 0.95) - 1]
+    print(f"{name:<16} {len(results):>6} logins  {len(results) / wall:>8.1f} /s  "
+          f"p50 {statistics.median(lat):>7.2f} ms  p95 {p95:>7.2f} ms  "
+          f"client ports {len({c[1] for c in StubOAuth.connections}):>5}")
+    return [r[1] for r in results]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--logins", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=16)
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "login_bench.db")
+        print(f"DATABASE_URL not set — using scratch SQLite at {os.environ['SQLITE_PATH']}")
+    import database as db
+    db.configure()
+    db.init_db()
+
+    base = start_stub()
+    # Each pipeline signs in a fresh cohort once, then the same cohort again (returning users).
+    for label, fn, offset in (("previous", login_previous, 0), ("current", login_current, args.logins)):
+        students = range(offset, offset + args.logins)
+        admins   = {f"student{n}@bench.local" for n in students[::ADMIN_EVERY]}
+        calls    = [(base, n, admins) for n in students]
+        run_phase(f"{label} new", fn, calls, args.threads)
+        users = run_phase(f"{label} again", fn, calls, args.threads)
+        wrong = sum(1 for u in users if (u["role"] == "admin") != (u["email"] in admins))
+        if wrong:
+            print(f"  {wrong} users with the wrong role")
+            sys.exit(1)
+
+    ids = [u["id"] for u in db.get_all_users()]
+    for uid in ids:
+        db.get_user_by_id(uid)   # the "previous" cohort was never cached
+    start = time.perf_counter()
+    for uid in ids * 5:
+        db.get_user_by_id(uid)
+    per = (time.perf_counter() - start) / (len(ids) * 5) * 1e6
+    print(f"token restore    {len(ids) * 5:>6} lookups {per:>8.2f} µs/lookup (user LRU, size {db.USER_CACHE_SIZE})")
+
+
+if __name__ == "__main__":
+    main()
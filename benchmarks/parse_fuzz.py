@@ -0,0 +1,145 @@
+"""Fuzz and benchmark the evaluation-reply parser.
+
+Feeds evaluator.parse_evaluation a corpus of hand-written malformed
+replies plus random mutations of valid ones, and checks that every reply
+either parses to a valid result or raises EvaluationParseError, never
+another exception and never an out-of-range score. It also counts how
+often the old regex scraper would have silently produced a wrong score,
+and times both parsers.
+
+    python benchmarks/parse_fuzz.py --mutations 20000
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from evaluator import parse_evaluation, EvaluationParseError  # noqa: E402
+
+MAX_MARKS = 4
+
+# (reply, expected score or None when the reply must be rejected)
+CORPUS = [
+    ('{"score": 3, "feedback": "Good."}', 3.0),
+    ('{"score": 2.5, "feedback": "Covers {a, b} but not {c}."}', 2.5),
+    ('```json\n{"score": 1, "feedback": "Brief."}\n```', 1.0),
+    ('  {"feedback": "Order swapped.", "score": 4}  ', 4.0),
+    ('{"score": "3", "feedback": "String score."}', None),
+    ('{"score": true, "feedback": "Bool score."}', None),
+    ('{"score": 5, "feedback": "Above max."}', None),
+    ('{"score": -1, "feedback": "Negative."}', None),
+    ('{"score": NaN, "feedback": "NaN."}', None),
+    ('{"score": Infinity, "feedback": "Inf."}', None),
+    ('{"score": 2, "feedback": ""}', None),
+    ('{"score": 2}', None),
+    ('{"feedback": "No score."}', None),
+    ('{"score": 2, "feedback": "Truncated', None),
+    ('Here is the evaluation: {"score": 2, "feedback": "Chatty."}', None),
+    ('{"score": 2, "feedback": "x"} trailing text', None),
+    ('[{"score": 2, "feedback": "List."}]', None),
+    ('{"score": {"value": 2}, "feedback": "Nested."}', None),
+    ("{'score': 2, 'feedback': 'Single quotes.'}", None),
+    ('', None),
+    ('   ', None),
+    ('null', None),
+    ('[' * 5000 + ']' * 5000, None),
+]
+
+
+def regex_parse(text, max_marks):
+    """The previous scraper, kept here only for comparison."""
+    try:
+        m = re.search(r'\{.*?\}', text.strip(), re.DOTALL)
+        if m:
+            result = json.loads(m.group())
+            score = max(0.0, min(float(result.get("score", 0)), float(max_marks)))
+            return {"score": score, "feedback": result.get("feedback", "No feedback provided.")}
+        return {"score": 0, "feedback": "Could not parse evaluation response."}
+    except Exception as e:
+        return {"score": 0, "feedback": f"Parse error: {e}"}
+
+
+def mutate(rng, text):
+    ops = [
+        lambda t: t[:rng.randrange(len(t) + 1)],                              # truncate
+        lambda t: t[:(i := rng.randrange(len(t) + 1))] + rng.choice('{}[]",:\\\n') + t[i:],
+        lambda t: t.replace('"', "'", 1),
+        lambda t: t + rng.choice([" ok", "}", "\n```", "\x00"]),
+        lambda t: rng.choice(["```json\n", "Result: ", ""]) + t,
+        lambda t: t.replace(str(rng.randint(0, 4)), rng.choice(["-2", "9", "1e9", "null"]), 1),
+    ]
+    for _ in range(rng.randint(1, 3)):
+        text = rng.choice(ops)(text)
+    return text
+
+
+def valid_reply(rng):
+    score = rng.choice([0, 1, 2, 2.5, 3, 3.75, 4])
+    feedback = rng.choice([
+        "Correct definition; missing example.",
+        "Explains {set} notation and uses {braces} inside feedback.",
+        "Uses a dict like {\"k\": 1} as an example.",
+        "Unicode: सही उत्तर ✓",
+    ])
+    return json.dumps({"score": score, "feedback": feedback}, ensure_ascii=rng.random() < 0.5), float(score)
+
+
+def check(reply):
+    """Return the parsed score, or None if rejected. Raises on contract violations."""
+    try:
+        result = parse_evaluation(reply, MAX_MARKS)
+    except EvaluationParseError:
+        return None
+    assert 0 <= result["score"] <= MAX_MARKS, reply
+    assert isinstance(result["feedback"], str) and result["feedback"], reply
+    return result["score"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mutations", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    failures = 0
+    for reply, expected in CORPUS:
+        got = check(reply)
+        if got != expected:
+            failures += 1
+            print(f"CORPUS MISMATCH expected {expected} got {got}: {reply[:80]!r}")
+
+    valid = [valid_reply(rng) for _ in range(args.mutations)]
+    replies = [mutate(rng, text) if rng.random() < 0.7 else text for text, _ in valid]
+    rejected = regex_wrong = 0
+    for reply, (_, score) in zip(replies, valid):
+        strict = check(reply)
+        rejected += strict is None
+        if strict is None and regex_parse(reply, MAX_MARKS)["score"] not in (0, 0.0):
+            regex_wrong += 1   # strict parser asks again; the regex would have kept a guessed score
+    # Braces inside feedback: valid replies the regex scraper gets wrong.
+    brace_replies = [text for text, _ in valid if "{" in json.loads(text)["feedback"]]
+    regex_broken = sum(1 for t in brace_replies if regex_parse(t, MAX_MARKS)["feedback"].startswith(("Parse error", "Could not")))
+
+    print(f"corpus: {len(CORPUS) - failures}/{len(CORPUS)} as expected")
+    print(f"mutations: {len(replies)} replies, {rejected} rejected with EvaluationParseError, 0 other exceptions")
+    print(f"regex scraper: {regex_broken}/{len(brace_replies)} valid replies with braces in feedback lost, "
+          f"{regex_wrong} malformed replies silently scored")
+
+    for name, fn in (("strict", check), ("regex", lambda r: regex_parse(r, MAX_MARKS))):
+        start = time.perf_counter()
+        for reply in replies:
+            fn(reply)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<7} {elapsed / len(replies) * 1e6:8.2f} µs/reply")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Multi-replica load test.
+
+Each worker process stands in for one `streamlit run app.py` replica: it
+has its own DB pool and cache client and no session memory. Every
+request is handed to whichever replica is free (no sticky sessions) and
+carries only the signed login token, so the run checks that login state,
+caching and cache invalidation work across replicas.
+
+    python benchmarks/replicas_loadtest.py --replicas 4 --students 400
+
+Uses DATABASE_URL / CACHE_URL from the environment (see
+docker-compose.yml for stand-ins); without them it falls back to a
+scratch SQLite file and per-process caches.
+"""
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+import statistics
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+SECRET       = "loadtest-secret"
+EMAIL_DOMAIN = "loadtest.local"
+
+
+# ══════════════════════════════════════════════════════════════════
+#  REPLICA (worker process)
+# ══════════════════════════════════════════════════════════════════
+def _replica_init():
+    import cache
+    import database as db
+    db.configure()
+    cache.configure()
+
+
+def _current_user(token):
+    import auth
+    import cache
+    import database as db
+    uid = auth.verify_token(token, SECRET)
+    if uid is None:
+        raise RuntimeError("token rejected by replica")
+    return cache.read_through(f"user:{uid}", lambda: db.get_user_by_id(uid), ttl=300)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, os.getpid(), result
+
+
+def req_login(i):
+    import auth
+    import database as db
+    user = db.upsert_user(f"student{i}@{EMAIL_DOMAIN}", f"Student {i}", "")
+    return auth.issue_token(user["id"], SECRET)
+
+
+def req_draft(token, session_id, question_id, text):
+    import database as db
+    user = _current_user(token)
+    db.save_drafts(user["id"], session_id, {question_id: text})
+
+
+def req_submit(token, session_id, question_ids):
+    import database as db
+    user = _current_user(token)
+    db.promote_drafts(user["id"], session_id, question_ids)
+
+
+def req_rankings(session_id):
+    import cache
+    import database as db
+    stamp = ":".join(db.get_score_stamp(session_id))
+    rows = cache.read_through(f"rankings:{session_id}:{stamp}", lambda: db.get_rankings(session_id), ttl=30)
+    return stamp, len(rows), cache.stats()
+
+
+def run(fn, *args):
+    return _timed(fn, *args)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  DRIVER
+# ══════════════════════════════════════════════════════════════════
+def seed(db, questions):
+    """An inactive scratch session; not create_session, which would deactivate a real one."""
+    p = db.placeholder()
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"INSERT INTO exam_sessions (title, description, is_active) VALUES ({p}, {p}, 0) RETURNING id",
+                    (f"Load test {time.strftime('%H:%M:%S')}", "replicas_loadtest.py"))
+        session_id = cur.fetchone()[0]
+    for q in range(questions):
+        db.add_question(session_id, f"Load-test question {q + 1}: explain topic {q + 1}.", 4)
+    return session_id
+
+
+def cleanup(db, session_id):
+    p = db.placeholder()
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DELETE FROM submissions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM answer_drafts WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM questions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM exam_sessions WHERE id={p}", (session_id,))
+        cur.execute(f"DELETE FROM users WHERE email LIKE {p}", (f"%@{EMAIL_DOMAIN}",))
+
+
+def _report(name, results, wall):
+    lat = sorted(r[0] * 1000 for r in results)
+    p95 = lat[math.ceil(len(lat) * 0.95) - 1]
+    replicas = len({r[1] for r in results})
+    print(f"{name:<10} {len(results):>6} req  {len(results) / wall:>8.1f} req/s  "
+          f"p50 {statistics.median(lat):>7.2f} ms  p95 {p95:>7.2f} ms  served by {replicas} replicas")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--replicas", type=int, default=4)
+    ap.add_argument("--students", type=int, default=200)
+    ap.add_argument("--questions", type=int, default=4)
+    ap.add_argument("--reads", type=int, default=500, help="leaderboard reads per phase")
+    args = ap.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "loadtest.db")
+        print(f"DATABASE_URL not set — using scratch SQLite at {os.environ['SQLITE_PATH']}")
+    if not os.getenv("CACHE_URL"):
+        print("CACHE_URL not set — each replica uses its own in-process cache")
+
+    import database as db
+    db.configure()
+    db.init_db()
+    sid  = seed(db, args.questions)
+    qids = [q["id"] for q in db.get_questions_for_session(sid)]
+    try:
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(args.replicas, initializer=_replica_init) as pool:
+            def phase(name, calls):
+                start = time.perf_counter()
+                results = pool.starmap(run, calls, chunksize=1)
+                _report(name, results, time.perf_counter() - start)
+                return [r[2] for r in results]
+
+            tokens = phase("login", [(req_login, i) for i in range(args.students)])
+            phase("draft", [(req_draft, t, sid, qid, f"Answer {i} to {qid} " * 20)
+                            for i, t in enumerate(tokens) for qid in qids])
+            phase("submit", [(req_submit, t, sid, qids) for t in tokens])
+            before = phase("rankings", [(req_rankings, sid) for _ in range(args.reads)])
+
+            # Score everything from outside the replicas; every replica must see
+            # the new leaderboard on its next read.
+            for sub in db.get_unevaluated_submissions(sid):
+                db.save_evaluation(sub["id"], 2.0, "load test", "prescore")
+            after = phase("rankings", [(req_rankings, sid) for _ in range(args.reads)])
+
+        stale = sum(1 for stamp, _, _ in after if stamp == before[0][0])
+        print(f"\nsubmissions: {len(db.get_all_submissions_for_session(sid))}  "
+              f"stale leaderboard reads after scoring: {stale}  cache: {after[-1][2]['backend']}")
+        if stale:
+            sys.exit(1)
+    finally:
+        cleanup(db, sid)
+
+
+if __name__ == "__main__":
+    main()
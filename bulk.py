@@ -0,0 +1,168 @@
+import io
+import re
+import csv
+import json
+
+import database as db
+import sampling
+
+# Question banks and candidate rosters in CSV, JSON or YAML. Every row is
+# validated before anything is written, and the whole file is then
+# inserted in one transaction through the batched database API.
+FORMATS         = ("csv", "json", "yaml")
+QUESTION_FIELDS = ["question_text", "marks", "hint", "reference_answer", "rubric", "tags", "difficulty"]
+ROSTER_FIELDS   = ["email", "name", "role"]
+MAX_MARKS       = 20   # same bound as the admin Questions form
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class ImportValidationError(ValueError):
+    """An import file with invalid rows; nothing from it was written."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid row(s): " + "; ".join(errors[:5]))
+        self.errors = errors
+
+
+def detect_format(filename: str) -> str:
+    ext = filename.rsplit(".", 1)[-1].lower()
+    fmt = "yaml" if ext == "yml" else ext
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported file type .{ext}; use CSV, JSON or YAML.")
+    return fmt
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("YAML files need PyYAML: pip install pyyaml")
+    return yaml
+
+
+# ══════════════════════════════════════════════════════════════════
+#  PARSE & SERIALIZE
+# ══════════════════════════════════════════════════════════════════
+def parse_records(data, fmt: str, key: str) -> list:
+    """Read a list of row dicts. JSON/YAML may also wrap the list as {key: [...]}."""
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    if fmt == "json":
+        records = json.loads(text)
+    else:
+        yaml = _yaml()
+        try:
+            records = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Could not read YAML: {e}")
+    if isinstance(records, dict):
+        records = records.get(key)
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError(f"Expected a list of {key} (or {{\"{key}\": [...]}}).")
+    return records
+
+
+def dump_records(records: list, fields: list, fmt: str, key: str) -> bytes:
+    rows = [{f: r.get(f) for f in fields} for r in records]
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return out.getvalue().encode("utf-8")
+    if fmt == "json":
+        return json.dumps({key: rows}, ensure_ascii=False, indent=2).encode("utf-8")
+    return _yaml().safe_dump({key: rows}, allow_unicode=True, sort_keys=False).encode("utf-8")
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+# ══════════════════════════════════════════════════════════════════
+#  QUESTION BANKS
+# ══════════════════════════════════════════════════════════════════
+def validate_questions(records: list) -> list:
+    """Return add_questions() tuples or raise ImportValidationError."""
+    rows, errors = [], []
+    for n, r in enumerate(records, 1):
+        text = _text(r.get("question_text") or r.get("question"))
+        if not text:
+            errors.append(f"row {n}: question_text is empty")
+            continue
+        marks = r.get("marks")
+        try:
+            value = 4.0 if marks in (None, "") else float(marks)
+        except (TypeError, ValueError):
+            errors.append(f"row {n}: marks {marks!r} is not a number")
+            continue
+        if not value.is_integer():
+            errors.append(f"row {n}: marks {marks!r} must be a whole number")
+            continue
+        marks = int(value)
+        if not 1 <= marks <= MAX_MARKS:
+            errors.append(f"row {n}: marks must be between 1 and {MAX_MARKS}")
+            continue
+        rubric = r.get("rubric")
+        if isinstance(rubric, list):   # YAML/JSON may list rubric points
+            rubric = "\n".join(_text(pt) for pt in rubric if _text(pt))
+        difficulty = _text(r.get("difficulty")).lower()
+        if difficulty and difficulty not in sampling.DIFFICULTIES:
+            errors.append(f"row {n}: difficulty must be one of {', '.join(sampling.DIFFICULTIES)}")
+            continue
+        tags = r.get("tags")
+        tags = ", ".join(_text(t).lower() for t in tags) if isinstance(tags, list) else ", ".join(sampling.parse_tags(tags))
+        rows.append((text, marks, _text(r.get("hint")), _text(r.get("reference_answer")), _text(rubric),
+                     tags, difficulty))
+    if not rows and not errors:
+        errors.append("the file has no questions")
+    if errors:
+        raise ImportValidationError(errors)
+    return rows
+
+
+def import_questions(session_id: int, data, fmt: str) -> int:
+    rows = validate_questions(parse_records(data, fmt, "questions"))
+    return db.add_questions(session_id, rows)
+
+
+def export_questions(session_id: int, fmt: str) -> bytes:
+    return dump_records(db.get_questions_for_session(session_id), QUESTION_FIELDS, fmt, "questions")
+
+
+# ══════════════════════════════════════════════════════════════════
+#  CANDIDATE ROSTERS
+# ══════════════════════════════════════════════════════════════════
+def validate_roster(records: list) -> list:
+    """Return (email, name, role) tuples or raise ImportValidationError."""
+    rows, errors, seen = [], [], set()
+    for n, r in enumerate(records, 1):
+        email = _text(r.get("email")).lower()
+        if not _EMAIL_RE.match(email):
+            errors.append(f"row {n}: invalid email {email!r}")
+            continue
+        if email in seen:
+            errors.append(f"row {n}: duplicate email {email}")
+            continue
+        role = _text(r.get("role")).lower() or "student"
+        if role not in ("student", "admin"):
+            errors.append(f"row {n}: role must be student or admin")
+            continue
+        seen.add(email)
+        rows.append((email, _text(r.get("name")), role))
+    if not rows and not errors:
+        errors.append("the file has no candidates")
+    if errors:
+        raise ImportValidationError(errors)
+    return rows
+
+
+def import_roster(data, fmt: str) -> int:
+    rows = validate_roster(parse_records(data, fmt, "candidates"))
+    return db.add_users(rows)
+
+
+def export_roster(fmt: str) -> bytes:
+    return dump_records(db.get_all_users(), ROSTER_FIELDS, fmt, "candidates")
@@ -0,0 +1,167 @@
+import os
+import hmac
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# ─── Pick cache backend based on environment ──────────────────────
+# CACHE_URL=redis://host:6379/0 shares the cache between app replicas;
+# anything else (or an unreachable Redis) uses a per-process cache.
+CACHE_URL         = os.getenv("CACHE_URL", "").strip()
+CACHE_PREFIX      = os.getenv("CACHE_PREFIX", "emrs:")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+# Redis entries are pickles (the analytics cache holds DataFrames), and
+# unpickling runs code, so only point CACHE_URL at a Redis that no one else
+# can write to. With CACHE_SECRET set every entry is HMAC-signed and an
+# entry with a bad signature is treated as a cache error.
+CACHE_SECRET      = os.getenv("CACHE_SECRET", "")
+
+log = logging.getLogger(__name__)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  BACKENDS
+# ══════════════════════════════════════════════════════════════════
+class InProcessCache:
+    """Bounded LRU with per-key expiry, private to this process."""
+
+    name = "in-process"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()   # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            expires_at, value = self._data.get(key, (None, 0))
+            self._data[key] = (expires_at, value + 1)
+            return value + 1
+
+
+class RedisCache:
+    """Shared cache speaking the Redis protocol (Redis, Valkey, KeyDB, ...)."""
+
+    name = "redis"
+
+    def __init__(self, url, prefix=CACHE_PREFIX, secret=CACHE_SECRET):
+        import redis
+        self.prefix = prefix
+        self._key   = secret.encode("utf-8") if secret else None
+        self._r = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._r.ping()
+
+    def _sign(self, data):
+        return hmac.new(self._key, data, hashlib.sha256).digest()
+
+    def get(self, key):
+        raw = self._r.get(self.prefix + key)
+        if raw is None:
+            return None
+        if self._key is not None:
+            signature, raw = raw[:32], raw[32:]
+            if not hmac.compare_digest(signature, self._sign(raw)):
+                raise ValueError(f"cache entry {key!r} has a bad signature")
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self._key is not None:
+            data = self._sign(data) + data
+        self._r.set(self.prefix + key, data, ex=ttl)
+
+    def delete(self, key):
+        self._r.delete(self.prefix + key)
+
+    def incr(self, key):
+        return int(self._r.incr(self.prefix + key))
+
+
+# ══════════════════════════════════════════════════════════════════
+#  ACCESS
+# ══════════════════════════════════════════════════════════════════
+_backend = None
+_stats   = {"hits": 0, "misses": 0, "errors": 0}
+_status  = {"fallback": None}   # why a configured Redis is not in use
+
+def configure(url=None):
+    """Select the backend. Falls back to the in-process cache if Redis is unavailable."""
+    global _backend
+    url = (CACHE_URL if url is None else url).strip()
+    _backend = None
+    _status["fallback"] = None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            _backend = RedisCache(url)
+        except Exception as e:
+            _status["fallback"] = f"Redis unavailable ({e})"
+            log.warning("Redis unavailable (%s); using the in-process cache", e)
+    if _backend is None:
+        _backend = InProcessCache()
+    return _backend
+
+def get_cache():
+    return _backend or configure()
+
+def stats():
+    return {"backend": get_cache().name, **_stats, **_status}
+
+def get(key):
+    try:
+        value = get_cache().get(key)
+    except Exception:
+        _stats["errors"] += 1
+        return None
+    _stats["hits" if value is not None else "misses"] += 1
+    return value
+
+def set(key, value, ttl=None):
+    try:
+        get_cache().set(key, value, ttl)
+    except Exception:
+        _stats["errors"] += 1
+
+def delete(key):
+    try:
+        get_cache().delete(key)
+    except Exception:
+        _stats["errors"] += 1
+
+def read_through(key, loader, ttl=60):
+    """Return the cached value for key, calling loader() and caching its result on a miss.
+
+    Cache failures never break the caller: a broken backend behaves like
+    a permanent miss.
+    """
+    value = get(key)
+    if value is None:
+        value = loader()
+        if value is not None:
+            set(key, value, ttl)
+    return value
@@ -1,25 +1,57 @@
 import os
+import time
+import uuid
+import zlib
 import sqlite3
+import hashlib
+import threading
 from datetime import datetime
+from collections import OrderedDict
 from contextlib import contextmanager
 
 # ─── Pick database based on environment ───────────────────────────
-DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
-# Only use Postgres if URL is non-empty AND looks like a valid postgres URL
-USE_POSTGRES = bool(DATABASE_URL) and (
-    DATABASE_URL.startswith("postgresql://") or
-    DATABASE_URL.startswith("postgres://")
-) and len(DATABASE_URL) > 20
+SQLITE_PATH      = os.getenv("SQLITE_PATH", "emrs_exam.db")
+DATABASE_SSLMODE = os.getenv("DATABASE_SSLMODE", "require")
+DB_POOL_MAX      = int(os.getenv("DB_POOL_MAX", "10"))
+FETCH_CHUNK      = int(os.getenv("FETCH_CHUNK", "500"))   # rows held at once by the iter_* reads
+
+DATABASE_URL = ""
+USE_POSTGRES = False
+_pg_pool     = None
+
+def configure(database_url=None):
+    """(Re)read the database URL. app.py calls this after loading .env / st.secrets."""
+    global DATABASE_URL, USE_POSTGRES, _pg_pool
+    if database_url is None:
+        database_url = os.getenv("DATABASE_URL", "")
+    DATABASE_URL = database_url.strip()
+    # Only use Postgres if URL is non-empty AND looks like a valid postgres URL
+    USE_POSTGRES = bool(DATABASE_URL) and (
+        DATABASE_URL.startswith("postgresql://") or
+        DATABASE_URL.startswith("postgres://")
+    ) and len(DATABASE_URL) > 20
+    if _pg_pool is not None:
+        _pg_pool.closeall()
+        _pg_pool = None
+
+configure()
 
 # ══════════════════════════════════════════════════════════════════
 #  CONNECTION HELPERS
 # ══════════════════════════════════════════════════════════════════
+def _get_pg_pool():
+    """One connection pool per process, shared by every replica thread."""
+    global _pg_pool
+    if _pg_pool is None:
+        from psycopg2.pool import ThreadedConnectionPool
+        _pg_pool = ThreadedConnectionPool(1, DB_POOL_MAX, DATABASE_URL, sslmode=DATABASE_SSLMODE)
+    return _pg_pool
+
 @contextmanager
 def get_db():
     if USE_POSTGRES:
-        import psycopg2
-        import psycopg2.extras
-        conn = psycopg2.connect(DATABASE_URL, sslmode="require")
+        pool = _get_pg_pool()
+        conn = pool.getconn()
         conn.autocommit = False
         try:
             yield conn
@@ -28,9 +60,9 @@ def get_db():
             conn.rollback()
             raise
         finally:
-            conn.close()
+            pool.putconn(conn, close=bool(conn.closed))
     else:
-        conn = sqlite3.connect("emrs_exam.db", check_same_thread=False)
+        conn = sqlite3.connect(SQLITE_PATH, timeout=30, check_same_thread=False)
         conn.row_factory = sqlite3.Row
         try:
             yield conn
@@ -42,17 +74,64 @@ def get_db():
             conn.close()
 
 
+def content_hash(content):
+    """Stable hash of an answer (text or image bytes), used to skip writes of unchanged answers."""
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(bytes(content)).hexdigest()
+    return hashlib.sha256((content or "").strip().encode("utf-8")).hexdigest()
+
+def changed(column="content_hash"):
+    """Null-safe 'stored value differs from the incoming one' for an upsert's WHERE clause."""
+    if USE_POSTGRES:
+        return f"submissions.{column} IS DISTINCT FROM EXCLUDED.{column}"
+    return f"submissions.{column} IS NOT excluded.{column}"
+
+
 def fetchall(cursor):
     """Return list of dicts from cursor — works for both SQLite and Postgres."""
     cols = [d[0] for d in cursor.description]
     return [dict(zip(cols, row)) for row in cursor.fetchall()]
 
+def fetchrows(cursor):
+    """Return (columns, list of row tuples) — one shared column list instead of a dict per row.
+
+    For large reads that go straight into pandas / Arrow or are aggregated.
+    """
+    cols = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    return cols, (rows if USE_POSTGRES else [tuple(r) for r in rows])
+
 def fetchone(cursor):
     """Return single dict from cursor — works for both SQLite and Postgres."""
     cols = [d[0] for d in cursor.description]
     row  = cursor.fetchone()
     return dict(zip(cols, row)) if row else None
 
+def iter_chunks(sql, params=(), chunk=None):
+    """Yield (columns, row tuples) chunks of one SELECT without holding the whole result.
+
+    Postgres reads through a named (server-side) cursor; SQLite steps its
+    cursor with fetchmany. The connection stays checked out until the
+    generator is exhausted or closed.
+    """
+    chunk = chunk or FETCH_CHUNK
+    with get_db() as conn:
+        if USE_POSTGRES:
+            cur = conn.cursor(name=f"emrs_{uuid.uuid4().hex[:16]}")
+            cur.itersize = chunk
+        else:
+            cur = conn.cursor()
+        cur.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    break
+                cols = [d[0] for d in cur.description]
+                yield cols, (rows if USE_POSTGRES else [tuple(r) for r in rows])
+        finally:
+            cur.close()
+
 def placeholder():
     """Return correct SQL placeholder: ? for SQLite, %s for Postgres."""
     return "%s" if USE_POSTGRES else "?"
@@ -86,7 +165,9 @@ def init_db():
                     description TEXT,
                     is_active INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    closed_at TIMESTAMP
+                    closed_at TIMESTAMP,
+                    archived_at TIMESTAMP,
+                    sampling_policy TEXT
                 )""")
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS questions (
@@ -94,6 +175,10 @@ def init_db():
                     question_text TEXT NOT NULL,
                     marks INTEGER DEFAULT 4,
                     hint TEXT,
+                    reference_answer TEXT,
+                    rubric TEXT,
+                    tags TEXT,
+                    difficulty TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     is_active INTEGER DEFAULT 0,
                     session_id INTEGER
@@ -108,16 +193,84 @@ def init_db():
                     answer_image BYTEA,
                     answer_image_name TEXT,
                     answer_type TEXT DEFAULT 'text',
+                    answer_transcript TEXT,
+                    content_hash TEXT,
                     score REAL,
                     max_score INTEGER DEFAULT 4,
                     feedback TEXT,
+                    eval_source TEXT,
+                    prescore REAL,
                     evaluated_at TIMESTAMP,
                     submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(id),
                     FOREIGN KEY (question_id) REFERENCES questions(id),
                     UNIQUE(user_id, question_id, session_id)
                 )""")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS submissions_archive (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    session_id INTEGER NOT NULL,
+                    answer_text_z BYTEA,
+                    answer_image BYTEA,
+                    answer_image_name TEXT,
+                    answer_type TEXT,
+                    answer_transcript_z BYTEA,
+                    content_hash TEXT,
+                    score REAL,
+                    max_score INTEGER,
+                    feedback_z BYTEA,
+                    eval_source TEXT,
+                    prescore REAL,
+                    evaluated_at TIMESTAMP,
+                    submitted_at TIMESTAMP
+                )""")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS answer_drafts (
+                    user_id INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    session_id INTEGER NOT NULL,
+                    answer_text TEXT,
+                    content_hash TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, question_id, session_id)
+                )""")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS evaluation_runs (
+                    id SERIAL PRIMARY KEY,
+                    session_id INTEGER NOT NULL,
+                    question_id INTEGER,
+                    user_id INTEGER,
+                    answer_type TEXT,
+                    status TEXT DEFAULT 'running',
+                    total INTEGER DEFAULT 0,
+                    processed INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    last_submission_id INTEGER,
+                    note TEXT,
+                    schedule TEXT,
+                    cost REAL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )""")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS question_assignments (
+                    session_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (session_id, user_id, question_id)
+                )""")
+            _run_pg_migrations(cur)
+            _create_indexes(cur)
+            _create_search_index(cur)
+            _backfill_content_hashes(cur)
         else:
+            # WAL lets several app processes read while one writes.
+            cur.execute("PRAGMA journal_mode=WAL")
             cur.executescript("""
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -131,12 +284,15 @@ def init_db():
                     title TEXT NOT NULL, description TEXT,
                     is_active INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    closed_at TIMESTAMP
+                    closed_at TIMESTAMP, archived_at TIMESTAMP,
+                    sampling_policy TEXT
                 );
                 CREATE TABLE IF NOT EXISTS questions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     question_text TEXT NOT NULL,
                     marks INTEGER DEFAULT 4, hint TEXT,
+                    reference_answer TEXT, rubric TEXT,
+                    tags TEXT, difficulty TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     is_active INTEGER DEFAULT 0, session_id INTEGER
                 );
@@ -149,62 +305,235 @@ def init_db():
                     answer_image BLOB,
                     answer_image_name TEXT,
                     answer_type TEXT DEFAULT 'text',
+                    answer_transcript TEXT,
+                    content_hash TEXT,
                     score REAL, max_score INTEGER DEFAULT 4,
-                    feedback TEXT, evaluated_at TIMESTAMP,
+                    feedback TEXT, eval_source TEXT, prescore REAL,
+                    evaluated_at TIMESTAMP,
                     submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(id),
                     FOREIGN KEY (question_id) REFERENCES questions(id),
                     UNIQUE(user_id, question_id, session_id)
                 );
+                CREATE TABLE IF NOT EXISTS submissions_archive (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    session_id INTEGER NOT NULL,
+                    answer_text_z BLOB, answer_image BLOB,
+                    answer_image_name TEXT, answer_type TEXT,
+                    answer_transcript_z BLOB, content_hash TEXT,
+                    score REAL, max_score INTEGER,
+                    feedback_z BLOB, eval_source TEXT, prescore REAL,
+                    evaluated_at TIMESTAMP, submitted_at TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS answer_drafts (
+                    user_id INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    session_id INTEGER NOT NULL,
+                    answer_text TEXT, content_hash TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, question_id, session_id)
+                );
+                CREATE TABLE IF NOT EXISTS evaluation_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id INTEGER NOT NULL,
+                    question_id INTEGER, user_id INTEGER, answer_type TEXT,
+                    status TEXT DEFAULT 'running',
+                    total INTEGER DEFAULT 0, processed INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0, last_submission_id INTEGER,
+                    note TEXT, schedule TEXT, cost REAL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS question_assignments (
+                    session_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (session_id, user_id, question_id)
+                );
             """)
             _run_migrations(cur)
+            _create_indexes(cur)
+            _create_search_index(cur)
+            _backfill_content_hashes(cur)
+
+# (table, column, sqlite type, postgres type)
+MIGRATIONS = [
+    ("submissions", "answer_image",      "BLOB",                "BYTEA"),
+    ("submissions", "answer_image_name", "TEXT",                "TEXT"),
+    ("submissions", "answer_type",       "TEXT DEFAULT 'text'", "TEXT DEFAULT 'text'"),
+    ("submissions", "eval_source",       "TEXT",                "TEXT"),
+    ("questions",   "reference_answer",  "TEXT",                "TEXT"),
+    ("questions",   "rubric",            "TEXT",                "TEXT"),
+    ("submissions", "content_hash",      "TEXT",                "TEXT"),
+    ("exam_sessions", "archived_at",     "TIMESTAMP",           "TIMESTAMP"),
+    ("submissions", "answer_transcript", "TEXT",                "TEXT"),
+    ("submissions_archive", "answer_transcript_z", "BLOB",      "BYTEA"),
+    ("questions",   "tags",              "TEXT",                "TEXT"),
+    ("questions",   "difficulty",        "TEXT",                "TEXT"),
+    ("exam_sessions", "sampling_policy", "TEXT",                "TEXT"),
+    ("evaluation_runs", "schedule",      "TEXT",                "TEXT"),
+    ("evaluation_runs", "started_at",    "TIMESTAMP",           "TIMESTAMP"),
+    ("evaluation_runs", "cost",          "REAL DEFAULT 0",      "REAL DEFAULT 0"),
+    ("submissions", "prescore",          "REAL",                "REAL"),
+    ("submissions_archive", "prescore",  "REAL",                "REAL"),
+]
 
 def _run_migrations(cur):
     """Safely add missing columns to existing SQLite databases."""
-    migrations = [
-        ("submissions", "answer_image",      "BLOB"),
-        ("submissions", "answer_image_name", "TEXT"),
-        ("submissions", "answer_type",       "TEXT DEFAULT 'text'"),
-    ]
-    for table, column, col_type in migrations:
+    for table, column, col_type, _ in MIGRATIONS:
         cur.execute(f"PRAGMA table_info({table})")
         existing = [row[1] for row in cur.fetchall()]
         if column not in existing:
             cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
 
+INDEXES = [
+    ("idx_submissions_session_eval", "submissions", "session_id, evaluated_at"),
+    ("idx_archive_session_user",     "submissions_archive", "session_id, user_id"),
+    ("idx_submissions_user_session", "submissions", "user_id, session_id"),
+    ("idx_archive_user_session",     "submissions_archive", "user_id, session_id"),
+]
+
+def _create_indexes(cur):
+    for name, table, columns in INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+# Full-text search over answers, transcripts and feedback. Postgres keeps a
+# generated tsvector column under a GIN index; SQLite an FTS5 table that
+# triggers keep in step with every write to submissions.
+SEARCH_TSV = ("to_tsvector('english', coalesce(answer_text, '') || ' ' || "
+              "coalesce(answer_transcript, '') || ' ' || coalesce(feedback, ''))")
+
+def _create_search_index(cur):
+    if USE_POSTGRES:
+        cur.execute(f"""ALTER TABLE submissions ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                        GENERATED ALWAYS AS ({SEARCH_TSV}) STORED""")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_submissions_search ON submissions USING GIN (search_tsv)")
+        return
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name='submissions_fts'")
+    if cur.fetchone():
+        return
+    cur.executescript("""
+        CREATE VIRTUAL TABLE submissions_fts USING fts5(
+            answer_text, answer_transcript, feedback,
+            content='submissions', content_rowid='id', tokenize='porter unicode61'
+        );
+        CREATE TRIGGER submissions_fts_ai AFTER INSERT ON submissions BEGIN
+            INSERT INTO submissions_fts(rowid, answer_text, answer_transcript, feedback)
+            VALUES (new.id, new.answer_text, new.answer_transcript, new.feedback);
+        END;
+        CREATE TRIGGER submissions_fts_ad AFTER DELETE ON submissions BEGIN
+            INSERT INTO submissions_fts(submissions_fts, rowid, answer_text, answer_transcript, feedback)
+            VALUES ('delete', old.id, old.answer_text, old.answer_transcript, old.feedback);
+        END;
+        CREATE TRIGGER submissions_fts_au AFTER UPDATE OF answer_text, answer_transcript, feedback ON submissions BEGIN
+            INSERT INTO submissions_fts(submissions_fts, rowid, answer_text, answer_transcript, feedback)
+            VALUES ('delete', old.id, old.answer_text, old.answer_transcript, old.feedback);
+            INSERT INTO submissions_fts(rowid, answer_text, answer_transcript, feedback)
+            VALUES (new.id, new.answer_text, new.answer_transcript, new.feedback);
+        END;
+        INSERT INTO submissions_fts(submissions_fts) VALUES ('rebuild');
+    """)
+
+def _backfill_content_hashes(cur):
+    """Hash typed answers saved before content_hash existed, so resubmitting them keeps their scores."""
+    cur.execute("SELECT id, answer_text FROM submissions WHERE content_hash IS NULL AND answer_text IS NOT NULL")
+    rows = cur.fetchall()
+    if rows:
+        p = placeholder()
+        cur.executemany(f"UPDATE submissions SET content_hash={p} WHERE id={p}",
+                        [(content_hash(text), sid) for sid, text in rows])
+
+def _run_pg_migrations(cur):
+    """Safely add missing columns to existing Postgres databases."""
+    for table, column, _, col_type in MIGRATIONS:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {col_type}")
+
 
 # ══════════════════════════════════════════════════════════════════
 #  USER OPERATIONS
 # ══════════════════════════════════════════════════════════════════
-def upsert_user(email, name, picture):
+# Bounded LRU of user rows by id: every rerun of a signed-in page and every
+# token restore looks the user up. Entries expire so a role change made
+# on another replica is picked up.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL  = 300   # seconds
+_user_cache     = OrderedDict()   # user id -> (row, expires_at)
+_user_lock      = threading.Lock()
+
+def _cache_user(user):
+    if user:
+        with _user_lock:
+            _user_cache[user["id"]] = (user, time.time() + USER_CACHE_TTL)
+            _user_cache.move_to_end(user["id"])
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+    return user
+
+def upsert_user(email, name, picture, admin=False):
+    """Create or refresh a user at sign-in, promoting to admin if asked, in one statement.
+
+    Never demotes an existing admin. Returns the stored row.
+    """
     p = placeholder()
     with get_db() as conn:
         cur = conn.cursor()
-        if USE_POSTGRES:
-            cur.execute(f"""
-                INSERT INTO users (email, name, picture)
-                VALUES ({p},{p},{p})
-                ON CONFLICT(email) DO UPDATE SET name=EXCLUDED.name, picture=EXCLUDED.picture
-            """, (email, name, picture))
-        else:
-            cur.execute(f"""
-                INSERT INTO users (email, name, picture) VALUES ({p},{p},{p})
-                ON CONFLICT(email) DO UPDATE SET name=excluded.name, picture=excluded.picture
-            """, (email, name, picture))
-    return get_user_by_email(email)
+        cur.execute(f"""
+            INSERT INTO users (email, name, picture, role) VALUES ({p},{p},{p},{p})
+            ON CONFLICT(email) DO UPDATE SET
+                name=EXCLUDED.name, picture=EXCLUDED.picture,
+                role=CASE WHEN EXCLUDED.role='admin' THEN 'admin' ELSE users.role END
+            RETURNING *
+        """, (email, name, picture, "admin" if admin else "student"))
+        return _cache_user(fetchone(cur))
+
+def get_user_by_id(user_id):
+    with _user_lock:
+        cached = _user_cache.get(user_id)
+        if cached and cached[1] > time.time():
+            _user_cache.move_to_end(user_id)
+            return cached[0]
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT * FROM users WHERE id={p}", (user_id,))
+        return _cache_user(fetchone(cur))
 
 def get_user_by_email(email):
     p = placeholder()
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(f"SELECT * FROM users WHERE email={p}", (email,))
-        return fetchone(cur)
+        return _cache_user(fetchone(cur))
 
 def set_admin(email):
     p = placeholder()
     with get_db() as conn:
         cur = conn.cursor()
-        cur.execute(f"UPDATE users SET role='admin' WHERE email={p}", (email,))
+        cur.execute(f"UPDATE users SET role='admin' WHERE email={p} RETURNING *", (email,))
+        _cache_user(fetchone(cur))
+
+def add_users(users):
+    """Upsert (email, name, role) roster rows in one transaction.
+
+    A blank name keeps the stored one, and an admin is never demoted.
+    """
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.executemany(f"""
+            INSERT INTO users (email, name, picture, role) VALUES ({p},{p},'',{p})
+            ON CONFLICT(email) DO UPDATE SET
+                name=CASE WHEN EXCLUDED.name <> '' THEN EXCLUDED.name ELSE users.name END,
+                role=CASE WHEN EXCLUDED.role='admin' THEN 'admin' ELSE users.role END
+        """, users)
+    with _user_lock:
+        _user_cache.clear()
+    return len(users)
 
 def get_all_users():
     with get_db() as conn:
@@ -256,13 +585,42 @@ def get_all_sessions():
 # ══════════════════════════════════════════════════════════════════
 #  QUESTION OPERATIONS
 # ══════════════════════════════════════════════════════════════════
-def add_question(session_id, question_text, marks=4, hint=""):
+def add_question(session_id, question_text, marks=4, hint="",
+                 reference_answer="", rubric="", tags="", difficulty=""):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""INSERT INTO questions
+                    (question_text, marks, hint, reference_answer, rubric, tags, difficulty, is_active, session_id)
+                VALUES ({p},{p},{p},{p},{p},{p},{p},1,{p})""",
+            (question_text, marks, hint, reference_answer, rubric, tags, difficulty, session_id)
+        )
+
+def add_questions(session_id, questions):
+    """Insert (question_text, marks, hint, reference_answer, rubric, tags, difficulty) rows in one transaction."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            f"""INSERT INTO questions
+                    (question_text, marks, hint, reference_answer, rubric, tags, difficulty, is_active, session_id)
+                VALUES ({p},{p},{p},{p},{p},{p},{p},1,{p})""",
+            [(*q, session_id) for q in questions]
+        )
+    return len(questions)
+
+def update_question(question_id, question_text, marks, hint="",
+                    reference_answer="", rubric="", tags="", difficulty=""):
     p = placeholder()
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(
-            f"INSERT INTO questions (question_text, marks, hint, is_active, session_id) VALUES ({p},{p},{p},1,{p})",
-            (question_text, marks, hint, session_id)
+            f"""UPDATE questions
+                SET question_text={p}, marks={p}, hint={p}, reference_answer={p}, rubric={p},
+                    tags={p}, difficulty={p}
+                WHERE id={p}""",
+            (question_text, marks, hint, reference_answer, rubric, tags, difficulty, question_id)
         )
 
 def get_questions_for_session(session_id):
@@ -280,98 +638,412 @@ def delete_question(question_id):
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(f"DELETE FROM questions WHERE id={p}", (question_id,))
+        cur.execute(f"DELETE FROM question_assignments WHERE question_id={p}", (question_id,))
+
+
+# ══════════════════════════════════════════════════════════════════
+#  PER-STUDENT QUESTION SETS
+# ══════════════════════════════════════════════════════════════════
+# A session with a sampling policy gives each student their own subset of
+# its questions. Assignments are stored, so the exam page reads a
+# student's set with one primary-key lookup.
+def set_sampling_policy(session_id, policy_json):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE exam_sessions SET sampling_policy={p} WHERE id={p}", (policy_json, session_id))
+
+def save_assignments(session_id, assignments, replace_all=False):
+    """Store (user_id, question_id, position) rows, replacing those users' previous sets."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        if replace_all:
+            cur.execute(f"DELETE FROM question_assignments WHERE session_id={p}", (session_id,))
+        else:
+            cur.executemany(f"DELETE FROM question_assignments WHERE session_id={p} AND user_id={p}",
+                            [(session_id, uid) for uid in {a[0] for a in assignments}])
+        cur.executemany(
+            f"""INSERT INTO question_assignments (session_id, user_id, question_id, position)
+                VALUES ({ph(4)}) ON CONFLICT DO NOTHING""",
+            [(session_id, *a) for a in assignments]
+        )
+    return len(assignments)
+
+def get_assigned_questions(session_id, user_id):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT q.* FROM question_assignments a
+            JOIN questions q ON q.id = a.question_id
+            WHERE a.session_id={p} AND a.user_id={p} AND q.is_active=1
+            ORDER BY a.position
+        """, (session_id, user_id))
+        return fetchall(cur)
+
+def count_assigned_students(session_id):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(DISTINCT user_id) FROM question_assignments WHERE session_id={p}",
+                    (session_id,))
+        return cur.fetchone()[0]
 
 
 # ══════════════════════════════════════════════════════════════════
 #  SUBMISSION OPERATIONS
 # ══════════════════════════════════════════════════════════════════
+# A changed answer invalidates its previous evaluation; an identical one
+# is left untouched (no write, submitted_at and score kept).
+ANSWER_CHANGED_SET = """
+    answer_text=EXCLUDED.answer_text,
+    answer_image=EXCLUDED.answer_image,
+    answer_image_name=EXCLUDED.answer_image_name,
+    answer_type=EXCLUDED.answer_type,
+    content_hash=EXCLUDED.content_hash,
+    answer_transcript=NULL,
+    score=NULL, feedback=NULL, eval_source=NULL, prescore=NULL, evaluated_at=NULL,
+    submitted_at=CURRENT_TIMESTAMP
+"""
+
 def save_answer(user_id, question_id, session_id,
                 answer_text=None, answer_image=None,
                 answer_image_name=None, answer_type="text"):
+    """Upsert one answer. Returns False when it was identical to the stored one."""
     p = placeholder()
+    digest = content_hash(answer_image if answer_image is not None else answer_text)
     with get_db() as conn:
         cur = conn.cursor()
-        if USE_POSTGRES:
-            cur.execute(f"""
-                INSERT INTO submissions
-                    (user_id, question_id, session_id, answer_text, answer_image, answer_image_name, answer_type)
-                VALUES ({p},{p},{p},{p},{p},{p},{p})
-                ON CONFLICT(user_id, question_id, session_id) DO UPDATE SET
-                    answer_text=EXCLUDED.answer_text,
-                    answer_image=EXCLUDED.answer_image,
-                    answer_image_name=EXCLUDED.answer_image_name,
-                    answer_type=EXCLUDED.answer_type,
-                    submitted_at=CURRENT_TIMESTAMP
-            """, (user_id, question_id, session_id, answer_text,
-                  answer_image, answer_image_name, answer_type))
-        else:
-            cur.execute(f"""
+        cur.execute(f"""
+            INSERT INTO submissions
+                (user_id, question_id, session_id, answer_text, answer_image, answer_image_name,
+                 answer_type, content_hash)
+            VALUES ({p},{p},{p},{p},{p},{p},{p},{p})
+            ON CONFLICT(user_id, question_id, session_id) DO UPDATE SET {ANSWER_CHANGED_SET}
+            WHERE {changed()}
+        """, (user_id, question_id, session_id, answer_text,
+              answer_image, answer_image_name, answer_type, digest))
+        return cur.rowcount > 0
+
+def save_drafts(user_id, session_id, drafts):
+    """Upsert changed draft answers ({question_id: text}) in one transaction."""
+    p = placeholder()
+    now = datetime.now()
+    rows = [(user_id, qid, session_id, text, content_hash(text), now) for qid, text in drafts.items()]
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.executemany(f"""
+            INSERT INTO answer_drafts
+                (user_id, question_id, session_id, answer_text, content_hash, updated_at)
+            VALUES ({p},{p},{p},{p},{p},{p})
+            ON CONFLICT(user_id, question_id, session_id) DO UPDATE SET
+                answer_text=EXCLUDED.answer_text,
+                content_hash=EXCLUDED.content_hash,
+                updated_at=EXCLUDED.updated_at
+        """, rows)
+
+def get_drafts(user_id, session_id):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT question_id, answer_text, content_hash, updated_at FROM answer_drafts WHERE user_id={p} AND session_id={p}",
+            (user_id, session_id)
+        )
+        return {r["question_id"]: r for r in fetchall(cur)}
+
+def promote_drafts(user_id, session_id, question_ids):
+    """Turn a student's drafts for the given questions into text submissions, then drop them.
+
+    Answers are trimmed in Python, as content_hash trims them (SQL TRIM
+    only strips spaces), so whitespace-only drafts are never promoted.
+    """
+    if not question_ids:
+        return
+    p = placeholder()
+    in_ids = ph(len(question_ids))
+    params = (user_id, session_id, *question_ids)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT question_id, answer_text FROM answer_drafts WHERE user_id={p} AND session_id={p} AND question_id IN ({in_ids})",
+            params
+        )
+        texts = [(qid, (text or "").strip()) for qid, text in fetchrows(cur)[1]]
+        rows = [(user_id, qid, session_id, text, content_hash(text)) for qid, text in texts if text]
+        if rows:
+            cur.executemany(f"""
                 INSERT INTO submissions
-                    (user_id, question_id, session_id, answer_text, answer_image, answer_image_name, answer_type)
-                VALUES ({p},{p},{p},{p},{p},{p},{p})
-                ON CONFLICT(user_id, question_id, session_id) DO UPDATE SET
-                    answer_text=excluded.answer_text,
-                    answer_image=excluded.answer_image,
-                    answer_image_name=excluded.answer_image_name,
-                    answer_type=excluded.answer_type,
-                    submitted_at=CURRENT_TIMESTAMP
-            """, (user_id, question_id, session_id, answer_text,
-                  answer_image, answer_image_name, answer_type))
+                    (user_id, question_id, session_id, answer_text, answer_image, answer_image_name,
+                     answer_type, content_hash)
+                VALUES ({p},{p},{p},{p},NULL,NULL,'text',{p})
+                ON CONFLICT(user_id, question_id, session_id) DO UPDATE SET {ANSWER_CHANGED_SET}
+                WHERE {changed()}
+            """, rows)
+        _delete_drafts(cur, params, in_ids)
 
-def save_evaluation(submission_id, score, feedback):
+def delete_drafts(user_id, session_id, question_ids):
+    """Drop a student's drafts for the given questions (e.g. answered with an image instead)."""
+    if not question_ids:
+        return
+    with get_db() as conn:
+        _delete_drafts(conn.cursor(), (user_id, session_id, *question_ids), ph(len(question_ids)))
+
+def _delete_drafts(cur, params, in_ids):
+    p = placeholder()
+    cur.execute(
+        f"DELETE FROM answer_drafts WHERE user_id={p} AND session_id={p} AND question_id IN ({in_ids})",
+        params
+    )
+
+def save_evaluation(submission_id, score, feedback, source="gemini", prescore=None):
+    """Store a score; `prescore` is the local pre-scorer's score of an audited answer."""
     p = placeholder()
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(
-            f"UPDATE submissions SET score={p}, feedback={p}, evaluated_at={p} WHERE id={p}",
-            (score, feedback, datetime.now(), submission_id)
+            f"UPDATE submissions SET score={p}, feedback={p}, eval_source={p}, prescore={p}, evaluated_at={p} WHERE id={p}",
+            (score, feedback, source, prescore, datetime.now(), submission_id)
         )
 
+def save_transcript(submission_id, transcript):
+    """Store the OCR transcript of an image answer so later evaluations use the text."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE submissions SET answer_transcript={p} WHERE id={p}", (transcript, submission_id))
+
 def get_user_submissions(user_id, session_id):
     p = placeholder()
+    table, _ = _submissions_source(session_id)
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(f"""
             SELECT s.*, q.question_text, q.marks as max_marks
-            FROM submissions s
+            FROM {table} s
             JOIN questions q ON s.question_id = q.id
             WHERE s.user_id={p} AND s.session_id={p}
             ORDER BY q.id
         """, (user_id, session_id))
-        return fetchall(cur)
+        return _inflate(fetchall(cur))
+
+def _session_submissions_sql(table, select="s.*"):
+    p = placeholder()
+    return f"""
+        SELECT {select}, u.name as student_name, u.email as student_email,
+               q.question_text, q.marks as max_marks
+        FROM {table} s
+        JOIN users u ON s.user_id = u.id
+        JOIN questions q ON s.question_id = q.id
+        WHERE s.session_id={p}
+        ORDER BY u.name, q.id
+    """
 
 def get_all_submissions_for_session(session_id):
+    table, _ = _submissions_source(session_id)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(_session_submissions_sql(table), (session_id,))
+        return _inflate(fetchall(cur))
+
+def iter_submissions_for_session(session_id, chunk=None):
+    """get_all_submissions_for_session as a generator, holding at most `chunk` rows at a time."""
+    table, _ = _submissions_source(session_id)
+    for cols, rows in iter_chunks(_session_submissions_sql(table), (session_id,), chunk):
+        yield from _inflate([dict(zip(cols, r)) for r in rows])
+
+# Every submission column except the image bytes, for tabular reads.
+SUBMISSION_ROW_COLUMNS = (
+    "id", "user_id", "question_id", "session_id", "answer_text", "answer_image_name", "answer_type",
+    "answer_transcript", "content_hash", "score", "max_score", "feedback", "eval_source",
+    "evaluated_at", "submitted_at",
+)
+
+def get_submission_rows(session_id):
+    """A session's submissions as (columns, row tuples), without the image bytes.
+
+    Same rows and order as get_all_submissions_for_session, for callers that
+    build a DataFrame or Arrow table and would only throw the dicts away.
+    """
+    table, _ = _submissions_source(session_id)
+    archived = table == "submissions_archive"
+    select = ", ".join(f"s.{c}_z" if archived and c in ARCHIVE_COMPRESSED else f"s.{c}"
+                       for c in SUBMISSION_ROW_COLUMNS)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(_session_submissions_sql(table, select), (session_id,))
+        return _inflate_rows(*fetchrows(cur))
+
+def get_submission_image(submission_id, session_id):
+    """Fetch one answer image (hot or archived) without loading the rest of the row."""
     p = placeholder()
+    table, _ = _submissions_source(session_id)
     with get_db() as conn:
         cur = conn.cursor()
-        cur.execute(f"""
-            SELECT s.*, u.name as student_name, u.email as student_email,
-                   q.question_text, q.marks as max_marks
-            FROM submissions s
-            JOIN users u ON s.user_id = u.id
-            JOIN questions q ON s.question_id = q.id
-            WHERE s.session_id={p}
-            ORDER BY u.name, q.id
-        """, (session_id,))
-        return fetchall(cur)
+        cur.execute(f"SELECT answer_image FROM {table} WHERE id={p}", (submission_id,))
+        row = cur.fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
 
-def get_unevaluated_submissions(session_id):
+def _submission_filters(session_id, question_id=None, user_id=None, answer_type=None, pending=True):
+    """WHERE clause + params shared by the unevaluated-submission and run queries."""
     p = placeholder()
+    where  = [f"s.session_id={p}", "(s.answer_text IS NOT NULL OR s.answer_image IS NOT NULL)"]
+    if pending:
+        where.append("s.score IS NULL")
+    params = [session_id]
+    if question_id:
+        where.append(f"s.question_id={p}")
+        params.append(question_id)
+    if user_id:
+        where.append(f"s.user_id={p}")
+        params.append(user_id)
+    if answer_type:
+        where.append(f"s.answer_type={p}")
+        params.append(answer_type)
+    return " AND ".join(where), tuple(params)
+
+UNEVALUATED_SELECT = """
+    SELECT s.*, u.name as student_name, q.question_text, q.marks as max_marks,
+           q.reference_answer, q.rubric
+    FROM submissions s
+    JOIN users u ON s.user_id = u.id
+    JOIN questions q ON s.question_id = q.id
+"""
+
+def get_unevaluated_submissions(session_id, question_id=None, user_id=None, answer_type=None):
+    where, params = _submission_filters(session_id, question_id, user_id, answer_type)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"{UNEVALUATED_SELECT} WHERE {where} ORDER BY s.id", params)
+        return fetchall(cur)
+
+def iter_unevaluated_submissions(session_id, question_id=None, user_id=None, answer_type=None, chunk=None):
+    """get_unevaluated_submissions as a generator, read in pages of `chunk` rows by id.
+
+    Each page is its own short query, so an evaluation run that takes hours
+    keeps no cursor or transaction open between answers. Answers scored
+    meanwhile by someone else are skipped.
+    """
+    chunk = chunk or FETCH_CHUNK
+    where, params = _submission_filters(session_id, question_id, user_id, answer_type)
+    p, last = placeholder(), 0
+    while True:
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(f"{UNEVALUATED_SELECT} WHERE {where} AND s.id > {p} ORDER BY s.id LIMIT {int(chunk)}",
+                        (*params, last))
+            rows = fetchall(cur)
+        yield from rows
+        if len(rows) < chunk:
+            return
+        last = rows[-1]["id"]
+
+def get_pending_keys(session_id, question_id=None, user_id=None, answer_type=None):
+    """Just what an evaluation schedule needs of each pending answer, as (columns, row tuples)."""
+    where, params = _submission_filters(session_id, question_id, user_id, answer_type)
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(f"""
-            SELECT s.*, u.name as student_name, q.question_text, q.marks as max_marks
+            SELECT s.id, s.user_id, s.answer_type, s.submitted_at
             FROM submissions s
-            JOIN users u ON s.user_id = u.id
-            JOIN questions q ON s.question_id = q.id
-            WHERE s.session_id={p}
-              AND s.score IS NULL
-              AND (s.answer_text IS NOT NULL OR s.answer_image IS NOT NULL)
-        """, (session_id,))
-        return fetchall(cur)
+            WHERE {where}
+            ORDER BY s.id
+        """, params)
+        return fetchrows(cur)
+
+def iter_pending_by_ids(ids, chunk=None):
+    """Yield the still-unevaluated submissions among `ids`, in the given order.
+
+    Rows are loaded `chunk` ids at a time with a short query each, so a long
+    run holds neither a cursor nor more than one chunk of answers.
+    """
+    chunk = chunk or FETCH_CHUNK
+    for start in range(0, len(ids), chunk):
+        batch = ids[start:start + chunk]
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(f"{UNEVALUATED_SELECT} WHERE s.id IN ({ph(len(batch))}) AND s.score IS NULL",
+                        tuple(batch))
+            rows = {r["id"]: r for r in fetchall(cur)}
+        yield from (rows[i] for i in batch if i in rows)
+
+def count_unevaluated_submissions(session_id, question_id=None, user_id=None, answer_type=None):
+    where, params = _submission_filters(session_id, question_id, user_id, answer_type)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM submissions s WHERE {where}", params)
+        return cur.fetchone()[0]
+
+def reset_failed_evaluations(session_id, question_id=None, user_id=None, answer_type=None, submission_ids=None):
+    """Clear scores of submissions whose evaluation errored so they are picked up again.
+
+    Without filters this covers the whole session; an evaluation run passes
+    its own scope and the ids that failed in it.
+    """
+    if submission_ids is not None and not submission_ids:
+        return 0
+    where, params = _submission_filters(session_id, question_id, user_id, answer_type, pending=False)
+    if submission_ids:
+        where += f" AND s.id IN ({ph(len(submission_ids))})"
+        params += tuple(submission_ids)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""UPDATE submissions SET score=NULL, feedback=NULL, eval_source=NULL, prescore=NULL, evaluated_at=NULL
+                WHERE id IN (SELECT s.id FROM submissions s WHERE {where} AND s.eval_source='error')""",
+            params
+        )
+        return cur.rowcount
+
+def _score_rows_sql(session_id):
+    p = placeholder()
+    table, answered = _submissions_source(session_id)
+    return f"""
+        SELECT s.user_id, s.question_id, s.score, q.marks as max_marks,
+               s.submitted_at, e.created_at as session_start
+        FROM {table} s
+        JOIN questions q ON s.question_id = q.id
+        JOIN exam_sessions e ON s.session_id = e.id
+        WHERE s.session_id={p}
+          AND {answered}
+    """
+
+def get_score_rows(session_id):
+    """Lean score-only projection of a session's submissions, as (columns, row tuples) for analytics."""
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(_score_rows_sql(session_id), (session_id,))
+        return fetchrows(cur)
+
+def iter_score_rows(session_id, chunk=None):
+    """get_score_rows as a generator of (columns, row tuples) chunks."""
+    return iter_chunks(_score_rows_sql(session_id), (session_id,), chunk)
+
+def get_score_stamp(session_id, user_id=None):
+    """Cheap fingerprint that changes whenever an evaluation is saved for the session.
+
+    With a user id it covers only that student and also changes when they resubmit.
+    """
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        if user_id is None:
+            cur.execute(
+                f"SELECT COUNT(*), COUNT(score), MAX(evaluated_at) FROM submissions WHERE session_id={p}",
+                (session_id,)
+            )
+        else:
+            cur.execute(
+                f"""SELECT COUNT(*), COUNT(score), MAX(evaluated_at), MAX(submitted_at)
+                    FROM submissions WHERE session_id={p} AND user_id={p}""",
+                (session_id, user_id)
+            )
+        return tuple(str(v) for v in cur.fetchone())
 
 def get_rankings(session_id):
     p = placeholder()
+    table, answered = _submissions_source(session_id)
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(f"""
@@ -381,11 +1053,415 @@ def get_rankings(session_id):
                    COUNT(s.id) as answered,
                    COUNT(CASE WHEN s.score IS NOT NULL THEN 1 END) as evaluated
             FROM users u
-            JOIN submissions s ON u.id = s.user_id
+            JOIN {table} s ON u.id = s.user_id
             JOIN questions q ON s.question_id = q.id
             WHERE s.session_id={p}
-              AND (s.answer_text IS NOT NULL OR s.answer_image IS NOT NULL)
+              AND {answered}
             GROUP BY u.id, u.name, u.email, u.picture
             ORDER BY total_score DESC NULLS LAST
         """, (session_id,))
-        return fetchall(cur)
\ No newline at end of file
+        return fetchall(cur)
+
+def get_user_history(user_id):
+    """Score per session for one student across the whole mock-exam series, in one query.
+
+    Reads the hot and archive tables through their (user_id, session_id)
+    indexes and never touches answer text or images.
+    """
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT e.id as session_id, e.title, e.created_at,
+                   SUM(s.score) as total_score,
+                   SUM(q.marks) as total_max,
+                   COUNT(*) as answered,
+                   COUNT(s.score) as evaluated
+            FROM (
+                SELECT session_id, question_id, score FROM submissions WHERE user_id={p}
+                UNION ALL
+                SELECT session_id, question_id, score FROM submissions_archive WHERE user_id={p}
+            ) s
+            JOIN exam_sessions e ON s.session_id = e.id
+            JOIN questions q ON s.question_id = q.id
+            GROUP BY e.id, e.title, e.created_at
+            ORDER BY e.created_at, e.id
+        """, (user_id, user_id))
+        return fetchall(cur)
+
+def get_prescore_report(session_id):
+    """Count evaluated submissions per evaluation source (prescore vs. each model provider).
+
+    Answers the pre-scorer would have scored but that were audited by a
+    model (see evaluator.PRESCORE_AUDIT_RATE) give its agreement with the
+    model: mean absolute difference and share within one mark.
+    """
+    p = placeholder()
+    table, _ = _submissions_source(session_id)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT COALESCE(eval_source, 'gemini') as source, COUNT(*) as evaluated
+            FROM {table}
+            WHERE session_id={p} AND score IS NOT NULL
+            GROUP BY COALESCE(eval_source, 'gemini')
+        """, (session_id,))
+        counts = {r["source"]: r["evaluated"] for r in fetchall(cur)}
+        cur.execute(f"""
+            SELECT COUNT(*) as audited,
+                   AVG(ABS(score - prescore)) as mean_abs_diff,
+                   SUM(CASE WHEN ABS(score - prescore) <= 1 THEN 1 ELSE 0 END) as within_one
+            FROM {table}
+            WHERE session_id={p} AND prescore IS NOT NULL AND score IS NOT NULL
+              AND eval_source NOT IN ('prescore', 'error')
+        """, (session_id,))
+        agreement = fetchone(cur)
+    saved = counts.get("prescore", 0)
+    total = sum(counts.values())
+    audited = agreement["audited"]
+    return {
+        "evaluated":     total,
+        "calls_saved":   saved,
+        "remote_calls":  total - saved,
+        "saved_pct":     (saved / total * 100) if total else 0.0,
+        "by_source":     counts,
+        "audited":       audited,
+        "mean_abs_diff": float(agreement["mean_abs_diff"]) if audited else None,
+        "within_one_pct": (agreement["within_one"] / audited * 100) if audited else None,
+    }
+
+def get_evaluation_counts(session_id):
+    """Pending / evaluated / failed counts for a session, without loading any rows."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT COUNT(CASE WHEN score IS NULL
+                               AND (answer_text IS NOT NULL OR answer_image IS NOT NULL) THEN 1 END) as pending,
+                   COUNT(CASE WHEN score IS NOT NULL THEN 1 END) as evaluated,
+                   COUNT(CASE WHEN eval_source='error' THEN 1 END) as failed
+            FROM submissions
+            WHERE session_id={p}
+        """, (session_id,))
+        return fetchone(cur)
+
+def get_evaluations_since(session_id, since=None, limit=200):
+    """Submissions scored after the `since` cursor, an (evaluated_at, id) pair, oldest first.
+
+    Only lean columns are selected so the live evaluation view can poll
+    cheaply; pass the last row's (evaluated_at, id) as the next cursor. The
+    id breaks ties between answers saved with the same timestamp.
+    """
+    p = placeholder()
+    where, params = f"s.session_id={p} AND s.evaluated_at IS NOT NULL", [session_id]
+    if since is not None:
+        where += f" AND (s.evaluated_at, s.id) > ({p}, {p})"
+        params.extend(since)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT s.id, s.score, s.max_score, s.eval_source, s.evaluated_at, s.answer_type,
+                   u.name as student_name, q.question_text, q.marks as max_marks
+            FROM submissions s
+            JOIN users u ON s.user_id = u.id
+            JOIN questions q ON s.question_id = q.id
+            WHERE {where}
+            ORDER BY s.evaluated_at, s.id
+            LIMIT {int(limit)}
+        """, tuple(params))
+        return fetchall(cur)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  EVALUATION RUNS
+# ══════════════════════════════════════════════════════════════════
+# status: running -> paused / cancelled / completed; paused -> running
+def create_eval_run(session_id, question_id=None, user_id=None, answer_type=None, schedule=None):
+    p = placeholder()
+    total = count_unevaluated_submissions(session_id, question_id, user_id, answer_type)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""INSERT INTO evaluation_runs (session_id, question_id, user_id, answer_type, schedule, status, total)
+                VALUES ({p},{p},{p},{p},{p},'running',{p})""",
+            (session_id, question_id, user_id, answer_type, schedule, total)
+        )
+        if USE_POSTGRES:
+            cur.execute("SELECT lastval()")
+        else:
+            cur.execute("SELECT last_insert_rowid()")
+        return cur.fetchone()[0]
+
+def get_eval_run(run_id):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT * FROM evaluation_runs WHERE id={p}", (run_id,))
+        return fetchone(cur)
+
+def get_eval_runs(session_id):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT * FROM evaluation_runs WHERE session_id={p} ORDER BY id DESC",
+            (session_id,)
+        )
+        return fetchall(cur)
+
+def get_eval_run_status(run_id):
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT status FROM evaluation_runs WHERE id={p}", (run_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+def set_eval_run_status(run_id, status, note=None):
+    p = placeholder()
+    finished = datetime.now() if status in ("cancelled", "completed") else None
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""UPDATE evaluation_runs
+                SET status={p}, note=COALESCE({p}, note), updated_at={p}, finished_at={p}
+                WHERE id={p}""",
+            (status, note, datetime.now(), finished, run_id)
+        )
+
+def start_eval_run(run_id):
+    """Mark a run as running; the first start also stamps started_at."""
+    p = placeholder()
+    now = datetime.now()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""UPDATE evaluation_runs
+                SET status='running', started_at=COALESCE(started_at, {p}), updated_at={p}, finished_at=NULL
+                WHERE id={p}""",
+            (now, now, run_id)
+        )
+
+def checkpoint_eval_run(run_id, submission_id, failed=False, cost=0.0):
+    """Record that one submission of the run has been evaluated, and what its model calls cost."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""UPDATE evaluation_runs
+                SET processed=processed+1, failed=failed+{p}, cost=COALESCE(cost, 0)+{p},
+                    last_submission_id={p}, updated_at={p}
+                WHERE id={p}""",
+            (1 if failed else 0, cost, submission_id, datetime.now(), run_id)
+        )
+
+def requeue_eval_run_failures(run_id, count):
+    """Take `count` failed answers that were put back in the queue off the run's counters."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""UPDATE evaluation_runs
+                SET processed=processed-{p}, failed=failed-{p}, updated_at={p}
+                WHERE id={p}""",
+            (count, count, datetime.now(), run_id)
+        )
+
+def get_session_eval_cost(session_id):
+    """Model spend recorded by every evaluation run of a session."""
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COALESCE(SUM(cost), 0) FROM evaluation_runs WHERE session_id={p}", (session_id,))
+        return float(cur.fetchone()[0])
+
+def get_eval_run_pending_keys(run):
+    """Schedule keys of the unevaluated submissions still matching a run's filters."""
+    return get_pending_keys(run["session_id"], run["question_id"], run["user_id"], run["answer_type"])
+
+def get_eval_run_students(run):
+    """Per student in a run's scope: answers scored since the run started, what is left, and when the last was scored."""
+    if not run.get("started_at"):
+        return []
+    p = placeholder()
+    where, params = _submission_filters(run["session_id"], run["question_id"], run["user_id"],
+                                        run["answer_type"], pending=False)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT s.user_id, u.name as student_name,
+                   COUNT(CASE WHEN s.evaluated_at >= {p} THEN 1 END) as evaluated,
+                   COUNT(CASE WHEN s.score IS NULL THEN 1 END) as pending,
+                   MAX(s.evaluated_at) as completed_at
+            FROM submissions s
+            JOIN users u ON s.user_id = u.id
+            WHERE {where}
+            GROUP BY s.user_id, u.name
+            HAVING COUNT(CASE WHEN s.evaluated_at >= {p} THEN 1 END) > 0
+        """, (run["started_at"], *params, run["started_at"]))
+        return fetchall(cur)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  FULL-TEXT SEARCH
+# ══════════════════════════════════════════════════════════════════
+def _fts_query(text):
+    """Quote each word so user input is matched literally (all words must appear)."""
+    return " ".join('"' + w.replace('"', '""') + '"' for w in text.split())
+
+def search_submissions(query, session_id=None, limit=20, offset=0):
+    """Ranked full-text hits over answers, transcripts and feedback, best first.
+
+    Covers sessions that are not archived. Each row carries a short
+    `snippet` with the matched words in **bold**.
+    """
+    if not (query or "").strip():
+        return []
+    p = placeholder()
+    if USE_POSTGRES:
+        source = "submissions s CROSS JOIN websearch_to_tsquery('english', %s) tsq"
+        match  = "s.search_tsv @@ tsq"
+        rank   = "ts_rank(s.search_tsv, tsq) DESC"
+        snip   = ("ts_headline('english', concat_ws(' … ', s.answer_text, s.answer_transcript, s.feedback), tsq, "
+                  "'StartSel=**, StopSel=**, MaxWords=30, MinWords=10')")
+        terms  = query
+    else:
+        source = "submissions_fts JOIN submissions s ON s.id = submissions_fts.rowid"
+        match  = f"submissions_fts MATCH {p}"
+        rank   = "bm25(submissions_fts)"
+        snip   = "snippet(submissions_fts, -1, '**', '**', ' … ', 16)"
+        terms  = _fts_query(query)
+    where, params = [match], [terms]
+    if session_id:
+        where.append(f"s.session_id={p}")
+        params.append(session_id)
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT s.id, s.session_id, s.user_id, s.question_id, s.answer_type, s.score, s.max_score,
+                   u.name as student_name, u.email as student_email, q.question_text,
+                   {snip} as snippet
+            FROM {source}
+            JOIN users u ON s.user_id = u.id
+            JOIN questions q ON s.question_id = q.id
+            WHERE {" AND ".join(where)}
+            ORDER BY {rank}
+            LIMIT {p} OFFSET {p}
+        """, (*params, limit, offset))
+        return fetchall(cur)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  ARCHIVE (hot / cold submissions)
+# ══════════════════════════════════════════════════════════════════
+# Closed sessions are moved out of the hot `submissions` table into
+# `submissions_archive`, with answer text and feedback zlib-compressed.
+# The read functions above pick the right table per session.
+ARCHIVE_BATCH = 500
+ARCHIVE_COMPRESSED = ("answer_text", "answer_transcript", "feedback")   # stored as <column>_z
+_archived_sessions = set()   # archiving is one-way, so positive lookups are safe to memoize
+
+def _deflate(text):
+    return zlib.compress(text.encode("utf-8"), 9) if text is not None else None
+
+def _inflate(rows):
+    """Decompress archive rows in place so they look like hot-table rows."""
+    for row in rows:
+        if "answer_text_z" in row:
+            z = row.pop("answer_text_z")
+            row["answer_text"] = zlib.decompress(bytes(z)).decode("utf-8") if z is not None else None
+        if "feedback_z" in row:
+            z = row.pop("feedback_z")
+            row["feedback"] = zlib.decompress(bytes(z)).decode("utf-8") if z is not None else None
+        if "answer_transcript_z" in row:
+            z = row.pop("answer_transcript_z")
+            row["answer_transcript"] = zlib.decompress(bytes(z)).decode("utf-8") if z is not None else None
+    return rows
+
+def _inflate_rows(cols, rows):
+    """Tuple-row counterpart of _inflate: decompress the *_z columns and drop the suffix."""
+    zipped = [i for i, c in enumerate(cols) if c.endswith("_z")]
+    if not zipped:
+        return cols, rows
+    cols = [c[:-2] if i in zipped else c for i, c in enumerate(cols)]
+    out  = []
+    for row in rows:
+        row = list(row)
+        for i in zipped:
+            if row[i] is not None:
+                row[i] = zlib.decompress(bytes(row[i])).decode("utf-8")
+        out.append(tuple(row))
+    return cols, out
+
+def is_session_archived(session_id):
+    if session_id in _archived_sessions:
+        return True
+    p = placeholder()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT archived_at FROM exam_sessions WHERE id={p}", (session_id,))
+        row = cur.fetchone()
+    if row and row[0] is not None:
+        _archived_sessions.add(session_id)
+        return True
+    return False
+
+def _submissions_source(session_id):
+    """(table, 'has an answer' condition) holding a session's submissions."""
+    if is_session_archived(session_id):
+        return "submissions_archive", "(s.answer_text_z IS NOT NULL OR s.answer_image IS NOT NULL)"
+    return "submissions", "(s.answer_text IS NOT NULL OR s.answer_image IS NOT NULL)"
+
+def archive_session(session_id):
+    """Move a closed, fully evaluated session's submissions to compressed cold storage.
+
+    Runs in one transaction; returns the number of submissions moved.
+    """
+    p = placeholder()
+    cols = ("id, user_id, question_id, session_id, answer_text, answer_image, answer_image_name, "
+            "answer_type, content_hash, score, max_score, feedback, eval_source, evaluated_at, submitted_at, "
+            "answer_transcript, prescore")
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT is_active, archived_at FROM exam_sessions WHERE id={p}", (session_id,))
+        session = cur.fetchone()
+        if session is None or session[0]:
+            raise ValueError("Only closed sessions can be archived.")
+        if session[1] is not None:
+            return 0
+        cur.execute(
+            f"""SELECT COUNT(*) FROM submissions
+                WHERE session_id={p} AND score IS NULL
+                  AND (answer_text IS NOT NULL OR answer_image IS NOT NULL)""",
+            (session_id,)
+        )
+        if cur.fetchone()[0]:
+            raise ValueError("Evaluate all pending answers before archiving the session.")
+
+        read = conn.cursor()
+        read.execute(f"SELECT {cols} FROM submissions WHERE session_id={p} ORDER BY id", (session_id,))
+        moved = 0
+        while True:
+            batch = read.fetchmany(ARCHIVE_BATCH)
+            if not batch:
+                break
+            rows = []
+            for r in batch:
+                r = list(r)
+                r[4]  = _deflate(r[4])    # answer_text
+                r[11] = _deflate(r[11])   # feedback
+                r[15] = _deflate(r[15])   # answer_transcript
+                rows.append(tuple(r))
+            cur.executemany(f"""
+                INSERT INTO submissions_archive
+                    (id, user_id, question_id, session_id, answer_text_z, answer_image, answer_image_name,
+                     answer_type, content_hash, score, max_score, feedback_z, eval_source, evaluated_at, submitted_at,
+                     answer_transcript_z, prescore)
+                VALUES ({ph(17)})
+            """, rows)
+            moved += len(rows)
+        cur.execute(f"DELETE FROM submissions WHERE session_id={p}", (session_id,))
+        cur.execute(f"DELETE FROM answer_drafts WHERE session_id={p}", (session_id,))
+        cur.execute(f"UPDATE exam_sessions SET archived_at={p} WHERE id={p}", (datetime.now(), session_id))
+    _archived_sessions.add(session_id)
+    return moved
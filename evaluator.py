@@ -1,10 +1,56 @@
-import google.generativeai as genai
+import hashlib
 import json
+import os
 import re
-import base64
+from functools import lru_cache
+
+import providers
+
+# Evaluation goes through a providers.Router (Gemini, OpenAI-compatible
+# servers such as a local llama.cpp / vLLM) so a rate-limited or failing
+# primary falls back to the next provider instead of stopping the run.
+_router = providers.Router([])
+
+# Settings read by configure_providers (from .env / st.secrets), besides
+# the {NAME}_* keys of each provider; see provider_settings().
+PROVIDER_SETTINGS = (
+    "EVAL_PROVIDERS", "EVAL_ROUTING",
+    "EVAL_MAX_CONCURRENCY", "EVAL_DAILY_BUDGET", "EVAL_SESSION_BUDGET",
+)
+
+def provider_settings(eval_providers="") -> tuple:
+    """PROVIDER_SETTINGS plus the {NAME}_* keys of every provider in EVAL_PROVIDERS."""
+    names = providers.provider_names(eval_providers)
+    return PROVIDER_SETTINGS + tuple(f"{name.upper()}_{key}" for name in names for key in providers.PROVIDER_KEYS)
+
+def configure_providers(config: dict):
+    """Configure evaluation providers from EVAL_* and per-provider {NAME}_* settings."""
+    global _router
+    _router = providers.build_router(config)
+    return _router
 
 def configure_gemini(api_key: str):
-    genai.configure(api_key=api_key)
+    configure_providers({"GEMINI_API_KEY": api_key})
+
+def has_providers() -> bool:
+    return bool(_router.providers)
+
+def provider_stats() -> dict:
+    return _router.stats_snapshot()
+
+def quota_stats() -> dict:
+    """Per provider: requests, tokens, cost and current limits of its quota."""
+    return {p.name: p.quota.snapshot() for p in _router.providers}
+
+def context_cache_stats() -> dict:
+    """Per Gemini provider: prefixes served from a context cache, too short for one, or refused."""
+    return {p.name: p.cache_snapshot() for p in _router.providers if hasattr(p, "cache_snapshot")}
+
+def budget():
+    return _router.budget
+
+def max_concurrency() -> int:
+    return _router.max_concurrency()
 
 EVAL_PROMPT = """You are an expert evaluator for EMRS (Eklavya Model Residential Schools) TGT/PGT Computer Science teacher recruitment exam (ESSE).
 
@@ -29,68 +75,274 @@ Provide your evaluation in the following JSON format ONLY (no extra text):
 
 Be strict but fair. Award marks proportionally based on completeness and accuracy."""
 
+# Structured output: providers must reply with exactly this object.
+EVAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score":    {"type": "number"},
+        "feedback": {"type": "string"},
+    },
+    "required": ["score", "feedback"],
+}
+PARSE_RETRIES = 1
 
-def evaluate_answer(question_text: str, student_answer: str, max_marks: int = 4) -> dict:
-    """Evaluate a plain text answer using Gemini."""
-    model = genai.GenerativeModel("gemini-2.5-flash")
+REASK_PROMPT = """Your previous evaluation reply could not be used: {reason}.
 
-    prompt = EVAL_PROMPT.format(question=question_text, max_marks=max_marks)
-    full_prompt = prompt + f"\n\n**Student's Answer:** {student_answer}"
+Rewrite that same evaluation (do not re-grade the answer) as a single JSON object with a numeric "score" between 0 and {max_marks} and a non-empty string "feedback".
 
-    try:
-        response = model.generate_content(full_prompt)
-        return _parse_response(response.text, max_marks)
-    except Exception as e:
-        return {"score": 0, "feedback": f"Evaluation error: {str(e)}"}
+Previous reply:
+{reply}"""
 
+TRANSCRIPT_NOTE = "(Transcribed from the student's handwritten answer; ignore minor spelling slips that may come from the transcription.)"
 
-def evaluate_image_answer(question_text: str, image_bytes: bytes, max_marks: int = 4) -> dict:
-    """Evaluate a handwritten answer image using Gemini Vision."""
-    model = genai.GenerativeModel("gemini-2.5-flash")
+# OCR: "vision" uses the configured providers, "tesseract" a local engine
+# (pip install pytesseract pillow, plus the tesseract binary).
+OCR_ENGINE = os.getenv("OCR_ENGINE", "vision")
+NO_ANSWER_MARK = "[NO ANSWER]"
 
-    prompt = EVAL_PROMPT.format(question=question_text, max_marks=max_marks)
-    full_prompt = prompt + "\n\n**Student's Answer:** The student has submitted a handwritten answer. Please read the handwritten text in the image carefully and evaluate it based on the criteria above."
+TRANSCRIBE_PROMPT = f"""You transcribe handwritten exam answers.
 
-    # Detect image type from bytes header
-    if image_bytes[:4] == b'\x89PNG':
-        mime_type = "image/png"
-    elif image_bytes[:2] == b'\xff\xd8':
-        mime_type = "image/jpeg"
-    elif image_bytes[:4] == b'GIF8':
-        mime_type = "image/gif"
-    elif image_bytes[:4] == b'RIFF':
-        mime_type = "image/webp"
-    else:
-        mime_type = "image/jpeg"  # default fallback
+Reply with the exact text written in the image, keeping the student's own wording, spelling, line breaks and any code. Describe diagrams in one bracketed line, e.g. [Diagram: ...]. Do not correct, summarise or grade the answer. If the image contains no answer, reply with {NO_ANSWER_MARK} only."""
+
+IMAGE_ANSWER_NOTE = "The student has submitted a handwritten answer. Please read the handwritten text in the image carefully and evaluate it based on the criteria above."
+
+
+# ══════════════════════════════════════════════════════════════════
+#  PER-QUESTION PROMPT PREFIX
+# ══════════════════════════════════════════════════════════════════
+@lru_cache(maxsize=512)
+def build_prompt_prefix(question_text: str, max_marks: int = 4,
+                        reference_answer: str = "", rubric: str = "") -> str:
+    """Build the evaluation prompt shared by every answer to one question."""
+    prefix = EVAL_PROMPT.format(question=question_text, max_marks=max_marks)
+    if reference_answer:
+        prefix += f"\n\n**Reference Answer (model answer, not shown to the student):** {reference_answer}"
+    points = [ln.strip().lstrip("-*• ").strip() for ln in (rubric or "").splitlines()]
+    points = [pt for pt in points if pt]
+    if points:
+        prefix += "\n\n**Marking Rubric (award marks against these points):**\n"
+        prefix += "\n".join(f"- {pt}" for pt in points)
+    return prefix
+
+
+# ══════════════════════════════════════════════════════════════════
+#  LOCAL PRE-SCORER
+# ══════════════════════════════════════════════════════════════════
+# Thresholds can be overridden through the environment (or st.secrets,
+# which app.py exposes the same way as DATABASE_URL).
+PRESCORE_THRESHOLDS = {
+    "min_keyword_hits": int(os.getenv("PRESCORE_MIN_KEYWORD_HITS", "1")),
+    "offtopic_min_words": int(os.getenv("PRESCORE_OFFTOPIC_MIN_WORDS", "8")),
+    "min_latin_ratio":  float(os.getenv("PRESCORE_MIN_LATIN_RATIO", "0.6")),
+}
+
+# Share of off-topic pre-scores also sent to a model, which then sets the
+# score; the pre-scorer's score is kept next to it so the Evaluate tab can
+# report how well the two agree. The sample is picked by a hash of the
+# question and answer, so re-running an evaluation audits the same answers.
+PRESCORE_AUDIT_RATE = float(os.getenv("PRESCORE_AUDIT_RATE", "0.05"))
 
-    image_part = {
-        "mime_type": mime_type,
-        "data": base64.b64encode(image_bytes).decode("utf-8")
+STOPWORDS = frozenset("""
+a an the and or but if then else of to in on at by for with from as is are was were be been
+being this that these those it its into about over under between what which who whom whose
+why how when where do does did done can could should would will shall may might must not no
+yes any all each every some such than too very also only own same so just your you their
+they them he she his her we our us i me my explain describe discuss define write short note
+give brief example examples difference differentiate between state list mention marks
+""".split())
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def _keywords(text: str) -> set:
+    return {w for w in _WORD_RE.findall((text or "").lower()) if len(w) > 2 and w not in STOPWORDS}
+
+
+def answer_features(question_text: str, student_answer: str, reference_answer: str = "") -> dict:
+    """Cheap lexical features of an answer, computed without any remote call."""
+    answer  = (student_answer or "").strip()
+    words   = _WORD_RE.findall(answer)
+    letters = [c for c in answer if c.isalpha()]
+    latin   = sum(1 for c in letters if c.isascii())
+    ans_kw  = _keywords(answer)
+    ref_kw  = _keywords(question_text) | _keywords(reference_answer)
+    return {
+        "chars":        len(answer),
+        "words":        len(words),
+        "latin_ratio":  (latin / len(letters)) if letters else 1.0,
+        "keyword_hits": len(ans_kw & ref_kw),
     }
 
+
+def prescore_answer(question_text: str, student_answer: str, max_marks: int = 4,
+                    reference_answer: str = "", thresholds: dict = None):
+    """Score trivially scorable answers locally.
+
+    Returns a result dict for blank answers, and for off-topic ones when the
+    question has a reference answer to compare against; None when the
+    answer should go to a model. Without a reference answer a correct reply
+    often shares no words with the question ("It has 7 layers: physical,
+    ..."), and a short one ("SQL") can be right, so those are never zeroed.
+    """
+    t = {**PRESCORE_THRESHOLDS, **(thresholds or {})}
+    f = answer_features(question_text, student_answer, reference_answer)
+
+    if f["chars"] == 0:
+        return {"score": 0.0, "source": "prescore",
+                "feedback": "No answer was provided, so no marks could be awarded."}
+    # Keyword overlap is only meaningful for answers written in English;
+    # anything else is left for the model to judge.
+    if ((reference_answer or "").strip()
+            and f["latin_ratio"] >= t["min_latin_ratio"]
+            and f["words"] >= t["offtopic_min_words"]
+            and f["keyword_hits"] < t["min_keyword_hits"]):
+        return {"score": 0.0, "source": "prescore",
+                "feedback": "The answer does not appear to address the question asked. "
+                            "Re-read the question and cover its key concepts."}
+    return None
+
+
+def _audited(question_text: str, student_answer: str) -> bool:
+    """Stable PRESCORE_AUDIT_RATE sample of answers, the same on every run."""
+    digest = hashlib.sha256(f"{question_text}\0{student_answer}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 < PRESCORE_AUDIT_RATE
+
+
+# ══════════════════════════════════════════════════════════════════
+#  EVALUATION
+# ══════════════════════════════════════════════════════════════════
+def evaluate_answer(question_text: str, student_answer: str, max_marks: int = 4,
+                    reference_answer: str = "", rubric: str = "", transcribed: bool = False) -> dict:
+    """Evaluate a plain text answer, pre-scoring locally before calling a provider.
+
+    `transcribed` marks text read from a handwritten image by transcribe_image.
+    A PRESCORE_AUDIT_RATE share of non-blank pre-scored answers goes to a
+    model as well; its result carries the local score as "prescore", and
+    the local result stands if the model fails.
+    """
+    local = prescore_answer(question_text, student_answer, max_marks, reference_answer)
+    blank = not (student_answer or "").strip()
+    if local is not None and (blank or not _audited(question_text, student_answer)):
+        return local
+
+    prefix = build_prompt_prefix(question_text, max_marks, reference_answer or "", rubric or "")
+    note   = f"\n\n{TRANSCRIPT_NOTE}" if transcribed else ""
+
     try:
-        response = model.generate_content([
-            full_prompt,
-            {"inline_data": image_part}
-        ])
-        return _parse_response(response.text, max_marks)
+        reply, provider = _router.generate(prefix, f"**Student's Answer:** {student_answer}{note}",
+                                           schema=EVAL_SCHEMA)
+        result = _parse_or_reask(provider, prefix, reply, max_marks)
     except Exception as e:
-        return {"score": 0, "feedback": f"Image evaluation error: {str(e)}"}
+        result = {"score": 0, "feedback": f"Evaluation error: {str(e)}", "source": "error"}
+    if local is None:
+        return result
+    return local if result["source"] == "error" else {**result, "prescore": local["score"]}
+
 
+def evaluate_image_answer(question_text: str, image_bytes: bytes, max_marks: int = 4,
+                          reference_answer: str = "", rubric: str = "") -> dict:
+    """Evaluate a handwritten answer image with a vision-capable provider."""
+    prefix = build_prompt_prefix(question_text, max_marks, reference_answer or "", rubric or "")
 
-def _parse_response(text: str, max_marks: int) -> dict:
-    """Parse Gemini JSON response into score and feedback."""
     try:
-        text = text.strip()
-        json_match = re.search(r'\{.*?\}', text, re.DOTALL)
-        if json_match:
-            result = json.loads(json_match.group())
-            score  = float(result.get("score", 0))
-            score  = max(0.0, min(score, float(max_marks)))
-            return {
-                "score": score,
-                "feedback": result.get("feedback", "No feedback provided.")
-            }
-        return {"score": 0, "feedback": "Could not parse evaluation response."}
+        reply, provider = _router.generate(prefix, f"**Student's Answer:** {IMAGE_ANSWER_NOTE}",
+                                           image=(image_mime_type(image_bytes), image_bytes),
+                                           schema=EVAL_SCHEMA)
+        return _parse_or_reask(provider, prefix, reply, max_marks)
     except Exception as e:
-        return {"score": 0, "feedback": f"Parse error: {str(e)}"}
\ No newline at end of file
+        return {"score": 0, "feedback": f"Image evaluation error: {str(e)}", "source": "error"}
+
+
+# ══════════════════════════════════════════════════════════════════
+#  HANDWRITING TRANSCRIPTION
+# ══════════════════════════════════════════════════════════════════
+def image_mime_type(image_bytes: bytes) -> str:
+    """Detect image type from bytes header."""
+    if image_bytes[:4] == b'\x89PNG':
+        return "image/png"
+    if image_bytes[:2] == b'\xff\xd8':
+        return "image/jpeg"
+    if image_bytes[:4] == b'GIF8':
+        return "image/gif"
+    if image_bytes[:4] == b'RIFF':
+        return "image/webp"
+    return "image/jpeg"  # default fallback
+
+
+def transcribe_image(image_bytes: bytes) -> str:
+    """Read a handwritten answer image into text once, so it can be stored and evaluated as text.
+
+    Returns "" when the image holds no answer; raises if no engine can read it.
+    """
+    if OCR_ENGINE == "tesseract":
+        import io
+        import pytesseract
+        from PIL import Image
+        text = pytesseract.image_to_string(Image.open(io.BytesIO(image_bytes)))
+    else:
+        text, _ = _router.generate(TRANSCRIBE_PROMPT, "Transcribe this answer.",
+                                   image=(image_mime_type(image_bytes), image_bytes))
+    text = (text or "").strip()
+    return "" if text == NO_ANSWER_MARK else text
+
+
+# ══════════════════════════════════════════════════════════════════
+#  STRUCTURED RESPONSE PARSING
+# ══════════════════════════════════════════════════════════════════
+class EvaluationParseError(ValueError):
+    """A model reply that is not exactly one valid evaluation object."""
+
+    def __init__(self, reason: str, raw: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.raw    = raw
+
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*\n(.*)\n?```$", re.DOTALL)
+
+
+def parse_evaluation(text: str, max_marks: int) -> dict:
+    """Strictly parse a JSON evaluation reply.
+
+    The reply must be a single JSON object (optionally inside one ```json
+    fence) with a numeric "score" in [0, max_marks] and a non-empty string
+    "feedback". Anything else raises EvaluationParseError.
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise EvaluationParseError("empty reply", text or "")
+    body  = text.strip()
+    fence = _FENCE_RE.match(body)
+    if fence:
+        body = fence.group(1).strip()
+    try:
+        result = json.loads(body)
+    except (ValueError, RecursionError) as e:
+        raise EvaluationParseError(f"invalid JSON: {e}", text)
+    if not isinstance(result, dict):
+        raise EvaluationParseError("reply is not a JSON object", text)
+
+    score = result.get("score")
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise EvaluationParseError('"score" must be a number', text)
+    if not (0 <= score <= max_marks):   # also rejects NaN
+        raise EvaluationParseError(f'"score" must be between 0 and {max_marks}', text)
+    feedback = result.get("feedback")
+    if not isinstance(feedback, str) or not feedback.strip():
+        raise EvaluationParseError('"feedback" must be a non-empty string', text)
+    return {"score": float(score), "feedback": feedback.strip()}
+
+
+def _parse_or_reask(provider, prefix: str, text: str, max_marks: int) -> dict:
+    """Parse a reply; on failure ask the same provider only to reformat it, not to re-evaluate."""
+    for attempt in range(PARSE_RETRIES + 1):
+        try:
+            return {**parse_evaluation(text, max_marks), "source": provider.name}
+        except EvaluationParseError as e:
+            if attempt == PARSE_RETRIES:
+                return {"score": 0, "feedback": f"Could not parse evaluation response ({e.reason}).",
+                        "source": "error"}
+            text = _router.call(
+                provider, prefix,
+                REASK_PROMPT.format(reason=e.reason, max_marks=max_marks, reply=e.raw[:4000]),
+                schema=EVAL_SCHEMA,
+            )
@@ -0,0 +1,307 @@
+import io
+import os
+import time
+import inspect
+import marshal
+import functools
+import threading
+from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+
+# Opt-in timing of the hot paths (PROFILE=1). instrument() wraps the public
+# functions of database.py and evaluator.py; every call becomes one record
+# with its duration and, for database calls, the SQL statements it ran and
+# the rows and approximate bytes it fetched. Records sit in a per-process
+# ring buffer, tagged with the browser session (scope) that made them.
+ENABLED        = os.getenv("PROFILE", "").lower() in ("1", "true", "yes")
+BUFFER_SIZE    = int(os.getenv("PROFILE_BUFFER", "5000"))
+SQL_PREVIEW    = 300   # characters kept per statement
+MAX_STATEMENTS = 100   # statements kept per call; init_db runs the most
+
+DB_SKIP        = ("configure", "get_db", "fetchall", "fetchrows", "fetchone", "iter_chunks", "placeholder", "ph", "changed", "content_hash")
+EVALUATOR_SKIP = ("configure_providers", "configure_gemini", "provider_settings", "has_providers", "provider_stats",
+                  "quota_stats", "context_cache_stats", "budget", "max_concurrency")
+
+_records = deque(maxlen=BUFFER_SIZE)
+_lock    = threading.Lock()
+_local   = threading.local()
+
+
+def set_scope(scope):
+    """Tag this thread's following records, e.g. with the Streamlit session they belong to."""
+    _local.scope = scope
+
+
+def get_scope():
+    """This thread's scope, to hand on to worker threads that work for it."""
+    return getattr(_local, "scope", None)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _size(row) -> int:
+    """Approximate payload bytes of one fetched row."""
+    values = row.values() if isinstance(row, dict) else row
+    return sum(len(v) if isinstance(v, (str, bytes, bytearray, memoryview)) else 8 for v in values)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  RECORDING
+# ══════════════════════════════════════════════════════════════════
+def _new_record(kind, name):
+    return {"kind": kind, "name": name, "scope": getattr(_local, "scope", None),
+            "depth": len(_stack()), "at": datetime.now(), "ms": 0.0,
+            "rows": 0, "bytes": 0, "statements": [], "dropped": 0}
+
+
+@contextmanager
+def timed(kind: str, name: str):
+    """Record the enclosed block; nested records and statements attach to the innermost one."""
+    if not ENABLED:
+        yield None
+        return
+    rec = _new_record(kind, name)
+    _stack().append(rec)
+    start = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["ms"] = (time.perf_counter() - start) * 1000
+        _stack().pop()
+        with _lock:
+            _records.append(rec)
+
+
+def _wrap_generator(kind, name, fn):
+    """Time a generator function's own steps, not the consumer's work between them.
+
+    The record is on the stack only while the generator runs, so calls the
+    consumer makes between items are not nested under it; it is kept once
+    the generator is exhausted or closed.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            yield from fn(*args, **kwargs)
+            return
+        rec, gen = _new_record(kind, name), fn(*args, **kwargs)
+        try:
+            while True:
+                _stack().append(rec)
+                start = time.perf_counter()
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    rec["ms"] += (time.perf_counter() - start) * 1000
+                    _stack().pop()
+                yield item
+        finally:
+            gen.close()
+            with _lock:
+                _records.append(rec)
+    wrapper._profiled = True
+    return wrapper
+
+
+def _wrap(kind, name, fn):
+    if inspect.isgeneratorfunction(fn):
+        return _wrap_generator(kind, name, fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timed(kind, name):
+            return fn(*args, **kwargs)
+    wrapper._profiled = True
+    return wrapper
+
+
+def instrument(module, kind: str, skip=()):
+    """Replace the module's public functions with timed wrappers. Idempotent."""
+    for name, fn in list(vars(module).items()):
+        if (name.startswith("_") or name in skip or not inspect.isfunction(fn)
+                or fn.__module__ != module.__name__ or getattr(fn, "_profiled", False)):
+            continue
+        setattr(module, name, _wrap(kind, name, fn))
+
+
+def _statement(sql, ms):
+    stack = _stack()
+    if not stack:
+        return
+    rec = stack[-1]
+    if len(rec["statements"]) >= MAX_STATEMENTS:
+        rec["dropped"] += 1
+        return
+    rec["statements"].append({"sql": " ".join(str(sql).split())[:SQL_PREVIEW], "ms": ms, "rows": 0})
+
+
+def _fetched(rows):
+    stack = _stack()
+    if not stack:
+        return
+    rec = stack[-1]
+    n, size = len(rows), sum(_size(r) for r in rows)
+    rec["rows"]  += n
+    rec["bytes"] += size
+    if rec["statements"]:
+        rec["statements"][-1]["rows"] += n
+
+
+class _Cursor:
+    """Cursor proxy that times execute()/executemany(); everything else passes through."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, *params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, *params)
+        finally:
+            _statement(sql, (time.perf_counter() - start) * 1000)
+
+    def executemany(self, sql, seq):
+        seq   = list(seq)
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq)
+        finally:
+            _statement(f"{sql}  -- × {len(seq)}", (time.perf_counter() - start) * 1000)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _Connection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _Cursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_database(db):
+    """Time every database.py operation, with its statements, rows and bytes."""
+    if getattr(db.get_db, "_profiled", False):
+        return
+    get_db, fetchall, fetchrows, fetchone = db.get_db, db.fetchall, db.fetchrows, db.fetchone
+
+    @contextmanager
+    def traced_get_db():
+        with get_db() as conn:
+            yield _Connection(conn)
+
+    def traced_fetchall(cursor):
+        rows = fetchall(cursor)
+        _fetched(rows)
+        return rows
+
+    def traced_fetchrows(cursor):
+        cols, rows = fetchrows(cursor)
+        _fetched(rows)
+        return cols, rows
+
+    def traced_fetchone(cursor):
+        row = fetchone(cursor)
+        _fetched([row] if row else [])
+        return row
+
+    instrument(db, "db", skip=DB_SKIP)
+    for name, fn in (("get_db", traced_get_db), ("fetchall", traced_fetchall),
+                     ("fetchrows", traced_fetchrows), ("fetchone", traced_fetchone)):
+        fn._profiled = True
+        setattr(db, name, fn)
+
+
+def instrument_evaluator(evaluator):
+    instrument(evaluator, "evaluator", skip=EVALUATOR_SKIP)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  REPORTS
+# ══════════════════════════════════════════════════════════════════
+def records(scope=None) -> list:
+    with _lock:
+        recs = list(_records)
+    return recs if scope is None else [r for r in recs if r["scope"] == scope]
+
+
+def slowest(scope=None, n=20) -> list:
+    return sorted(records(scope), key=lambda r: r["ms"], reverse=True)[:n]
+
+
+def summary(scope=None) -> list:
+    """Per-function aggregates, most total time first."""
+    agg = {}
+    for r in records(scope):
+        a = agg.setdefault((r["kind"], r["name"]), {"kind": r["kind"], "name": r["name"], "calls": 0,
+                                                    "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0})
+        a["calls"]    += 1
+        a["total_ms"] += r["ms"]
+        a["max_ms"]    = max(a["max_ms"], r["ms"])
+        a["rows"]     += r["rows"]
+        a["bytes"]    += r["bytes"]
+    for a in agg.values():
+        a["mean_ms"] = a["total_ms"] / a["calls"]
+    return sorted(agg.values(), key=lambda a: a["total_ms"], reverse=True)
+
+
+def clear(scope=None):
+    with _lock:
+        keep = [] if scope is None else [r for r in _records if r["scope"] != scope]
+        _records.clear()
+        _records.extend(keep)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  WHOLE-RUN PROFILES
+# ══════════════════════════════════════════════════════════════════
+@contextmanager
+def profile_run():
+    """Profile the enclosed block with pyinstrument if installed, else cProfile.
+
+    Yields a dict that is filled on exit with the engine, a text report,
+    and a downloadable file (pyinstrument HTML or a cProfile .prof dump).
+    """
+    report = {}
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield report
+        finally:
+            profiler.stop()
+            report.update(engine="pyinstrument", text=profiler.output_text(unicode=True, color=False),
+                          file=profiler.output_html().encode("utf-8"), filename="rerun.html")
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+        profiler.create_stats()   # what dump_stats() writes, without a temp file
+        report.update(engine="cProfile", text=out.getvalue(), file=marshal.dumps(profiler.stats),
+                      filename="rerun.prof")
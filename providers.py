@@ -0,0 +1,310 @@
+import os
+import re
+import time
+import base64
+import random
+import hashlib
+import logging
+import datetime
+import threading
+
+import quota as quotas
+
+log = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════════════════
+#  PROVIDERS
+# ══════════════════════════════════════════════════════════════════
+# A provider turns (prompt prefix, user text, optional image) into the
+# model's raw reply text and its token usage. Parsing and scoring stay in
+# evaluator.py; rate limits and spend are tracked by the provider's Quota.
+
+class GeminiProvider:
+    """Google Gemini via google.generativeai, with per-prefix model reuse."""
+
+    name            = "gemini"
+    supports_images = True
+
+    # Gemini context caching for per-question prefixes during bulk runs.
+    # Gemini rejects explicit caches below the model's minimum token count
+    # (1,024 tokens for the default gemini-2.5-flash, ~4,000 characters;
+    # raise this for models with a higher minimum), so shorter prefixes, and
+    # any cache Gemini refuses, fall back to an in-process model bound to
+    # the prefix as its system instruction. cache_stats counts both, for
+    # the admin panel.
+    CONTEXT_CACHE_ENABLED   = os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1"
+    CONTEXT_CACHE_MIN_CHARS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_CHARS", "4000"))
+    CONTEXT_CACHE_TTL_MIN   = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_MIN", "30"))
+
+    def __init__(self, api_key, model_name="gemini-2.5-flash", cost=1.0, quota=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._genai      = genai
+        self.model_name  = model_name
+        self.cost        = cost
+        self.quota       = quota or quotas.Quota()
+        self._models     = {}   # prefix hash -> (model, expires_at)
+        self._lock       = threading.Lock()
+        self.cache_stats = {"cached": 0, "too_short": 0, "failed": 0}
+
+    def _model_for_prefix(self, prefix):
+        """Return a model whose system instruction is the prefix, reusing it across answers."""
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._models.get(key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+
+        genai = self._genai
+        model, ttl, outcome = None, self.CONTEXT_CACHE_TTL_MIN * 60, None
+        if self.CONTEXT_CACHE_ENABLED and len(prefix) < self.CONTEXT_CACHE_MIN_CHARS:
+            outcome = "too_short"
+        elif self.CONTEXT_CACHE_ENABLED:
+            try:
+                from google.generativeai import caching
+                content = caching.CachedContent.create(
+                    model=f"models/{self.model_name}",
+                    display_name=f"emrs-{key[:16]}",
+                    system_instruction=prefix,
+                    ttl=datetime.timedelta(minutes=self.CONTEXT_CACHE_TTL_MIN),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=content)
+                ttl -= 60   # drop our handle a minute before Gemini expires the cache
+                outcome = "cached"
+            except Exception as e:
+                log.warning("Gemini context cache not created (%s); using an uncached model", e)
+                model, outcome = None, "failed"
+        if model is None:
+            model = genai.GenerativeModel(self.model_name, system_instruction=prefix)
+
+        with self._lock:
+            if outcome:
+                self.cache_stats[outcome] += 1
+            if len(self._models) >= 256:
+                self._models.clear()
+            self._models[key] = (model, time.time() + ttl)
+        return model
+
+    def cache_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.cache_stats)
+
+    def generate(self, prefix, text, image=None, schema=None):
+        config = {"response_mime_type": "application/json", "response_schema": schema} if schema else None
+        contents = text
+        if image is not None:
+            mime_type, data = image
+            contents = [text, {"inline_data": {"mime_type": mime_type,
+                                               "data": base64.b64encode(data).decode("utf-8")}}]
+        resp = self._model_for_prefix(prefix).generate_content(contents, generation_config=config)
+        meta = getattr(resp, "usage_metadata", None)
+        return resp.text, {"prompt_tokens": getattr(meta, "prompt_token_count", 0) or 0,
+                           "output_tokens": getattr(meta, "candidates_token_count", 0) or 0}
+
+
+class OpenAICompatibleProvider:
+    """Any /v1/chat/completions server: OpenAI, or a local llama.cpp / vLLM instance."""
+
+    supports_images = False
+
+    def __init__(self, base_url, model, api_key="", name="local", cost=0.0,
+                 vision=False, timeout=120, quota=None):
+        import requests
+        self.name            = name
+        self.url             = base_url.rstrip("/") + "/chat/completions"
+        self.model           = model
+        self.cost            = cost
+        self.supports_images = vision
+        self.timeout         = timeout
+        self.quota           = quota or quotas.Quota()
+        self._http           = requests.Session()   # pooled keep-alive connections
+        if api_key:
+            self._http.headers["Authorization"] = f"Bearer {api_key}"
+
+    def generate(self, prefix, text, image=None, schema=None):
+        content = text
+        if image is not None:
+            mime_type, data = image
+            content = [
+                {"type": "text", "text": text},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"}},
+            ]
+        body = {
+            "model": self.model,
+            "messages": [{"role": "system", "content": prefix},
+                         {"role": "user", "content": content}],
+            "temperature": 0,
+        }
+        if schema:
+            body["response_format"] = {"type": "json_schema",
+                                       "json_schema": {"name": "evaluation", "schema": schema}}
+        resp = self._http.post(self.url, json=body, timeout=self.timeout)
+        resp.raise_for_status()
+        data  = resp.json()
+        usage = data.get("usage") or {}
+        return data["choices"][0]["message"]["content"], {
+            "prompt_tokens": usage.get("prompt_tokens", 0) or 0,
+            "output_tokens": usage.get("completion_tokens", 0) or 0,
+        }
+
+
+# ══════════════════════════════════════════════════════════════════
+#  ROUTING
+# ══════════════════════════════════════════════════════════════════
+class NoProviderAvailable(RuntimeError):
+    pass
+
+
+class Router:
+    """Send each request to one provider, falling back to the others on failure.
+
+    Policies:
+      fallback — configured order (primary first)
+      cost     — cheapest first
+      latency  — weighted at random by 1 / recent latency, so faster
+                 providers take more of the load without starving the rest
+    A provider that fails is skipped for `cooldown` seconds unless every
+    provider is cooling down. A rate-limited request is retried on the same
+    provider after its quota's backoff, up to `rate_limit_retries` times.
+    """
+
+    POLICIES = ("fallback", "cost", "latency")
+
+    def __init__(self, providers, policy="fallback", cooldown=60.0, budget=None, rate_limit_retries=2):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown routing policy {policy!r}; use one of {', '.join(self.POLICIES)}")
+        self.providers  = list(providers)
+        self.policy     = policy
+        self.cooldown   = cooldown
+        self.budget     = budget or quotas.Budget()
+        self.rate_limit_retries = rate_limit_retries
+        self._latency   = {p.name: None for p in self.providers}   # EWMA seconds
+        self._down_until = {p.name: 0.0 for p in self.providers}
+        self.stats      = {p.name: {"ok": 0, "failed": 0} for p in self.providers}
+        self._lock      = threading.Lock()   # runs call generate() from several threads
+
+    def _order(self, needs_image):
+        candidates = [p for p in self.providers if p.supports_images or not needs_image]
+        if self.policy == "cost":
+            candidates.sort(key=lambda p: p.cost)
+        elif self.policy == "latency":
+            weighted = []
+            pool = list(candidates)
+            while pool:
+                # Unmeasured providers get the best weight so they are tried.
+                with self._lock:
+                    weights = [1.0 / max(self._latency[p.name] or 1e-3, 1e-3) for p in pool]
+                pick = random.choices(pool, weights)[0]
+                weighted.append(pick)
+                pool.remove(pick)
+            candidates = weighted
+        now = time.time()
+        with self._lock:
+            healthy = [p for p in candidates if self._down_until[p.name] <= now]
+        return healthy + [p for p in candidates if p not in healthy]
+
+    def generate(self, prefix, text, image=None, schema=None):
+        """Return (reply text, provider that produced it)."""
+        order = self._order(needs_image=image is not None)
+        if not order:
+            raise NoProviderAvailable("No configured provider can handle this request.")
+        last_error = None
+        for provider in order:
+            start = time.perf_counter()
+            try:
+                reply = self.call(provider, prefix, text, image=image, schema=schema)
+            except Exception as e:
+                last_error = e
+                with self._lock:
+                    self.stats[provider.name]["failed"] += 1
+                    self._down_until[provider.name] = time.time() + self.cooldown
+                continue
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                prev = self._latency[provider.name]
+                self._latency[provider.name] = elapsed if prev is None else 0.8 * prev + 0.2 * elapsed
+                self._down_until[provider.name] = 0.0
+                self.stats[provider.name]["ok"] += 1
+            return reply, provider
+        raise last_error
+
+    def call(self, provider, prefix, text, image=None, schema=None):
+        """One request to one provider within its quota; returns the reply text."""
+        tokens = quotas.estimate_tokens(prefix, text, image)
+        for attempt in range(self.rate_limit_retries + 1):
+            slot = provider.quota.acquire(tokens)
+            try:
+                reply, usage = provider.generate(prefix, text, image=image, schema=schema)
+            except Exception as e:
+                limited = quotas.is_rate_limited(e)
+                provider.quota.release(slot, throttled=limited)
+                if limited and attempt < self.rate_limit_retries:
+                    continue   # the next acquire waits out the backoff
+                raise
+            provider.quota.release(slot, usage)
+            return reply
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self.stats.items()}
+
+    def max_concurrency(self) -> int:
+        return max((p.quota.max_concurrency for p in self.providers), default=1)
+
+
+# Per-provider settings, read as {NAME}_BASE_URL, {NAME}_MODEL, ... for each
+# name in EVAL_PROVIDERS; "gemini" uses GEMINI_API_KEY / GEMINI_MODEL and
+# any other name is an OpenAI-compatible server at {NAME}_BASE_URL.
+PROVIDER_KEYS = ("BASE_URL", "API_KEY", "MODEL", "COST", "VISION", "RPM", "TPM", "PRICE_IN", "PRICE_OUT")
+
+
+def provider_names(setting) -> list:
+    """Provider names from an EVAL_PROVIDERS value ("gemini" when empty)."""
+    names = [n.strip().lower() for n in (setting or "gemini").split(",") if n.strip()]
+    for name in names:
+        if not re.fullmatch(r"[a-z][a-z0-9_]*", name):
+            raise ValueError(f"Invalid evaluation provider name {name!r}: use letters, digits and _.")
+    return names
+
+
+def build_router(config):
+    """Build the router from EVAL_* and per-provider {NAME}_* settings (a dict of strings)."""
+    budget = quotas.Budget(daily=float(config.get("EVAL_DAILY_BUDGET") or 0),
+                           per_session=float(config.get("EVAL_SESSION_BUDGET") or 0))
+
+    def quota(prefix):
+        return quotas.Quota(
+            rpm=int(config.get(f"{prefix}_RPM") or 0),
+            tpm=int(config.get(f"{prefix}_TPM") or 0),
+            max_concurrency=int(config.get("EVAL_MAX_CONCURRENCY") or 4),
+            price_in=float(config.get(f"{prefix}_PRICE_IN") or 0),
+            price_out=float(config.get(f"{prefix}_PRICE_OUT") or 0),
+            budget=budget,
+        )
+
+    providers = []
+    for name in provider_names(config.get("EVAL_PROVIDERS")):
+        key = name.upper()
+        if name == "gemini":
+            if config.get("GEMINI_API_KEY"):
+                providers.append(GeminiProvider(
+                    config["GEMINI_API_KEY"],
+                    model_name=config.get("GEMINI_MODEL") or "gemini-2.5-flash",
+                    cost=float(config.get("GEMINI_COST") or 1.0),
+                    quota=quota("GEMINI"),
+                ))
+        elif config.get(f"{key}_BASE_URL"):
+            providers.append(OpenAICompatibleProvider(
+                config[f"{key}_BASE_URL"],
+                config.get(f"{key}_MODEL") or "local-model",
+                api_key=config.get(f"{key}_API_KEY") or "",
+                name=name,
+                cost=float(config.get(f"{key}_COST") or 0.0),
+                vision=config.get(f"{key}_VISION") == "1",
+                quota=quota(key),
+            ))
+        else:
+            raise ValueError(f"Unknown evaluation provider {name!r}: set {key}_BASE_URL for an "
+                             f"OpenAI-compatible server, or remove it from EVAL_PROVIDERS.")
+    return Router(providers, policy=config.get("EVAL_ROUTING") or "fallback", budget=budget)
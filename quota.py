@@ -0,0 +1,165 @@
+import time
+import threading
+from datetime import date
+from collections import deque
+
+# Request / token quotas and spend for the evaluation providers. Each
+# provider has a Quota: acquire() blocks until one more request fits under
+# its requests-per-minute, tokens-per-minute and concurrency limits, and
+# release() records the reply's token usage and cost. Concurrency adapts
+# AIMD-style: one more slot after `limit` successful calls, halved (with a
+# short backoff) on every rate-limit error. A Budget caps the day's spend
+# of this process and, through the evaluation runs, each session's.
+WINDOW         = 60.0   # seconds covered by the per-minute limits
+OUTPUT_TOKENS  = 300    # reply estimate, until the usage metadata arrives
+IMAGE_TOKENS   = 258    # tokens Gemini bills per image
+MAX_BACKOFF    = 60.0   # seconds
+
+_local = threading.local()
+
+
+class QuotaExceeded(RuntimeError):
+    """The day's budget is spent; paid providers take no more calls today."""
+
+
+def is_rate_limited(error) -> bool:
+    """True for a provider's "too many requests" error (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    for e in (error, getattr(error, "response", None)):
+        if getattr(e, "code", None) == 429 or getattr(e, "status_code", None) == 429:
+            return True
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def estimate_tokens(prefix, text, image=None) -> int:
+    """Rough prompt + reply size (~4 characters a token) used to reserve tokens-per-minute."""
+    return (len(prefix) + len(text)) // 4 + (IMAGE_TOKENS if image is not None else 0) + OUTPUT_TOKENS
+
+
+def take_usage() -> dict:
+    """Tokens and cost of the calls made on this thread since the last take_usage()."""
+    usage = getattr(_local, "usage", None) or {"tokens": 0, "cost": 0.0}
+    _local.usage = {"tokens": 0, "cost": 0.0}
+    return usage
+
+
+class Budget:
+    """Daily spend cap shared by all providers of the process; 0 means no cap.
+
+    `per_session` is the cap evaluation runs apply to a session's recorded
+    spend (see runs.py).
+    """
+
+    def __init__(self, daily=0.0, per_session=0.0):
+        self.daily       = daily
+        self.per_session = per_session
+        self.spent       = 0.0
+        self._day        = date.today()
+        self._lock       = threading.Lock()
+
+    def _roll(self):
+        if date.today() != self._day:
+            self._day, self.spent = date.today(), 0.0
+
+    def exhausted(self) -> bool:
+        with self._lock:
+            self._roll()
+            return bool(self.daily) and self.spent >= self.daily
+
+    def add(self, cost):
+        with self._lock:
+            self._roll()
+            self.spent += cost
+
+
+class Quota:
+    """Rate limits, adaptive concurrency and cost accounting for one provider.
+
+    `price_in` / `price_out` are the cost of a million prompt / reply tokens;
+    rpm and tpm of 0 mean no limit.
+    """
+
+    def __init__(self, rpm=0, tpm=0, max_concurrency=4, price_in=0.0, price_out=0.0, budget=None):
+        self.rpm             = rpm
+        self.tpm             = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.price_in        = price_in
+        self.price_out       = price_out
+        self.budget          = budget
+        self.limit           = 1.0   # current concurrency, grows toward max_concurrency
+        self.in_flight       = 0
+        self._window         = deque()   # [started_at, tokens] per request in the last minute
+        self._backoff_until  = 0.0
+        self._throttle_streak = 0
+        self._cond           = threading.Condition()
+        self.stats = {"requests": 0, "throttled": 0, "prompt_tokens": 0, "output_tokens": 0, "cost": 0.0}
+
+    @property
+    def paid(self) -> bool:
+        return bool(self.price_in or self.price_out)
+
+    def _wait(self, tokens, now):
+        """Seconds until a request of `tokens` fits; None to wait for a release; 0 if it fits now."""
+        while self._window and self._window[0][0] <= now - WINDOW:
+            self._window.popleft()
+        if now < self._backoff_until:
+            return self._backoff_until - now
+        if self.in_flight >= int(self.limit):
+            return None
+        if self._window:
+            until_slot = self._window[0][0] + WINDOW - now
+            if self.rpm and len(self._window) >= self.rpm:
+                return until_slot
+            if self.tpm and sum(t for _, t in self._window) + tokens > self.tpm:
+                return until_slot
+        return 0
+
+    def acquire(self, tokens):
+        """Block until the request may go out; returns the slot to pass to release()."""
+        if self.paid and self.budget is not None and self.budget.exhausted():
+            raise QuotaExceeded(f"Daily evaluation budget of {self.budget.daily:g} is spent.")
+        with self._cond:
+            while True:
+                now  = time.time()
+                wait = self._wait(tokens, now)
+                if wait == 0:
+                    break
+                self._cond.wait(timeout=wait)
+            self.in_flight += 1
+            slot = [now, tokens]
+            self._window.append(slot)
+            return slot
+
+    def release(self, slot, usage=None, throttled=False) -> float:
+        """Record a finished request (its usage, or that it was rate limited); returns its cost."""
+        prompt, output = (usage or {}).get("prompt_tokens", 0), (usage or {}).get("output_tokens", 0)
+        cost = (prompt * self.price_in + output * self.price_out) / 1e6
+        with self._cond:
+            self.in_flight -= 1
+            if usage:
+                slot[1] = prompt + output   # replace the estimate for the rest of the minute
+            if throttled:
+                self._throttle_streak += 1
+                self.limit = max(1.0, self.limit / 2)
+                self._backoff_until = time.time() + min(2 ** self._throttle_streak, MAX_BACKOFF)
+                self.stats["throttled"] += 1
+            else:
+                self._throttle_streak = 0
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self.stats["requests"]      += 1
+            self.stats["prompt_tokens"] += prompt
+            self.stats["output_tokens"] += output
+            self.stats["cost"]          += cost
+            self._cond.notify_all()
+        if self.budget is not None:
+            self.budget.add(cost)
+        mine = getattr(_local, "usage", None) or {"tokens": 0, "cost": 0.0}
+        _local.usage = {"tokens": mine["tokens"] + prompt + output, "cost": mine["cost"] + cost}
+        return cost
+
+    def snapshot(self) -> dict:
+        """Current limits and the last minute's use, for the admin panel."""
+        with self._cond:
+            now = time.time()
+            recent = [t for at, t in self._window if at > now - WINDOW]
+            return {**self.stats, "concurrency": int(self.limit), "in_flight": self.in_flight,
+                    "rpm_used": len(recent), "tpm_used": sum(recent), "rpm": self.rpm, "tpm": self.tpm}
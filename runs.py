@@ -0,0 +1,126 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import database as db
+import evaluator
+import profiling
+import quota
+import scheduling
+
+# Evaluation runs, independent of any UI: the admin panel drives them with
+# progress callbacks, the REST API in a background thread. Pacing is left
+# to the providers' quotas (see quota.py).
+RUN_MAX_CONSECUTIVE_FAILURES = 3
+
+
+def evaluate_submission(sub):
+    ref, rubric = sub.get("reference_answer") or "", sub.get("rubric") or ""
+    if sub.get("answer_type") == "image" and sub.get("answer_image"):
+        # Transcribe once; the stored transcript takes the text path on every later evaluation.
+        transcript = sub.get("answer_transcript")
+        if transcript is None:
+            try:
+                transcript = evaluator.transcribe_image(sub["answer_image"])
+                db.save_transcript(sub["id"], transcript)
+            except Exception:
+                return evaluator.evaluate_image_answer(sub["question_text"], sub["answer_image"], sub["max_marks"], ref, rubric)
+        return evaluator.evaluate_answer(sub["question_text"], transcript, sub["max_marks"], ref, rubric, transcribed=True)
+    return evaluator.evaluate_answer(sub["question_text"], sub.get("answer_text", ""), sub["max_marks"], ref, rubric)
+
+
+def _evaluate_metered(sub, scope=None):
+    """Evaluate on a worker thread; the result carries the cost of its model calls.
+
+    `scope` is the caller's profiling scope, so the worker's records stay with its session.
+    """
+    profiling.set_scope(scope)
+    quota.take_usage()
+    result = evaluate_submission(sub)
+    return {**result, "cost": quota.take_usage()["cost"]}
+
+
+def _save_result(run_id, sub, result):
+    """Store one finished answer and checkpoint the run; returns its eval source."""
+    source = result.get("source", "gemini")
+    db.save_evaluation(sub["id"], result["score"], result["feedback"], source, result.get("prescore"))
+    db.checkpoint_eval_run(run_id, sub["id"], failed=(source == "error"), cost=result["cost"])
+    return source
+
+
+def execute_eval_run(run_id, before=None, after=None):
+    """Evaluate the run's remaining submissions in its schedule order, checkpointing after each one.
+
+    Up to evaluator.max_concurrency() answers are in flight at once; each
+    provider's quota decides how many of them actually call it. Stops when
+    the run is paused or cancelled (from any browser or API client), and
+    pauses itself after repeated failures such as quota exhaustion or once
+    the session has spent its evaluation budget. `before(i, total, sub)` and
+    `after(result)` are optional progress callbacks, called on this thread.
+    Answers already in flight are saved however the loop ends, also when a
+    callback raises (Streamlit stops the script of a browser that clicks
+    Pause or Cancel while it drives the run): their calls are paid for.
+    Returns the run's final status.
+    """
+    run     = db.get_eval_run(run_id)
+    ids     = scheduling.run_order(run)
+    cap     = evaluator.budget().per_session
+    spent   = db.get_session_eval_cost(run["session_id"])
+    db.start_eval_run(run_id)
+    subs    = db.iter_pending_by_ids(ids)
+    width   = evaluator.max_concurrency()
+    status, note, streak, dispatched = "completed", None, 0, 0
+    failed_out = False
+    failed_ids = []
+    in_flight  = {}
+    scope      = profiling.get_scope()
+    with ThreadPoolExecutor(width, thread_name_prefix="eval") as pool:
+        try:
+            while True:
+                if status == "completed":
+                    current = db.get_eval_run_status(run_id)
+                    if current != "running":
+                        status = current   # paused or cancelled elsewhere; answers in flight still get saved
+                    elif cap and spent >= cap:
+                        status, note = "paused", f"Paused: the session has spent its evaluation budget ({spent:.2f} of {cap:g})."
+                while status == "completed" and len(in_flight) < width:
+                    sub = next(subs, None)
+                    if sub is None:
+                        break
+                    if before:
+                        before(dispatched, len(ids), sub)
+                    dispatched += 1
+                    in_flight[pool.submit(_evaluate_metered, sub, scope)] = sub
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sub    = in_flight.pop(future)
+                    result = future.result()
+                    source = _save_result(run_id, sub, result)
+                    spent += result["cost"]
+                    if source == "error":
+                        failed_ids.append(sub["id"])
+                    streak = streak + 1 if source == "error" else 0
+                    if status == "completed" and streak >= RUN_MAX_CONSECUTIVE_FAILURES:
+                        status, note = "paused", f"Paused after {streak} consecutive failures: {result['feedback'][:200]}"
+                        failed_out = True
+                    if after:
+                        after(result)
+        except BaseException:
+            # Interrupted (e.g. by a Streamlit rerun): save what is still in flight, then unwind.
+            for future, sub in in_flight.items():
+                try:
+                    _save_result(run_id, sub, future.result())
+                except Exception:
+                    pass
+            raise
+    if note:
+        if failed_out:
+            # Put the failed answers back in the queue so resuming retries them,
+            # and off the counters so the retries are not counted twice.
+            requeued = db.reset_failed_evaluations(run["session_id"], run["question_id"], run["user_id"],
+                                                   run["answer_type"], submission_ids=failed_ids)
+            db.requeue_eval_run_failures(run_id, requeued)
+        db.set_eval_run_status(run_id, "paused", note)
+    elif status == "completed":
+        db.set_eval_run_status(run_id, "completed")
+    return status
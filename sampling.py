@@ -0,0 +1,95 @@
+import json
+import random
+
+import database as db
+
+# Per-student question sets. A session's questions form its bank; its
+# sampling policy (stored as JSON on exam_sessions) says how many each
+# student gets:
+#   {"count": 4}                                   any 4
+#   {"difficulty": {"easy": 1, "medium": 2, "hard": 1}}
+#   {"count": 3, "tags": ["sql", "normalization"]} 3 from questions with any of these tags
+# Draws are seeded by session and user id, so a student always gets the
+# same set, on any replica.
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+def parse_tags(text) -> list:
+    return [t.strip().lower() for t in (text or "").split(",") if t.strip()]
+
+
+def load_policy(session) -> dict:
+    """The session's sampling policy, or None when every student answers every question."""
+    raw = session.get("sampling_policy")
+    return json.loads(raw) if raw else None
+
+
+def _pool(questions, policy):
+    tags = set(policy.get("tags") or [])
+    if not tags:
+        return list(questions)
+    return [q for q in questions if tags & set(parse_tags(q.get("tags")))]
+
+
+def validate_policy(questions, policy):
+    """Raise ValueError if the session's questions cannot satisfy the policy."""
+    pool = _pool(questions, policy)
+    quotas = policy.get("difficulty") or {}
+    if quotas:
+        for level, n in quotas.items():
+            have = sum(1 for q in pool if (q.get("difficulty") or "") == level)
+            if have < n:
+                raise ValueError(f"Policy needs {n} {level} question(s) but only {have} match.")
+    elif not 0 < policy.get("count", 0) <= len(pool):
+        raise ValueError(f"Policy needs {policy.get('count', 0)} question(s) but {len(pool)} match.")
+
+
+def sample_questions(questions, policy, session_id, user_id) -> list:
+    """Deterministically pick one student's questions, in bank order."""
+    rng  = random.Random(f"{session_id}:{user_id}")
+    pool = _pool(questions, policy)
+    quotas = policy.get("difficulty") or {}
+    if quotas:
+        picked = []
+        for level in sorted(quotas):
+            level_pool = [q for q in pool if (q.get("difficulty") or "") == level]
+            picked += rng.sample(level_pool, quotas[level])
+    else:
+        picked = rng.sample(pool, policy["count"])
+    return sorted(picked, key=lambda q: q["id"])
+
+
+def assign_session(session, user_ids) -> int:
+    """Precompute and store question sets for the given students, replacing earlier ones.
+
+    Returns the number of students assigned.
+    """
+    policy = load_policy(session)
+    if not policy:
+        return 0
+    questions = db.get_questions_for_session(session["id"])
+    validate_policy(questions, policy)
+    rows = [(uid, q["id"], pos)
+            for uid in user_ids
+            for pos, q in enumerate(sample_questions(questions, policy, session["id"], uid))]
+    db.save_assignments(session["id"], rows, replace_all=True)
+    return len(user_ids)
+
+
+def questions_for_student(session, user_id) -> list:
+    """The questions one student sees: their stored set, or the whole session without a policy."""
+    policy = load_policy(session)
+    if not policy:
+        return db.get_questions_for_session(session["id"])
+    assigned = db.get_assigned_questions(session["id"], user_id)
+    if assigned:
+        return assigned
+    # Signed up after sets were generated: draw and store theirs now.
+    questions = db.get_questions_for_session(session["id"])
+    try:
+        validate_policy(questions, policy)
+    except ValueError:
+        return questions
+    picked = sample_questions(questions, policy, session["id"], user_id)
+    db.save_assignments(session["id"], [(user_id, q["id"], pos) for pos, q in enumerate(picked)])
+    return picked
@@ -0,0 +1,102 @@
+import os
+import math
+import statistics
+from datetime import datetime
+
+import database as db
+
+# Order in which an evaluation run works through pending answers. Each
+# policy places an answer between 0 (evaluate first) and 1; its priority is
+# the weighted sum, lowest first, ties broken by submission id.
+#   round_robin  everyone's first pending answer, then everyone's second, ...
+#                so each student reaches a complete result sooner
+#   text_first   typed answers before (slower, costlier) image answers
+#   oldest       earlier submissions first
+# A schedule is written "round_robin=1,text_first=0.5"; a bare name weighs 1.
+# An empty schedule keeps submission id order.
+POLICIES = ("round_robin", "text_first", "oldest")
+DEFAULT_SCHEDULE = os.getenv("EVAL_SCHEDULE", "round_robin=1,text_first=0.5")
+
+
+def parse_schedule(text) -> dict:
+    """{policy: weight} from "name=weight,..."; raises ValueError on unknown names or bad weights."""
+    weights = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip().lower()
+        if name not in POLICIES:
+            raise ValueError(f"Unknown schedule policy {name!r}; use {', '.join(POLICIES)}.")
+        try:
+            weights[name] = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Weight for {name} must be a number, got {weight.strip()!r}.")
+        if weights[name] < 0:
+            raise ValueError(f"Weight for {name} must not be negative.")
+    return weights
+
+
+def format_schedule(weights) -> str:
+    return ",".join(f"{name}={weights[name]:g}" for name in POLICIES if weights.get(name))
+
+
+def order(cols, rows, weights) -> list:
+    """Submission ids of the (columns, row tuples) from db.get_pending_keys, in schedule order."""
+    i_id, i_user, i_type, i_at = (cols.index(c) for c in ("id", "user_id", "answer_type", "submitted_at"))
+    rows = sorted(rows, key=lambda r: (str(r[i_at]), r[i_id]))   # oldest first
+    n = len(rows)
+    if not n or not any(weights.values()):
+        return sorted(r[i_id] for r in rows)
+
+    turns, seen = [], {}
+    for r in rows:   # k-th pending answer of its student, oldest first
+        turns.append(seen.get(r[i_user], 0))
+        seen[r[i_user]] = turns[-1] + 1
+    max_turn = max(turns) or 1
+    w_rr, w_text, w_age = (weights.get(name, 0.0) for name in POLICIES)
+
+    def priority(k):
+        r = rows[k]
+        return (w_rr * turns[k] / max_turn
+                + w_text * (r[i_type] == "image")
+                + w_age * k / n,
+                r[i_id])
+    return [rows[k][i_id] for k in sorted(range(n), key=priority)]
+
+
+def run_order(run) -> list:
+    """Ids of a run's remaining answers in the run's schedule."""
+    cols, rows = db.get_eval_run_pending_keys(run)
+    return order(cols, rows, parse_schedule(run.get("schedule")))
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def time_to_complete(run) -> dict:
+    """How long after the run started each student had every answer in its scope scored.
+
+    Returns {"students": [{"student_name", "seconds"}...] fastest first,
+    "waiting": students with answers still pending, and median / p90 / max
+    seconds}. Pauses count as waiting time.
+    """
+    rows = db.get_eval_run_students(run)
+    if not rows:
+        return {"students": [], "waiting": 0, "median": None, "p90": None, "max": None}
+    started = _as_datetime(run["started_at"])
+    done = sorted(
+        ({"student_name": r["student_name"],
+          "seconds": (_as_datetime(r["completed_at"]) - started).total_seconds()}
+         for r in rows if not r["pending"]),
+        key=lambda d: d["seconds"],
+    )
+    secs = [d["seconds"] for d in done]
+    return {
+        "students": done,
+        "waiting":  sum(1 for r in rows if r["pending"]),
+        "median":   statistics.median(secs) if secs else None,
+        "p90":      secs[math.ceil(len(secs) * 0.9) - 1] if secs else None,
+        "max":      secs[-1] if secs else None,
+    }
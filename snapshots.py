@@ -0,0 +1,118 @@
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import database as db
+
+# Immutable columnar copies of closed, fully evaluated sessions. Files are
+# uncompressed Arrow IPC so reads are memory-mapped without copying;
+# images stay in the database and are fetched one at a time on demand.
+# SNAPSHOT_DIR is local to each replica, so every file records the score
+# stamp it was written at and is rewritten once the database moves on
+# (e.g. after "Retry failed" on another replica).
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+SCORE_COLUMNS = [
+    "id", "user_id", "question_id", "student_name", "student_email", "question_text",
+    "answer_text", "answer_transcript", "answer_type", "score", "max_marks", "feedback", "eval_source",
+    "submitted_at", "evaluated_at",
+]
+
+
+def _path(session_id, kind):
+    return os.path.join(SNAPSHOT_DIR, f"session_{int(session_id)}_{kind}.arrow")
+
+
+def _write(table, path, stamp):
+    """Write atomically under a temp name of its own, so concurrent writers never interleave."""
+    table = table.replace_schema_metadata({"score_stamp": stamp})
+    fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _read(session_id, kind):
+    path = _path(session_id, kind)
+    if not os.path.exists(path):
+        return None
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _stamp(session_id, kind):
+    path = _path(session_id, kind)
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, "r") as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(b"score_stamp", b"").decode("utf-8")
+
+
+def has_snapshot(session_id, stamp=None):
+    """True if both files exist and, when given, were written at this score stamp."""
+    stamps = [_stamp(session_id, kind) for kind in ("scores", "rankings")]
+    return None not in stamps and (stamp is None or stamps == [stamp, stamp])
+
+
+def write_snapshot(session_id, stamp=None):
+    """Write the scores and rankings snapshot for a session. Returns the number of submissions."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    stamp = stamp or ":".join(db.get_score_stamp(session_id))
+    cols, rows = db.get_submission_rows(session_id)
+    index  = {c: i for i, c in enumerate(cols)}
+    scores = pa.table({c: [r[index[c]] for r in rows] for c in SCORE_COLUMNS})
+    _write(scores, _path(session_id, "scores"), stamp)
+    _write(pa.Table.from_pylist(db.get_rankings(session_id)), _path(session_id, "rankings"), stamp)
+    return len(rows)
+
+
+def drop_snapshot(session_id):
+    """Remove a session's snapshot, e.g. before re-evaluating a closed session."""
+    for kind in ("scores", "rankings"):
+        if os.path.exists(_path(session_id, kind)):
+            os.remove(_path(session_id, kind))
+
+
+def ensure_snapshot(session):
+    """Return True if the session (an exam_sessions row) is served from a snapshot.
+
+    The snapshot is written on first use once the session is closed and
+    has no answers left to evaluate, and rewritten when the session's score
+    stamp no longer matches; live sessions always return False.
+    """
+    if session["is_active"]:
+        return False
+    stamp = ":".join(db.get_score_stamp(session["id"]))
+    if has_snapshot(session["id"], stamp):
+        return True
+    counts = db.get_evaluation_counts(session["id"])
+    if counts["pending"] or (not counts["evaluated"] and not db.is_session_archived(session["id"])):
+        return False
+    write_snapshot(session["id"], stamp)
+    return True
+
+
+def read_rankings(session_id):
+    table = _read(session_id, "rankings")
+    return table.to_pylist() if table is not None else None
+
+
+def read_user_submissions(session_id, user_id):
+    table = _read(session_id, "scores")
+    if table is None:
+        return None
+    mine = table.filter(pc.equal(table["user_id"], user_id))
+    return mine.sort_by("question_id").to_pylist()
+
+
+def read_scores_df(session_id):
+    table = _read(session_id, "scores")
+    return table.to_pandas() if table is not None else None